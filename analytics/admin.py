@@ -0,0 +1,31 @@
+# analytics/admin.py
+from django.contrib import admin
+from .models import DailyRollup, LeaderboardEntry, ClientCohort, ClientLifetimeValue
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'orders_count', 'completed_orders', 'revenue', 'profit', 'income', 'expense', 'new_clients')
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('board', 'window', 'rank', 'user', 'value', 'updated_at')
+    list_filter = ('board', 'window')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(ClientCohort)
+class ClientCohortAdmin(admin.ModelAdmin):
+    list_display = ('cohort_month', 'source', 'clients_count', 'repeat_clients', 'orders_count', 'revenue', 'profit')
+    list_filter = ('source',)
+
+
+@admin.register(ClientLifetimeValue)
+class ClientLifetimeValueAdmin(admin.ModelAdmin):
+    list_display = ('client', 'cohort_month', 'source', 'orders_count', 'revenue', 'profit', 'last_order_at')
+    list_filter = ('source',)
+    search_fields = ('client__name', 'client__phone')
+    raw_id_fields = ('client',)
@@ -0,0 +1,159 @@
+# analytics/cache.py
+"""
+Кеш метрик дашбордов.
+
+Ключи строятся по роли, пользователю и периоду. Инвалидация точечная:
+к ключу подмешиваются номера поколений (общее, владельца и конкретного
+пользователя), а сигналы моделей увеличивают только затронутые поколения.
+Пересчет одного ключа выполняется одним потоком (single-flight).
+"""
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+_MISSING = object()
+
+# Пул блокировок для single-flight внутри процесса (ограниченный размер)
+_LOCK_STRIPES = 64
+_key_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+_stats_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'coalesced': 0,
+    'invalidations': 0,
+}
+
+
+def get_metrics_cache():
+    """Возвращает бэкенд кеша метрик (с откатом на кеш по умолчанию)"""
+    alias = getattr(settings, 'METRICS_CACHE_ALIAS', 'metrics')
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _timeout():
+    return getattr(settings, 'METRICS_CACHE_TIMEOUT', 300)
+
+
+def _lock_timeout():
+    return getattr(settings, 'METRICS_CACHE_LOCK_TIMEOUT', 30)
+
+
+def _count(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+def _generation_key(scope):
+    return f'metrics:gen:{scope}'
+
+
+def _user_scope(role, user_id):
+    """Область инвалидации для роли: владелец видит общие цифры компании"""
+    if role == 'owner':
+        return 'owner'
+    return f'user:{user_id}'
+
+
+def build_key(namespace, role, user_id, period):
+    """Строит ключ кеша с учетом текущих поколений"""
+    cache = get_metrics_cache()
+    scopes = ['global', _user_scope(role, user_id)]
+    generations = cache.get_many([_generation_key(scope) for scope in scopes])
+    parts = [str(generations.get(_generation_key(scope), 0)) for scope in scopes]
+    return f'metrics:{namespace}:{role}:{user_id or 0}:{period}:' + '.'.join(parts)
+
+
+def get_or_compute(namespace, role, user_id, period, compute, timeout=None):
+    """
+    Возвращает метрики из кеша или вычисляет их.
+    Конкурентные запросы одного ключа ждут первый пересчет, а не повторяют его.
+    """
+    cache = get_metrics_cache()
+    key = build_key(namespace, role, user_id, period)
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count('hits')
+        return value
+
+    stripe = _key_locks[zlib.crc32(key.encode()) % _LOCK_STRIPES]
+    with stripe:
+        # Пока ждали блокировку, значение мог посчитать другой поток
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('coalesced')
+            _count('hits')
+            return value
+
+        _count('misses')
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, _lock_timeout()):
+            # Ключ пересчитывает другой процесс - ждем его результат
+            value = _wait_for_value(cache, key)
+            if value is not _MISSING:
+                _count('coalesced')
+                return value
+        try:
+            value = compute()
+            cache.set(key, value, _timeout() if timeout is None else timeout)
+        finally:
+            cache.delete(lock_key)
+    return value
+
+
+def _wait_for_value(cache, key):
+    deadline = time.monotonic() + _lock_timeout()
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        delay = min(delay * 2, 0.5)
+    return _MISSING
+
+
+def invalidate(*scopes):
+    """Сдвигает поколения указанных областей: 'global', 'owner', 'user:<id>'"""
+    cache = get_metrics_cache()
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        # Поколения живут дольше самих метрик, чтобы не переиспользовать старые ключи
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+        _count('invalidations')
+
+
+def invalidate_users(user_ids, include_owner=True):
+    """Инвалидирует метрики сотрудников и, при необходимости, владельца"""
+    scopes = [f'user:{user_id}' for user_id in user_ids if user_id]
+    if include_owner:
+        scopes.append('owner')
+    invalidate(*scopes)
+
+
+def get_stats():
+    """Счетчики попаданий и промахов для настройки кеша"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
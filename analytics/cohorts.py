@@ -0,0 +1,308 @@
+# analytics/cohorts.py
+"""
+Когорты клиентов и LTV.
+
+Клиенты обрабатываются пачками по возрастанию pk (keyset-пагинация): на пачку
+приходится три запроса, LTV клиентов пачки сразу записывается,
+а в памяти копятся только итоги когорт (месяц x источник x месяц жизни).
+Учитываются завершенные заказы, месяц заказа - месяц завершения. Месяц
+привлечения - месяц создания карточки клиента или месяц первого заказа, если
+он раньше (карточка, оставшаяся после объединения дублей, бывает новее заказов).
+
+Объединение дублей переносит заказы UPDATE'ом; refresh_merged пересчитывает
+LTV оставшихся клиентов и только затронутые когорты, не дожидаясь полного
+пересчета.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from customer_clients.models import Client
+from orders.models import Order, OrderItem, item_cost
+from .models import ClientCohort, CohortPeriodStat, ClientLifetimeValue
+from .rollups import local_date
+
+DEFAULT_BATCH_SIZE = 2000
+
+_ZERO = Decimal('0.00')
+
+
+def month_start(value):
+    """Первый день месяца для datetime в часовом поясе проекта"""
+    return local_date(value).replace(day=1)
+
+
+def months_between(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def _client_batches(batch_size):
+    last_pk = 0
+    while True:
+        batch = list(
+            Client.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values('pk', 'source', 'created_at')[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]['pk']
+
+
+def _order_months(client_ids):
+    """{client_id: {месяц: [заказов, выручка, прибыль]}} и даты первого/последнего заказа"""
+    months = defaultdict(lambda: defaultdict(lambda: [0, _ZERO, _ZERO]))
+    bounds = {}
+
+    orders = Order.objects.filter(
+        client_id__in=client_ids, status='completed', completed_at__isnull=False
+    ).values_list('client_id', 'completed_at')
+    for client_id, completed_at in orders.iterator():
+        months[client_id][month_start(completed_at)][0] += 1
+        first, last = bounds.get(client_id, (completed_at, completed_at))
+        bounds[client_id] = (min(first, completed_at), max(last, completed_at))
+
+    items = OrderItem.objects.filter(
+        order__client_id__in=client_ids,
+        order__status='completed',
+        order__completed_at__isnull=False
+    ).values('order__client_id', 'order__completed_at').annotate(
+        revenue=Sum('price'),
+        cost=Sum(item_cost())
+    )
+    for row in items.iterator():
+        stat = months[row['order__client_id']][month_start(row['order__completed_at'])]
+        stat[1] += row['revenue'] or _ZERO
+        stat[2] += (row['revenue'] or _ZERO) - (row['cost'] or _ZERO)
+
+    return months, bounds
+
+
+def _cohort_totals():
+    return defaultdict(lambda: {
+        'clients_count': 0, 'ordering_clients': 0, 'repeat_clients': 0,
+        'orders_count': 0, 'revenue': _ZERO, 'profit': _ZERO,
+    })
+
+
+def _period_totals():
+    return defaultdict(lambda: {
+        'active_clients': 0, 'orders_count': 0, 'revenue': _ZERO, 'profit': _ZERO,
+    })
+
+
+def _process(batch, cohorts, periods):
+    """Добавляет клиентов пачки в итоги когорт и возвращает их LTV"""
+    months, bounds = _order_months([client['pk'] for client in batch])
+    lifetime_values = []
+
+    for client in batch:
+        client_months = months.get(client['pk'], {})
+        cohort_month = min([month_start(client['created_at']), *client_months])
+        cohort = cohorts[(cohort_month, client['source'])]
+        cohort['clients_count'] += 1
+
+        orders_count, revenue, profit = 0, _ZERO, _ZERO
+        for order_month, (month_orders, month_revenue, month_profit) in client_months.items():
+            period_stat = periods[(cohort_month, client['source'], months_between(cohort_month, order_month))]
+            period_stat['active_clients'] += 1
+            period_stat['orders_count'] += month_orders
+            period_stat['revenue'] += month_revenue
+            period_stat['profit'] += month_profit
+            orders_count += month_orders
+            revenue += month_revenue
+            profit += month_profit
+
+        if orders_count:
+            cohort['ordering_clients'] += 1
+        if orders_count > 1:
+            cohort['repeat_clients'] += 1
+        cohort['orders_count'] += orders_count
+        cohort['revenue'] += revenue
+        cohort['profit'] += profit
+
+        first_order_at, last_order_at = bounds.get(client['pk'], (None, None))
+        lifetime_values.append(ClientLifetimeValue(
+            client_id=client['pk'],
+            cohort_month=cohort_month,
+            source=client['source'],
+            orders_count=orders_count,
+            revenue=revenue,
+            profit=profit,
+            first_order_at=first_order_at,
+            last_order_at=last_order_at,
+        ))
+
+    return lifetime_values
+
+
+def _save_values(lifetime_values):
+    ClientLifetimeValue.objects.bulk_create(
+        lifetime_values,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['client'],
+        update_fields=[
+            'cohort_month', 'source', 'orders_count', 'revenue', 'profit',
+            'first_order_at', 'last_order_at', 'updated_at',
+        ],
+    )
+
+
+def _keys_q(keys):
+    """Условие на когорты из набора (месяц, источник)"""
+    condition = Q(pk__in=[])
+    for cohort_month, source in keys:
+        condition |= Q(cohort_month=cohort_month, source=source)
+    return condition
+
+
+def _replace_totals(cohorts, periods, keys=None):
+    """Заменяет итоги когорт атомарно: все или только когорты из keys"""
+    existing = ClientCohort.objects.all()
+    existing_periods = CohortPeriodStat.objects.all()
+    if keys is not None:
+        existing = existing.filter(_keys_q(keys))
+        existing_periods = existing_periods.filter(_keys_q(keys))
+
+    with transaction.atomic():
+        existing.delete()
+        ClientCohort.objects.bulk_create([
+            ClientCohort(cohort_month=cohort_month, source=source, **values)
+            for (cohort_month, source), values in cohorts.items()
+        ], batch_size=500)
+        existing_periods.delete()
+        CohortPeriodStat.objects.bulk_create([
+            CohortPeriodStat(cohort_month=cohort_month, source=source, period=period, **values)
+            for (cohort_month, source, period), values in periods.items()
+        ], batch_size=500)
+
+
+def build(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Полный пересчет когорт и LTV. Возвращает число обработанных клиентов.
+    Итоги когорт заменяются атомарно, чтобы дашборд не видел частичных данных.
+    """
+    cohorts = _cohort_totals()
+    periods = _period_totals()
+    processed = 0
+
+    for batch in _client_batches(batch_size):
+        _save_values(_process(batch, cohorts, periods))
+        processed += len(batch)
+
+    # Удаленные клиенты исчезают из LTV вместе с карточкой (CASCADE)
+    _replace_totals(cohorts, periods)
+    return processed
+
+
+def refresh_merged(merges, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Пересчет после объединения дублей: merges - {id дубля: id оставшегося клиента}.
+    LTV оставшихся клиентов пересчитывается, LTV дублей удаляется, а когорты,
+    в которые входили или теперь входят эти клиенты, пересчитываются целиком.
+    До первого полного пересчета ничего не делает.
+    """
+    if not ClientLifetimeValue.objects.exists():
+        return
+    duplicate_ids = list(merges)
+    target_ids = set(merges.values()) - set(duplicate_ids)
+
+    with transaction.atomic():
+        keys = set(ClientLifetimeValue.objects.filter(
+            client_id__in=[*duplicate_ids, *target_ids]
+        ).values_list('cohort_month', 'source'))
+        ClientLifetimeValue.objects.filter(client_id__in=duplicate_ids).delete()
+
+        targets = list(Client.objects.filter(pk__in=target_ids).values('pk', 'source', 'created_at'))
+        lifetime_values = _process(targets, _cohort_totals(), _period_totals())
+        _save_values(lifetime_values)
+        keys.update((value.cohort_month, value.source) for value in lifetime_values)
+        if not keys:
+            return
+
+        member_ids = list(
+            ClientLifetimeValue.objects.filter(_keys_q(keys)).order_by('client_id').values_list('client_id', flat=True)
+        )
+
+        cohorts = _cohort_totals()
+        periods = _period_totals()
+        for offset in range(0, len(member_ids), batch_size):
+            batch = list(
+                Client.objects.filter(pk__in=member_ids[offset:offset + batch_size])
+                .order_by('pk')
+                .values('pk', 'source', 'created_at')
+            )
+            _save_values(_process(batch, cohorts, periods))
+        _replace_totals(cohorts, periods, keys)
+
+
+def get_cohort_matrix(source=None, start=None, end=None):
+    """
+    Матрица когорт для дашборда: строки - месяцы привлечения,
+    ячейки - показатели по месяцам жизни. Без source источники суммируются.
+    """
+    cohorts = ClientCohort.objects.all()
+    periods = CohortPeriodStat.objects.all()
+    if source:
+        cohorts = cohorts.filter(source=source)
+        periods = periods.filter(source=source)
+    if start:
+        cohorts = cohorts.filter(cohort_month__gte=start)
+        periods = periods.filter(cohort_month__gte=start)
+    if end:
+        cohorts = cohorts.filter(cohort_month__lte=end)
+        periods = periods.filter(cohort_month__lte=end)
+
+    rows = {}
+    for cohort in cohorts.values('cohort_month').annotate(
+        clients=Sum('clients_count'),
+        ordering=Sum('ordering_clients'),
+        repeat=Sum('repeat_clients'),
+        orders=Sum('orders_count'),
+        revenue_total=Sum('revenue'),
+        profit_total=Sum('profit'),
+    ).order_by('cohort_month'):
+        clients = cohort['clients'] or 0
+        rows[cohort['cohort_month']] = {
+            'cohort_month': cohort['cohort_month'].strftime('%Y-%m'),
+            'clients': clients,
+            'ordering_clients': cohort['ordering'] or 0,
+            'repeat_rate': round((cohort['repeat'] or 0) * 100 / clients, 2) if clients else 0,
+            'orders': cohort['orders'] or 0,
+            'revenue': float(cohort['revenue_total'] or 0),
+            'profit': float(cohort['profit_total'] or 0),
+            'ltv': float((cohort['revenue_total'] or 0) / clients) if clients else 0,
+            'periods': [],
+        }
+
+    for stat in periods.values('cohort_month', 'period').annotate(
+        active=Sum('active_clients'),
+        orders=Sum('orders_count'),
+        revenue_total=Sum('revenue'),
+        profit_total=Sum('profit'),
+    ).order_by('cohort_month', 'period'):
+        row = rows.get(stat['cohort_month'])
+        if row is None:
+            continue
+        row['periods'].append({
+            'period': stat['period'],
+            'active_clients': stat['active'] or 0,
+            'retention': round((stat['active'] or 0) * 100 / row['clients'], 2) if row['clients'] else 0,
+            'orders': stat['orders'] or 0,
+            'revenue': float(stat['revenue_total'] or 0),
+            'profit': float(stat['profit_total'] or 0),
+        })
+
+    return list(rows.values())
+
+
+def get_top_clients(limit=20, source=None):
+    """Клиенты с наибольшей накопленной выручкой"""
+    values = ClientLifetimeValue.objects.select_related('client').order_by('-revenue', 'client_id')
+    if source:
+        values = values.filter(source=source)
+    return list(values[:limit])
@@ -0,0 +1,316 @@
+# analytics/leaderboards.py
+"""
+Рейтинги менеджеров и монтажников.
+
+Значения хранятся в LeaderboardEntry уже с местами, поэтому чтение рейтинга -
+это выборка первых k строк по индексу (board, window, rank). Завершение заказа
+пересчитывает только его менеджера и монтажников, после чего места
+переставляются только у строк со значениями между прежними и новыми.
+Окна скользящие, поэтому раз в сутки нужен полный пересчет командой
+rebuild_leaderboards; пустые рейтинги строятся при первом чтении.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, item_profit
+from .models import LeaderboardEntry
+
+WINDOWS = ('7d', '30d', '90d', 'ytd')
+
+MANAGER_BOARDS = ('manager_revenue', 'manager_orders', 'manager_margin', 'manager_attach_rate')
+INSTALLER_BOARDS = ('installer_jobs', 'installer_on_time', 'installer_km')
+
+_CENT = Decimal('0.01')
+
+
+def window_starts(today=None):
+    """Первый день каждого окна (окна включают сегодняшний день)"""
+    today = today or timezone.localdate()
+    return {
+        '7d': today - timedelta(days=6),
+        '30d': today - timedelta(days=29),
+        '90d': today - timedelta(days=89),
+        'ytd': today.replace(month=1, day=1),
+    }
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _percent(part, total):
+    if not total:
+        return Decimal('0.00')
+    return (Decimal(part) * 100 / Decimal(total)).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _manager_values(starts, user_ids=None):
+    """{(board, window, user_id): value} для менеджеров"""
+    earliest = _aware(min(starts.values()))
+    values = {}
+
+    additional_items = OrderItem.objects.filter(
+        order=OuterRef('pk'), service__category='additional'
+    )
+    orders = Order.objects.filter(
+        status='completed', completed_at__gte=earliest
+    ).annotate(has_additional=Exists(additional_items))
+    if user_ids is not None:
+        orders = orders.filter(manager_id__in=user_ids)
+
+    aggregates = {}
+    for window, start in starts.items():
+        in_window = Q(completed_at__gte=_aware(start))
+        aggregates[f'revenue_{window}'] = Sum('total_cost', filter=in_window)
+        aggregates[f'orders_{window}'] = Count('id', filter=in_window)
+        aggregates[f'attached_{window}'] = Count('id', filter=in_window & Q(has_additional=True))
+
+    for row in orders.values('manager_id').annotate(**aggregates):
+        user_id = row['manager_id']
+        for window in starts:
+            orders_count = row[f'orders_{window}']
+            if not orders_count:
+                continue
+            values[('manager_revenue', window, user_id)] = _money(row[f'revenue_{window}'])
+            values[('manager_orders', window, user_id)] = Decimal(orders_count)
+            values[('manager_attach_rate', window, user_id)] = _percent(row[f'attached_{window}'], orders_count)
+            values[('manager_margin', window, user_id)] = Decimal('0.00')
+
+    items = OrderItem.objects.filter(
+        order__status='completed', order__completed_at__gte=earliest
+    )
+    if user_ids is not None:
+        items = items.filter(order__manager_id__in=user_ids)
+    margin_aggregates = {
+        f'margin_{window}': Sum(item_profit(), filter=Q(order__completed_at__gte=_aware(start)))
+        for window, start in starts.items()
+    }
+    for row in items.values('order__manager_id').annotate(**margin_aggregates):
+        for window in starts:
+            key = ('manager_margin', window, row['order__manager_id'])
+            if key in values:
+                values[key] = _money(row[f'margin_{window}'])
+
+    return values
+
+
+def _installer_values(starts, user_ids=None):
+    """{(board, window, user_id): value} для монтажников"""
+    from calendar_app.models import InstallationSchedule, RouteOptimization
+
+    earliest_day = min(starts.values())
+    values = {}
+
+    jobs = Order.objects.filter(
+        status='completed', completed_at__gte=_aware(earliest_day)
+    )
+    if user_ids is not None:
+        jobs = jobs.filter(installers__id__in=user_ids)
+    else:
+        jobs = jobs.filter(installers__isnull=False)
+    job_aggregates = {
+        f'jobs_{window}': Count('id', filter=Q(completed_at__gte=_aware(start)), distinct=True)
+        for window, start in starts.items()
+    }
+    for row in jobs.values('installers').annotate(**job_aggregates):
+        for window in starts:
+            if row[f'jobs_{window}']:
+                values[('installer_jobs', window, row['installers'])] = Decimal(row[f'jobs_{window}'])
+
+    # В срок - фактическое окончание не позже планового окончания монтажа
+    schedules = InstallationSchedule.objects.filter(
+        status='completed',
+        actual_end_time__isnull=False,
+        scheduled_date__gte=earliest_day,
+        installers__isnull=False
+    )
+    if user_ids is not None:
+        schedules = schedules.filter(installers__id__in=user_ids)
+    counters = {}
+    for row in schedules.values('installers', 'scheduled_date', 'scheduled_time_end', 'actual_end_time'):
+        planned_end = timezone.make_aware(datetime.combine(row['scheduled_date'], row['scheduled_time_end']))
+        on_time = row['actual_end_time'] <= planned_end
+        for window, start in starts.items():
+            if row['scheduled_date'] >= start:
+                total, done = counters.get((window, row['installers']), (0, 0))
+                counters[(window, row['installers'])] = (total + 1, done + int(on_time))
+    for (window, user_id), (total, done) in counters.items():
+        values[('installer_on_time', window, user_id)] = _percent(done, total)
+
+    routes = RouteOptimization.objects.filter(
+        date__gte=earliest_day, total_distance__isnull=False
+    )
+    if user_ids is not None:
+        routes = routes.filter(installer_id__in=user_ids)
+    km_aggregates = {
+        f'km_{window}': Sum('total_distance', filter=Q(date__gte=start))
+        for window, start in starts.items()
+    }
+    for row in routes.values('installer_id').annotate(**km_aggregates):
+        for window in starts:
+            if row[f'km_{window}']:
+                values[('installer_km', window, row['installer_id'])] = _money(row[f'km_{window}'])
+
+    return values
+
+
+def _widen(spans, group, old, new):
+    """
+    Расширяет диапазон значений группы, в котором меняются места.
+    old/new None - строки не было (не стало): сдвигаются все места ниже.
+    """
+    present = [value for value in (old, new) if value is not None]
+    low = min(present) if len(present) == 2 else None
+    high = max(present)
+    if group in spans:
+        span_low, span_high = spans[group]
+        low = None if low is None or span_low is None else min(low, span_low)
+        high = max(high, span_high)
+    spans[group] = (low, high)
+
+
+def _store(boards, values, user_ids=None):
+    """Заменяет значения рейтингов (всех или указанных сотрудников) и переставляет места"""
+    with transaction.atomic():
+        if user_ids is None:
+            LeaderboardEntry.objects.filter(board__in=boards).delete()
+            LeaderboardEntry.objects.bulk_create([
+                LeaderboardEntry(board=board, window=window, user_id=user_id, value=value)
+                for (board, window, user_id), value in values.items()
+            ], batch_size=500)
+            _rerank({(board, window): (None, None) for board in boards for window in WINDOWS})
+            return
+
+        existing = {
+            (entry.board, entry.window, entry.user_id): entry
+            for entry in LeaderboardEntry.objects.filter(board__in=boards, user_id__in=user_ids)
+        }
+        spans = {}
+        created = []
+        changed = []
+        now = timezone.now()
+        for key, value in values.items():
+            entry = existing.get(key)
+            if entry is None:
+                # Новая строка сдвигает все места ниже своего значения
+                _widen(spans, key[:2], None, value)
+                created.append(LeaderboardEntry(board=key[0], window=key[1], user_id=key[2], value=value))
+            elif entry.value != value:
+                _widen(spans, key[:2], entry.value, value)
+                entry.value = value
+                entry.updated_at = now
+                changed.append(entry)
+        removed = [entry for key, entry in existing.items() if key not in values]
+        for entry in removed:
+            _widen(spans, (entry.board, entry.window), None, entry.value)
+
+        LeaderboardEntry.objects.filter(pk__in=[entry.pk for entry in removed]).delete()
+        LeaderboardEntry.objects.bulk_update(changed, ['value', 'updated_at'], batch_size=500)
+        LeaderboardEntry.objects.bulk_create(created, batch_size=500)
+        _rerank(spans)
+
+
+def _rerank(spans):
+    """
+    Места с учетом равенства значений (1, 2, 2, 4) для строк групп (board, window)
+    со значениями из диапазона [low, high]. Место - 1 + число строк с большим
+    значением, поэтому у строк вне диапазона изменений оно не меняется.
+    """
+    if not spans:
+        return
+    above = Q(pk__in=[])
+    in_span = Q(pk__in=[])
+    for (board, window), (low, high) in spans.items():
+        group = Q(board=board, window=window)
+        if high is not None:
+            above |= group & Q(value__gt=high)
+            group &= Q(value__lte=high)
+        if low is not None:
+            group &= Q(value__gte=low)
+        in_span |= group
+    offsets = {
+        (row['board'], row['window']): row['count']
+        for row in LeaderboardEntry.objects.filter(above).values('board', 'window').annotate(count=Count('id'))
+    }
+    entries = LeaderboardEntry.objects.filter(in_span).order_by(
+        'board', 'window', '-value', 'user_id'
+    ).only('id', 'board', 'window', 'value', 'rank')
+
+    changed = []
+    group = None
+    position = rank = 0
+    previous_value = None
+    for entry in entries:
+        if (entry.board, entry.window) != group:
+            group = (entry.board, entry.window)
+            position = offsets.get(group, 0)
+            previous_value = None
+        position += 1
+        if entry.value != previous_value:
+            rank = position
+            previous_value = entry.value
+        if entry.rank != rank:
+            entry.rank = rank
+            changed.append(entry)
+    LeaderboardEntry.objects.bulk_update(changed, ['rank'], batch_size=500)
+
+
+def refresh_users(manager_ids=(), installer_ids=(), today=None):
+    """Инкрементальный пересчет рейтингов для затронутых сотрудников"""
+    starts = window_starts(today)
+    manager_ids = {user_id for user_id in manager_ids if user_id}
+    installer_ids = {user_id for user_id in installer_ids if user_id}
+    if manager_ids:
+        _store(MANAGER_BOARDS, _manager_values(starts, manager_ids), manager_ids)
+    if installer_ids:
+        _store(INSTALLER_BOARDS, _installer_values(starts, installer_ids), installer_ids)
+
+
+def rebuild(today=None):
+    """Полный пересчет всех рейтингов (нужен ежедневно: окна сдвигаются)"""
+    starts = window_starts(today)
+    _store(MANAGER_BOARDS, _manager_values(starts))
+    _store(INSTALLER_BOARDS, _installer_values(starts))
+
+
+def get_leaderboard(board, window='30d', limit=10):
+    """Первые limit мест рейтинга"""
+    entries = LeaderboardEntry.objects.filter(board=board, window=window).select_related('user').order_by(
+        'rank', 'user_id'
+    )
+    result = list(entries[:limit])
+    if not result and not LeaderboardEntry.objects.exists():
+        # Рейтинги еще ни разу не строились (новая установка) - строим при первом чтении
+        rebuild()
+        result = list(entries[:limit])
+    return result
+
+
+def top_managers(limit=5, window='ytd'):
+    """Топ менеджеров по выручке в формате прежнего get_top_managers"""
+    entries = get_leaderboard('manager_revenue', window, limit)
+    orders = dict(
+        LeaderboardEntry.objects.filter(
+            board='manager_orders', window=window,
+            user_id__in=[entry.user_id for entry in entries]
+        ).values_list('user_id', 'value')
+    )
+    return [
+        {
+            'manager__id': entry.user_id,
+            'manager__first_name': entry.user.first_name,
+            'manager__last_name': entry.user.last_name,
+            'orders_count': int(orders.get(entry.user_id, 0)),
+            'revenue': entry.value,
+            'rank': entry.rank,
+        }
+        for entry in entries
+    ]
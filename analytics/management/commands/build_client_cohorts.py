@@ -0,0 +1,25 @@
+# analytics/management/commands/build_client_cohorts.py
+from django.core.management.base import BaseCommand
+
+from analytics import cohorts
+from analytics.models import ClientCohort
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает когорты клиентов и LTV пачками по клиентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=cohorts.DEFAULT_BATCH_SIZE,
+            help='Количество клиентов в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        processed = cohorts.build(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано клиентов: {processed}, когорт: {ClientCohort.objects.count()}'
+            )
+        )
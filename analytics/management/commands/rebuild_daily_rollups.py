@@ -0,0 +1,61 @@
+# analytics/management/commands/rebuild_daily_rollups.py
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics import rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки аналитики за период (по умолчанию - за всю историю)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=str,
+            help='Начальная дата (YYYY-MM-DD). По умолчанию - дата первой записи'
+        )
+        parser.add_argument(
+            '--end-date',
+            type=str,
+            help='Конечная дата (YYYY-MM-DD). По умолчанию - сегодня'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=366,
+            help='Размер пачки в днях'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start_date = self._parse_date(options['start_date']) or rollups.first_date()
+            end_date = self._parse_date(options['end_date']) or timezone.localdate()
+        except ValueError:
+            self.stdout.write(
+                self.style.ERROR('Неверный формат даты. Используйте YYYY-MM-DD')
+            )
+            return
+
+        if start_date is None:
+            self.stdout.write('Нет данных для пересчета')
+            return
+
+        chunk = max(options['chunk_days'], 1)
+        total = 0
+        current = start_date
+        while current <= end_date:
+            chunk_end = min(current + timedelta(days=chunk - 1), end_date)
+            total += rollups.rebuild(current, chunk_end)
+            self.stdout.write(f'  {current} - {chunk_end}')
+            current = chunk_end + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано дневных сводок: {total}')
+        )
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
@@ -0,0 +1,15 @@
+# analytics/management/commands/rebuild_leaderboards.py
+from django.core.management.base import BaseCommand
+
+from analytics import leaderboards
+from analytics.models import LeaderboardEntry
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчет рейтингов сотрудников (запускать ежедневно: окна скользящие)'
+
+    def handle(self, *args, **options):
+        leaderboards.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано позиций в рейтингах: {LeaderboardEntry.objects.count()}')
+        )
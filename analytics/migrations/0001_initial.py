@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Дата')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Новых заказов')),
+                ('completed_orders', models.PositiveIntegerField(default=0, verbose_name='Завершенных заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Себестоимость')),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Прибыль')),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Доходы')),
+                ('expense', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Расходы')),
+                ('new_clients', models.PositiveIntegerField(default=0, verbose_name='Новых клиентов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка',
+                'verbose_name_plural': 'Дневные сводки',
+                'ordering': ['date'],
+            },
+        ),
+    ]
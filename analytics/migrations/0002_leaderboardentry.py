@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('manager_revenue', 'Менеджеры: выручка'), ('manager_orders', 'Менеджеры: завершенные заказы'), ('manager_margin', 'Менеджеры: маржа'), ('manager_attach_rate', 'Менеджеры: доля заказов с доп. услугами'), ('installer_jobs', 'Монтажники: выполненные заказы'), ('installer_on_time', 'Монтажники: доля монтажей в срок'), ('installer_km', 'Монтажники: пробег (км)')], max_length=30, verbose_name='Рейтинг')),
+                ('window', models.CharField(choices=[('7d', '7 дней'), ('30d', '30 дней'), ('90d', '90 дней'), ('ytd', 'С начала года')], max_length=5, verbose_name='Период')),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Значение')),
+                ('rank', models.PositiveIntegerField(default=0, verbose_name='Место')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Позиция в рейтинге',
+                'verbose_name_plural': 'Рейтинги сотрудников',
+                'ordering': ['board', 'window', 'rank'],
+                'indexes': [models.Index(fields=['board', 'window', 'rank'], name='leaderboard_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('board', 'window', 'user'), name='unique_leaderboard_entry'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_clients', '0001_initial'),
+        ('analytics', '0002_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientCohort',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort_month', models.DateField(verbose_name='Месяц привлечения')),
+                ('source', models.CharField(max_length=15, verbose_name='Источник')),
+                ('clients_count', models.PositiveIntegerField(default=0, verbose_name='Клиентов')),
+                ('ordering_clients', models.PositiveIntegerField(default=0, verbose_name='Клиентов с заказами')),
+                ('repeat_clients', models.PositiveIntegerField(default=0, verbose_name='Клиентов с повторными заказами')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Прибыль')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Когорта клиентов',
+                'verbose_name_plural': 'Когорты клиентов',
+                'ordering': ['cohort_month', 'source'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClientLifetimeValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort_month', models.DateField(verbose_name='Месяц привлечения')),
+                ('source', models.CharField(max_length=15, verbose_name='Источник')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Прибыль')),
+                ('first_order_at', models.DateTimeField(blank=True, null=True, verbose_name='Первый заказ')),
+                ('last_order_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний заказ')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Ценность клиента',
+                'verbose_name_plural': 'Ценность клиентов',
+            },
+        ),
+        migrations.CreateModel(
+            name='CohortPeriodStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort_month', models.DateField(verbose_name='Месяц привлечения')),
+                ('source', models.CharField(max_length=15, verbose_name='Источник')),
+                ('period', models.PositiveIntegerField(verbose_name='Месяц жизни')),
+                ('active_clients', models.PositiveIntegerField(default=0, verbose_name='Активных клиентов')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Прибыль')),
+            ],
+            options={
+                'verbose_name': 'Показатель когорты',
+                'verbose_name_plural': 'Показатели когорт',
+                'ordering': ['cohort_month', 'source', 'period'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cohortperiodstat',
+            constraint=models.UniqueConstraint(fields=('cohort_month', 'source', 'period'), name='unique_cohort_period'),
+        ),
+        migrations.AddField(
+            model_name='clientlifetimevalue',
+            name='client',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lifetime_value', to='customer_clients.client', verbose_name='Клиент'),
+        ),
+        migrations.AddConstraint(
+            model_name='clientcohort',
+            constraint=models.UniqueConstraint(fields=('cohort_month', 'source'), name='unique_client_cohort'),
+        ),
+        migrations.AddIndex(
+            model_name='clientlifetimevalue',
+            index=models.Index(fields=['-revenue'], name='client_ltv_revenue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientlifetimevalue',
+            index=models.Index(fields=['cohort_month', 'source'], name='client_ltv_cohort_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-19 02:10
+from datetime import timedelta
+
+from django.db import migrations
+from django.utils import timezone
+
+CHUNK_DAYS = 366
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """
+    Сводки за всю историю: финансовые отчеты читают только DailyRollup.
+    Считает рабочий код сводок, поэтому миграция зависит от последних
+    миграций читаемых таблиц.
+    """
+    from analytics import rollups
+
+    start = rollups.first_date()
+    end = timezone.localdate()
+    while start is not None and start <= end:
+        chunk_end = min(start + timedelta(days=CHUNK_DAYS - 1), end)
+        rollups.rebuild(start, chunk_end)
+        start = chunk_end + timedelta(days=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_client_cohorts'),
+        ('customer_clients', '0003_client_dedup'),
+        ('finance', '0003_transaction_kind'),
+        ('orders', '0002_orderitem_cost_price_at_sale'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,142 @@
+# analytics/models.py
+from django.db import models
+
+
+class DailyRollup(models.Model):
+    """Предагрегированные показатели компании за один день"""
+    date = models.DateField(unique=True, verbose_name="Дата")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Новых заказов")
+    completed_orders = models.PositiveIntegerField(default=0, verbose_name="Завершенных заказов")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Себестоимость")
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Прибыль")
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Доходы")
+    expense = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Расходы")
+    new_clients = models.PositiveIntegerField(default=0, verbose_name="Новых клиентов")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Пересчитано")
+
+    def __str__(self):
+        return f"Сводка за {self.date}"
+
+    class Meta:
+        verbose_name = "Дневная сводка"
+        verbose_name_plural = "Дневные сводки"
+        ordering = ['date']
+
+
+class LeaderboardEntry(models.Model):
+    """Место сотрудника в рейтинге за скользящее окно"""
+    BOARD_CHOICES = (
+        ('manager_revenue', 'Менеджеры: выручка'),
+        ('manager_orders', 'Менеджеры: завершенные заказы'),
+        ('manager_margin', 'Менеджеры: маржа'),
+        ('manager_attach_rate', 'Менеджеры: доля заказов с доп. услугами'),
+        ('installer_jobs', 'Монтажники: выполненные заказы'),
+        ('installer_on_time', 'Монтажники: доля монтажей в срок'),
+        ('installer_km', 'Монтажники: пробег (км)'),
+    )
+
+    WINDOW_CHOICES = (
+        ('7d', '7 дней'),
+        ('30d', '30 дней'),
+        ('90d', '90 дней'),
+        ('ytd', 'С начала года'),
+    )
+
+    board = models.CharField(max_length=30, choices=BOARD_CHOICES, verbose_name="Рейтинг")
+    window = models.CharField(max_length=5, choices=WINDOW_CHOICES, verbose_name="Период")
+    user = models.ForeignKey('user_accounts.User', on_delete=models.CASCADE, related_name='leaderboard_entries', verbose_name="Сотрудник")
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Значение")
+    rank = models.PositiveIntegerField(default=0, verbose_name="Место")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Пересчитано")
+
+    def __str__(self):
+        return f"{self.get_board_display()} ({self.window}): {self.rank}. {self.user}"
+
+    class Meta:
+        verbose_name = "Позиция в рейтинге"
+        verbose_name_plural = "Рейтинги сотрудников"
+        ordering = ['board', 'window', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'window', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['board', 'window', 'rank'], name='leaderboard_rank_idx'),
+        ]
+
+
+class ClientCohort(models.Model):
+    """Когорта клиентов: месяц привлечения и источник"""
+    cohort_month = models.DateField(verbose_name="Месяц привлечения")
+    source = models.CharField(max_length=15, verbose_name="Источник")
+    clients_count = models.PositiveIntegerField(default=0, verbose_name="Клиентов")
+    ordering_clients = models.PositiveIntegerField(default=0, verbose_name="Клиентов с заказами")
+    repeat_clients = models.PositiveIntegerField(default=0, verbose_name="Клиентов с повторными заказами")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Прибыль")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Пересчитано")
+
+    @property
+    def repeat_rate(self):
+        """Доля клиентов когорты, сделавших больше одного заказа (%)"""
+        if not self.clients_count:
+            return 0
+        return round(self.repeat_clients * 100 / self.clients_count, 2)
+
+    def __str__(self):
+        return f"Когорта {self.cohort_month:%Y-%m} ({self.source})"
+
+    class Meta:
+        verbose_name = "Когорта клиентов"
+        verbose_name_plural = "Когорты клиентов"
+        ordering = ['cohort_month', 'source']
+        constraints = [
+            models.UniqueConstraint(fields=['cohort_month', 'source'], name='unique_client_cohort'),
+        ]
+
+
+class CohortPeriodStat(models.Model):
+    """Показатели когорты в N-й месяц после привлечения"""
+    cohort_month = models.DateField(verbose_name="Месяц привлечения")
+    source = models.CharField(max_length=15, verbose_name="Источник")
+    period = models.PositiveIntegerField(verbose_name="Месяц жизни")
+    active_clients = models.PositiveIntegerField(default=0, verbose_name="Активных клиентов")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Прибыль")
+
+    def __str__(self):
+        return f"Когорта {self.cohort_month:%Y-%m} ({self.source}), месяц {self.period}"
+
+    class Meta:
+        verbose_name = "Показатель когорты"
+        verbose_name_plural = "Показатели когорт"
+        ordering = ['cohort_month', 'source', 'period']
+        constraints = [
+            models.UniqueConstraint(fields=['cohort_month', 'source', 'period'], name='unique_cohort_period'),
+        ]
+
+
+class ClientLifetimeValue(models.Model):
+    """Накопленная ценность клиента (LTV) по завершенным заказам"""
+    client = models.OneToOneField('customer_clients.Client', on_delete=models.CASCADE, related_name='lifetime_value', verbose_name="Клиент")
+    cohort_month = models.DateField(verbose_name="Месяц привлечения")
+    source = models.CharField(max_length=15, verbose_name="Источник")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Прибыль")
+    first_order_at = models.DateTimeField(null=True, blank=True, verbose_name="Первый заказ")
+    last_order_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний заказ")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Пересчитано")
+
+    def __str__(self):
+        return f"LTV {self.client_id}: {self.revenue}"
+
+    class Meta:
+        verbose_name = "Ценность клиента"
+        verbose_name_plural = "Ценность клиентов"
+        indexes = [
+            models.Index(fields=['-revenue'], name='client_ltv_revenue_idx'),
+            models.Index(fields=['cohort_month', 'source'], name='client_ltv_cohort_idx'),
+        ]
@@ -0,0 +1,92 @@
+# analytics/outbox_handlers.py
+"""
+Обработчики событий outbox для аналитики.
+
+При ANALYTICS_VIA_OUTBOX = True (по умолчанию) дневные сводки, кэш метрик и
+рейтинги пересчитываются не в запросе, сохраняющем заказ, позицию или
+проводку, а процессом dispatch_events: пачка событий дает один пересчет
+затронутых дней и сотрудников.
+
+Удаления остаются синхронными: каскадные удаления событий не пишут, а
+участников удаленного заказа после удаления уже не узнать. Синхронными
+остаются и изменения без событий: монтажники заказа (m2m), клиенты,
+настройки зарплат, выплаты ведомости и объединение дублей.
+"""
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from events import dispatcher
+from orders.models import Order
+from . import cache as metrics_cache
+from . import leaderboards
+from . import rollups
+
+
+def analytics_via_outbox():
+    return getattr(settings, 'ANALYTICS_VIA_OUTBOX', True)
+
+
+def _saved(events):
+    """События сохранений (удаления обработаны синхронно)"""
+    return [event for event in events if not event.topic.endswith('.deleted')]
+
+
+def _order_ids(events):
+    return {event.aggregate_id for event in events if event.topic.startswith('order.')}
+
+
+def _installer_ids(order_ids):
+    return set(Order.installers.through.objects.filter(
+        order_id__in=list(order_ids)
+    ).values_list('user_id', flat=True))
+
+
+@dispatcher.register('analytics.leaderboards', topics=['order.'])
+def refresh_leaderboards(events):
+    if not analytics_via_outbox():
+        return
+    order_ids = set()
+    manager_ids = set()
+    for event in _saved(events):
+        if 'completed' in (event.payload.get('status'), event.payload.get('previous_status')):
+            order_ids.add(event.aggregate_id)
+            manager_ids.add(event.payload.get('manager_id'))
+    if not order_ids:
+        return
+    leaderboards.refresh_users(manager_ids=manager_ids, installer_ids=_installer_ids(order_ids))
+
+
+@dispatcher.register('analytics.rollups', topics=['order.', 'transaction.'])
+def refresh_rollups(events):
+    """Дни создания и завершения заказов (и прежний день завершения), дни проводок"""
+    if not analytics_via_outbox():
+        return
+    events = _saved(events)
+    days = set()
+    for event in events:
+        if event.topic.startswith('order.'):
+            days.add(rollups.local_date(parse_datetime(event.payload.get('previous_completed_at') or '')))
+        else:
+            days.add(rollups.local_date(parse_datetime(event.payload.get('created_at') or '')))
+    for created_at, completed_at in Order.objects.filter(
+        pk__in=list(_order_ids(events))
+    ).values_list('created_at', 'completed_at'):
+        days.update([rollups.local_date(created_at), rollups.local_date(completed_at)])
+    rollups.refresh_days(days)
+
+
+@dispatcher.register('analytics.metrics_cache', topics=['order.', 'order_item.', 'transaction.'])
+def invalidate_metrics(events):
+    """Заказ - менеджер и монтажники, позиция - продавец; владелец - всегда"""
+    if not analytics_via_outbox():
+        return
+    events = _saved(events)
+    if not events:
+        return
+    user_ids = {
+        event.payload.get('seller_id') for event in events if event.topic.startswith('order_item.')
+    }
+    order_ids = _order_ids(events)
+    user_ids.update(Order.objects.filter(pk__in=list(order_ids)).values_list('manager_id', flat=True))
+    user_ids.update(_installer_ids(order_ids))
+    metrics_cache.invalidate_users(user_ids)
@@ -0,0 +1,151 @@
+# analytics/rollups.py
+"""
+Поддержка дневных сводок (DailyRollup).
+
+Сигналы пересчитывают только затронутые дни, команда rebuild_daily_rollups
+заполняет сводки за произвольный диапазон. Историю до появления сводок
+заполняет миграция analytics 0004.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from customer_clients.models import Client
+from orders.models import Order, OrderItem, item_cost
+from finance.models import Transaction
+from .models import DailyRollup
+
+ROLLUP_FIELDS = [
+    'orders_count', 'completed_orders', 'revenue', 'cost',
+    'profit', 'income', 'expense', 'new_clients',
+]
+
+
+def local_date(value):
+    """Дата в часовом поясе проекта для datetime (или None)"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def _empty_row():
+    return {
+        'orders_count': 0,
+        'completed_orders': 0,
+        'revenue': Decimal('0'),
+        'cost': Decimal('0'),
+        'income': Decimal('0'),
+        'expense': Decimal('0'),
+        'new_clients': 0,
+    }
+
+
+def _collect(lookup, value):
+    """
+    Считает показатели по дням одним набором группирующих запросов.
+    lookup - 'in' (набор дат) или 'range' (кортеж начала и конца).
+    """
+    rows = {}
+
+    def row(day):
+        if day not in rows:
+            rows[day] = _empty_row()
+        return rows[day]
+
+    orders = Order.objects.filter(
+        **{f'created_at__date__{lookup}': value}
+    ).annotate(day=TruncDate('created_at')).values('day').annotate(total=Count('id'))
+    for stat in orders:
+        row(stat['day'])['orders_count'] = stat['total']
+
+    completed = Order.objects.filter(
+        status='completed',
+        **{f'completed_at__date__{lookup}': value}
+    ).annotate(day=TruncDate('completed_at')).values('day').annotate(total=Count('id'))
+    for stat in completed:
+        row(stat['day'])['completed_orders'] = stat['total']
+
+    sales = OrderItem.objects.filter(
+        order__status='completed',
+        **{f'order__completed_at__date__{lookup}': value}
+    ).annotate(day=TruncDate('order__completed_at')).values('day').annotate(
+        revenue=Sum('price'),
+        cost=Sum(item_cost())
+    )
+    for stat in sales:
+        day_row = row(stat['day'])
+        day_row['revenue'] = stat['revenue'] or Decimal('0')
+        day_row['cost'] = stat['cost'] or Decimal('0')
+
+    transactions = Transaction.objects.filter(
+        **{f'created_at__date__{lookup}': value}
+    ).annotate(day=TruncDate('created_at')).values('day', 'type').annotate(total=Sum('amount'))
+    for stat in transactions:
+        row(stat['day'])[stat['type']] = stat['total'] or Decimal('0')
+
+    clients = Client.objects.filter(
+        **{f'created_at__date__{lookup}': value}
+    ).annotate(day=TruncDate('created_at')).values('day').annotate(total=Count('id'))
+    for stat in clients:
+        row(stat['day'])['new_clients'] = stat['total']
+
+    return rows
+
+
+def _save(days, rows):
+    """Записывает сводки одним upsert-запросом на пачку"""
+    objects = []
+    for day in days:
+        data = rows.get(day) or _empty_row()
+        data['profit'] = data['revenue'] - data['cost']
+        objects.append(DailyRollup(date=day, **data))
+    DailyRollup.objects.bulk_create(
+        objects,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=ROLLUP_FIELDS + ['updated_at'],
+    )
+    return len(objects)
+
+
+def refresh_days(days):
+    """Пересчитывает сводки за указанные дни"""
+    days = sorted({day for day in days if day is not None})
+    if not days:
+        return 0
+    return _save(days, _collect('in', days))
+
+
+def rebuild(start, end):
+    """Пересчитывает сводки за каждый день диапазона включительно"""
+    if start > end:
+        return 0
+    rows = _collect('range', (start, end))
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    return _save(days, rows)
+
+
+def first_date():
+    """Дата первой записи, от которой зависят сводки (None - данных нет)"""
+    candidates = [
+        *Order.objects.aggregate(created=Min('created_at'), completed=Min('completed_at')).values(),
+        Transaction.objects.aggregate(first=Min('created_at'))['first'],
+        Client.objects.aggregate(first=Min('created_at'))['first'],
+    ]
+    dates = [local_date(value) for value in candidates if value]
+    return min(dates) if dates else None
+
+
+def order_days(order):
+    """Дни, на показатели которых влияет заказ (включая прежний день завершения)"""
+    return [
+        local_date(order.created_at),
+        local_date(order.completed_at),
+        local_date(order.__dict__.get('_old_completed_at')),
+    ]
@@ -0,0 +1,104 @@
+# analytics/service_mix.py
+"""
+Аналитика ассортимента: объем, выручка, себестоимость и маржа по услугам,
+категориям, продавцам и периодам.
+
+Все срезы считаются одним группирующим запросом по позициям завершенных
+заказов. Себестоимость берется из снимка на момент продажи
+(OrderItem.cost_price_at_sale), поэтому правка цены услуги не меняет историю.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter
+
+from orders.models import OrderItem, item_cost
+from .rollups import local_date
+
+# Допустимые измерения группировки и соответствующие поля
+DIMENSIONS = {
+    'service': ['service_id', 'service__name', 'service__category'],
+    'category': ['service__category'],
+    'seller': ['seller_id', 'seller__first_name', 'seller__last_name', 'seller__username'],
+    'period': ['period'],
+}
+
+PERIOD_FUNCTIONS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+
+def _margin_percent(margin, revenue):
+    if not revenue:
+        return 0.0
+    return round(float(margin / revenue * 100), 2)
+
+
+def get_service_breakdown(group_by=('service',), start=None, end=None, granularity='month',
+                          seller_id=None, category=None):
+    """
+    Срез показателей позиций завершенных заказов.
+    group_by - набор измерений из DIMENSIONS; start/end - даты завершения заказа.
+    """
+    group_by = list(group_by) or ['category']
+    unknown = [dimension for dimension in group_by if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f'Неизвестное измерение: {", ".join(unknown)}')
+    if 'period' in group_by and granularity not in PERIOD_FUNCTIONS:
+        raise ValueError(f'Неизвестная детализация: {granularity}')
+
+    items = OrderItem.objects.filter(order__status='completed')
+    if start:
+        items = items.filter(order__completed_at__date__gte=start)
+    if end:
+        items = items.filter(order__completed_at__date__lte=end)
+    if seller_id:
+        items = items.filter(seller_id=seller_id)
+    if category:
+        items = items.filter(service__category=category)
+    if 'period' in group_by:
+        items = items.annotate(period=PERIOD_FUNCTIONS[granularity]('order__completed_at'))
+
+    fields = []
+    for dimension in group_by:
+        fields.extend(DIMENSIONS[dimension])
+
+    rows = items.values(*fields).annotate(
+        volume=Count('id'),
+        orders=Count('order_id', distinct=True),
+        revenue=Sum('price'),
+        cost=Sum(item_cost()),
+    ).order_by(*fields)
+
+    result = []
+    for row in rows:
+        revenue = row.pop('revenue') or Decimal('0.00')
+        cost = row.pop('cost') or Decimal('0.00')
+        margin = revenue - cost
+        entry = {}
+        if 'service' in group_by:
+            entry['service_id'] = row['service_id']
+            entry['service_name'] = row['service__name']
+        if 'service' in group_by or 'category' in group_by:
+            entry['category'] = row['service__category']
+        if 'seller' in group_by:
+            entry['seller_id'] = row['seller_id']
+            entry['seller_name'] = (
+                f"{row['seller__first_name']} {row['seller__last_name']}".strip()
+                or row['seller__username']
+            )
+        if 'period' in group_by:
+            entry['period'] = local_date(row['period']).isoformat() if row['period'] else None
+        entry.update({
+            'volume': row['volume'],
+            'orders': row['orders'],
+            'revenue': float(revenue),
+            'cost': float(cost),
+            'margin': float(margin),
+            'margin_percent': _margin_percent(margin, revenue),
+        })
+        result.append(entry)
+    return result
@@ -0,0 +1,238 @@
+# analytics/signals.py
+from django.db.models import DEFERRED
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from customer_clients.models import Client
+from customer_clients.dedup import clients_merged
+from orders.models import Order, OrderItem
+from orders.completion import orders_transitioned
+from finance.models import Transaction
+from calendar_app.models import InstallationSchedule, RouteOptimization
+from salary_config.models import (
+    SalaryConfig, ManagerSalaryConfig, InstallerSalaryConfig,
+    OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment, PayrollRun
+)
+from salary_config.payroll import salary_paid
+from . import cache as metrics_cache
+from . import cohorts
+from . import rollups
+from . import leaderboards
+from .outbox_handlers import analytics_via_outbox
+
+
+@receiver([post_save, pre_delete], sender=Order)
+def invalidate_order_metrics(sender, instance, signal, **kwargs):
+    """Заказ влияет на владельца, своего менеджера и монтажников"""
+    if signal is post_save and analytics_via_outbox():
+        return
+    user_ids = [instance.manager_id]
+    if instance.pk:
+        user_ids += list(instance.installers.values_list('id', flat=True))
+    metrics_cache.invalidate_users(user_ids)
+
+
+@receiver(m2m_changed, sender=Order.installers.through)
+def invalidate_order_installers_metrics(sender, instance, action, pk_set, **kwargs):
+    """Смена монтажников меняет их статистику и зарплату"""
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if isinstance(instance, Order):
+        if action == 'pre_clear':
+            pk_set = set(instance.installers.values_list('id', flat=True))
+        metrics_cache.invalidate_users(pk_set or [], include_owner=False)
+    else:
+        # Изменение со стороны пользователя
+        metrics_cache.invalidate_users([instance.pk], include_owner=False)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_order_item_metrics(sender, instance, signal, **kwargs):
+    """Позиция влияет на продавца (бонусы с продаж) и владельца"""
+    if signal is post_save and analytics_via_outbox():
+        return
+    metrics_cache.invalidate_users([instance.seller_id])
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+def invalidate_transaction_metrics(sender, instance, signal, **kwargs):
+    """Транзакции видны только в показателях владельца"""
+    if signal is post_save and analytics_via_outbox():
+        return
+    metrics_cache.invalidate('owner')
+
+
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_client_metrics(sender, instance, **kwargs):
+    metrics_cache.invalidate('owner')
+
+
+@receiver([post_save, post_delete], sender=SalaryAdjustment)
+def invalidate_adjustment_metrics(sender, instance, **kwargs):
+    """Корректировка меняет зарплату конкретного сотрудника"""
+    metrics_cache.invalidate_users([instance.user_id], include_owner=False)
+
+
+@receiver([post_save, post_delete], sender=SalaryConfig)
+@receiver([post_save, post_delete], sender=ManagerSalaryConfig)
+@receiver([post_save, post_delete], sender=InstallerSalaryConfig)
+@receiver([post_save, post_delete], sender=OwnerSalaryConfig)
+@receiver([post_save, post_delete], sender=UserSalaryAssignment)
+def invalidate_salary_config_metrics(sender, instance, **kwargs):
+    """Изменение настроек зарплат затрагивает всех сотрудников"""
+    metrics_cache.invalidate('global')
+
+
+def _previous(instance, field, update_fields):
+    """Значение поля в БД до сохранения; поле, которое не сохраняется, не меняется"""
+    if update_fields is not None and field not in update_fields:
+        return getattr(instance, field)
+    value = getattr(instance, f'_loaded_{field}')
+    if value is DEFERRED:
+        value = Order.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    setattr(instance, f'_loaded_{field}', getattr(instance, field))
+    return value
+
+
+@receiver(pre_save, sender=Order)
+def track_order_analytics_fields(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем дату завершения и сумму из БД: прежний день сводок тоже
+    пересчитывается, а сохранение без их изменения не трогает рейтинги"""
+    instance._old_completed_at = _previous(instance, 'completed_at', update_fields)
+    instance._old_total_cost = _previous(instance, 'total_cost', update_fields)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def refresh_order_rollups(sender, instance, signal, **kwargs):
+    """Пересчет дневных сводок за дни создания и завершения заказа"""
+    if signal is post_save and analytics_via_outbox():
+        return
+    rollups.refresh_days(rollups.order_days(instance))
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_item_rollups(sender, instance, **kwargs):
+    """Удаление позиции меняет выручку дня завершения заказа"""
+    # Сохранение позиции пересохраняет заказ, поэтому отдельно ловим только удаление
+    completed_at = Order.objects.filter(
+        pk=instance.order_id, status='completed'
+    ).values_list('completed_at', flat=True).first()
+    if completed_at:
+        rollups.refresh_days([rollups.local_date(completed_at)])
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+def refresh_transaction_rollups(sender, instance, signal, **kwargs):
+    if signal is post_save and analytics_via_outbox():
+        return
+    rollups.refresh_days([rollups.local_date(instance.created_at)])
+
+
+@receiver(salary_paid, sender=PayrollRun)
+def refresh_salary_payout(sender, payments, transactions, **kwargs):
+    """Выплаты по ведомости вставляются пакетом: метрики сотрудников и владельца, сводки дней проводок"""
+    metrics_cache.invalidate_users({payment.user_id for payment in payments})
+    rollups.refresh_days([rollups.local_date(entry.created_at) for entry in transactions])
+
+
+@receiver(clients_merged, sender=Client)
+def refresh_merged_clients(sender, merges, **kwargs):
+    """Заказы дублей перенесены UPDATE'ом: метрики владельца, LTV и когорты оставшихся клиентов"""
+    metrics_cache.invalidate('owner')
+    cohorts.refresh_merged(merges)
+
+
+@receiver([post_save, post_delete], sender=Client)
+def refresh_client_rollups(sender, instance, created=True, **kwargs):
+    """Число новых клиентов меняется только при создании и удалении"""
+    if created:
+        rollups.refresh_days([rollups.local_date(instance.created_at)])
+
+
+def _affects_leaderboards(order):
+    """Рейтинги меняются при входе в статус 'completed' и выходе из него, а у
+    завершенного заказа - при изменении суммы или даты завершения"""
+    old_status = getattr(order, '_old_status', None)
+    if 'completed' not in (order.status, old_status):
+        return False
+    return (
+        order.status != old_status or
+        order.total_cost != getattr(order, '_old_total_cost', None) or
+        order.completed_at != getattr(order, '_old_completed_at', None)
+    )
+
+
+@receiver(post_save, sender=Order)
+def refresh_order_leaderboards(sender, instance, created, **kwargs):
+    """Завершение (или отмена завершения) заказа меняет рейтинги его участников"""
+    if created or not _affects_leaderboards(instance) or analytics_via_outbox():
+        return
+    leaderboards.refresh_users(
+        manager_ids=[instance.manager_id],
+        installer_ids=instance.installers.values_list('id', flat=True)
+    )
+
+
+@receiver(orders_transitioned, sender=Order)
+def refresh_transitioned_orders(sender, transitions, status, **kwargs):
+    """Массовая смена статуса: то же, что post_save каждого заказа, но пакетом"""
+    if analytics_via_outbox():
+        # События order.status_changed и transaction.created пишет events.signals
+        return
+    orders = list(Order.objects.filter(pk__in=list(transitions)).values_list(
+        'id', 'manager_id', 'created_at', 'completed_at'
+    ))
+    manager_ids = {manager_id for _, manager_id, _, _ in orders}
+    installer_ids = set(Order.installers.through.objects.filter(
+        order_id__in=list(transitions)
+    ).values_list('user_id', flat=True))
+    metrics_cache.invalidate_users(manager_ids | installer_ids)
+    
+    # Дни создания и завершения заказов и день проводок по завершению
+    days = {rollups.local_date(timezone.now())}
+    for _, _, created_at, completed_at in orders:
+        days.update([rollups.local_date(created_at), rollups.local_date(completed_at)])
+    rollups.refresh_days(days)
+    
+    if status == 'completed' or 'completed' in transitions.values():
+        leaderboards.refresh_users(manager_ids=manager_ids, installer_ids=installer_ids)
+
+
+@receiver(pre_delete, sender=Order)
+def remember_order_installers(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        instance._leaderboard_installers = list(instance.installers.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Order)
+def refresh_deleted_order_leaderboards(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        leaderboards.refresh_users(
+            manager_ids=[instance.manager_id],
+            installer_ids=getattr(instance, '_leaderboard_installers', [])
+        )
+
+
+@receiver(m2m_changed, sender=Order.installers.through)
+def refresh_order_installers_leaderboards(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, Order) or instance.status != 'completed':
+        return
+    if action == 'pre_clear':
+        instance._leaderboard_installers = list(instance.installers.values_list('id', flat=True))
+    elif action == 'post_clear':
+        leaderboards.refresh_users(installer_ids=getattr(instance, '_leaderboard_installers', []))
+    elif action in ('post_add', 'post_remove'):
+        leaderboards.refresh_users(installer_ids=pk_set or [])
+
+
+@receiver(post_save, sender=InstallationSchedule)
+def refresh_schedule_leaderboards(sender, instance, **kwargs):
+    """Фактическое время окончания влияет на долю монтажей в срок"""
+    if instance.status == 'completed' and instance.actual_end_time:
+        leaderboards.refresh_users(installer_ids=instance.installers.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=RouteOptimization)
+def refresh_route_leaderboards(sender, instance, **kwargs):
+    leaderboards.refresh_users(installer_ids=[instance.installer_id])
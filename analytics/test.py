@@ -0,0 +1,698 @@
+# analytics/test.py
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from customer_clients.models import Client as CustomerClient
+from services.models import Service
+from orders.models import Order, OrderItem
+from finance.models import Transaction
+from . import cache as metrics_cache
+from . import rollups
+from .models import DailyRollup, LeaderboardEntry, ClientCohort, ClientLifetimeValue
+from . import leaderboards
+from . import cohorts
+from . import service_mix
+from .timeseries import add_months, get_series
+
+User = get_user_model()
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analytics-tests',
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsCacheTests(TestCase):
+    """Тесты кеша метрик дашбордов"""
+
+    def setUp(self):
+        metrics_cache.get_metrics_cache().clear()
+        metrics_cache.reset_stats()
+
+        self.manager = User.objects.create_user(
+            username='manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.other_manager = User.objects.create_user(
+            username='other_manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.installer = User.objects.create_user(
+            username='installer',
+            password='testpass123',
+            role='installer'
+        )
+        self.customer = CustomerClient.objects.create(
+            name='Кеш Клиент',
+            address='ул. Кешевая, 1',
+            phone='+7900000001',
+            source='website'
+        )
+        self.service = Service.objects.create(
+            name='Кондиционер',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+
+    def _cached(self, role, user, calls):
+        def compute():
+            calls.append(1)
+            return {'value': len(calls)}
+        return metrics_cache.get_or_compute('test', role, user.pk if user else None, '2025-06', compute)
+
+    def test_hit_and_miss_counters(self):
+        """Повторный запрос обслуживается из кеша"""
+        calls = []
+        self._cached('manager', self.manager, calls)
+        self._cached('manager', self.manager, calls)
+
+        self.assertEqual(len(calls), 1)
+        stats = metrics_cache.get_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_order_change_invalidates_only_affected_users(self):
+        """Изменение заказа сбрасывает метрики его менеджера, но не чужие"""
+        own_calls, other_calls = [], []
+        self._cached('manager', self.manager, own_calls)
+        self._cached('manager', self.other_manager, other_calls)
+
+        Order.objects.create(client=self.customer, manager=self.manager)
+
+        self._cached('manager', self.manager, own_calls)
+        self._cached('manager', self.other_manager, other_calls)
+        self.assertEqual(len(own_calls), 2)
+        self.assertEqual(len(other_calls), 1)
+
+    def test_installer_assignment_invalidates_installer(self):
+        """Назначение монтажника сбрасывает его метрики"""
+        order = Order.objects.create(client=self.customer, manager=self.manager)
+        calls = []
+        self._cached('installer', self.installer, calls)
+
+        order.installers.add(self.installer)
+
+        self._cached('installer', self.installer, calls)
+        self.assertEqual(len(calls), 2)
+
+    def test_order_item_invalidates_seller_and_owner(self):
+        """Позиция заказа сбрасывает метрики продавца и владельца"""
+        order = Order.objects.create(client=self.customer, manager=self.other_manager)
+        seller_calls, owner_calls = [], []
+        self._cached('installer', self.installer, seller_calls)
+        self._cached('owner', None, owner_calls)
+
+        OrderItem.objects.create(
+            order=order,
+            service=self.service,
+            price=Decimal('20000.00'),
+            seller=self.installer
+        )
+
+        self._cached('installer', self.installer, seller_calls)
+        self._cached('owner', None, owner_calls)
+        self.assertEqual(len(seller_calls), 2)
+        self.assertEqual(len(owner_calls), 2)
+
+    def test_transaction_invalidates_owner_only(self):
+        """Транзакция не затрагивает метрики менеджеров"""
+        manager_calls, owner_calls = [], []
+        self._cached('manager', self.manager, manager_calls)
+        self._cached('owner', None, owner_calls)
+
+        Transaction.objects.create(type='income', amount=Decimal('100.00'), description='Тест')
+
+        self._cached('manager', self.manager, manager_calls)
+        self._cached('owner', None, owner_calls)
+        self.assertEqual(len(manager_calls), 1)
+        self.assertEqual(len(owner_calls), 2)
+
+    def test_single_flight_recompute(self):
+        """Конкурентные промахи по одному ключу пересчитываются один раз"""
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'value': 42}
+
+        results = []
+
+        def worker():
+            results.append(metrics_cache.get_or_compute(
+                'test', 'manager', self.manager.pk, '2025-06', slow_compute
+            ))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 5)
+        self.assertEqual(metrics_cache.get_stats()['coalesced'], 4)
+
+    def test_dashboard_uses_cache(self):
+        """Повторное открытие дашборда не повторяет расчет зарплаты"""
+        self.client.login(username='manager', password='testpass123')
+        Order.objects.create(
+            client=self.customer,
+            manager=self.manager,
+            status='completed',
+            completed_at=timezone.now()
+        )
+
+        self.client.get('/')
+        with self.assertNumQueries(2):  # сессия и пользователь
+            self.client.get('/')
+
+
+class DailyRollupTests(TestCase):
+    """Тесты дневных сводок и временных рядов"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owner',
+            password='testpass123',
+            role='owner'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.customer = CustomerClient.objects.create(
+            name='Сводка Клиент',
+            address='ул. Сводная, 1',
+            phone='+7900000002',
+            source='website'
+        )
+        self.service = Service.objects.create(
+            name='Кондиционер',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+
+    def _completed_order(self, completed_at):
+        order = Order.objects.create(client=self.customer, manager=self.manager)
+        OrderItem.objects.create(
+            order=order,
+            service=self.service,
+            price=Decimal('20000.00'),
+            seller=self.manager
+        )
+        order.status = 'completed'
+        order.completed_at = completed_at
+        order.save()
+        return order
+
+    def test_signals_keep_rollup_current(self):
+        """Сохранение заказа и транзакций пересчитывает сводку дня"""
+        today = timezone.localdate()
+        self._completed_order(timezone.now())
+
+        rollup = DailyRollup.objects.get(date=today)
+        self.assertEqual(rollup.orders_count, 1)
+        self.assertEqual(rollup.completed_orders, 1)
+        self.assertEqual(rollup.revenue, Decimal('20000.00'))
+        self.assertEqual(rollup.profit, Decimal('10000.00'))
+        self.assertEqual(rollup.new_clients, 1)
+        # Доход и себестоимость создаются сигналами завершения заказа
+        self.assertEqual(rollup.income, Decimal('20000.00'))
+        self.assertEqual(rollup.expense, Decimal('10000.00'))
+
+    def test_completed_at_change_refreshes_old_day(self):
+        """Перенос даты завершения и отмена завершения пересчитывают прежний день"""
+        yesterday = timezone.localdate() - timedelta(days=1)
+        order = self._completed_order(timezone.now() - timedelta(days=1))
+        self.assertEqual(DailyRollup.objects.get(date=yesterday).completed_orders, 1)
+
+        order = Order.objects.get(pk=order.pk)
+        order.completed_at = timezone.now()
+        order.save()
+        self.assertEqual(DailyRollup.objects.get(date=yesterday).completed_orders, 0)
+        self.assertEqual(DailyRollup.objects.get(date=yesterday).revenue, Decimal('0'))
+        self.assertEqual(DailyRollup.objects.get(date=timezone.localdate()).completed_orders, 1)
+
+        order.status = 'in_progress'
+        order.completed_at = None
+        order.save()
+        self.assertEqual(DailyRollup.objects.get(date=timezone.localdate()).completed_orders, 0)
+
+    def test_rebuild_matches_incremental(self):
+        """Полный пересчет дает те же значения, что и сигналы"""
+        self._completed_order(timezone.now())
+        before = list(DailyRollup.objects.values(*rollups.ROLLUP_FIELDS, 'date'))
+
+        DailyRollup.objects.all().delete()
+        today = timezone.localdate()
+        rollups.rebuild(today - timedelta(days=2), today)
+
+        after = list(DailyRollup.objects.filter(date=today).values(*rollups.ROLLUP_FIELDS, 'date'))
+        self.assertEqual(before, after)
+        self.assertEqual(DailyRollup.objects.count(), 3)
+
+    def test_migration_backfills_history(self):
+        """Миграция заполняет сводки за всю историю данных"""
+        self._completed_order(timezone.now() - timedelta(days=400))
+        DailyRollup.objects.all().delete()
+
+        import_module('analytics.migrations.0004_backfill_daily_rollups').backfill_daily_rollups(None, None)
+        self.assertEqual(DailyRollup.objects.count(), (timezone.localdate() - rollups.first_date()).days + 1)
+        self.assertEqual(DailyRollup.objects.filter(completed_orders=1).count(), 1)
+
+    def test_add_months_uses_calendar_months(self):
+        self.assertEqual(add_months(date(2025, 1, 31), 1), date(2025, 2, 28))
+        self.assertEqual(add_months(date(2024, 3, 31), -1), date(2024, 2, 29))
+        self.assertEqual(add_months(date(2025, 1, 15), -13), date(2023, 12, 15))
+
+    def test_series_groups_and_fills_gaps(self):
+        """Ряд по кварталам суммирует дни и заполняет пустые периоды нулями"""
+        DailyRollup.objects.create(date=date(2024, 1, 10), revenue=Decimal('100.00'), orders_count=1)
+        DailyRollup.objects.create(date=date(2024, 3, 31), revenue=Decimal('50.00'), orders_count=2)
+        DailyRollup.objects.create(date=date(2024, 10, 1), revenue=Decimal('10.00'), orders_count=1)
+
+        series = get_series(['revenue', 'orders'], 'quarter', date(2024, 1, 1), date(2024, 12, 31))
+
+        self.assertEqual([point['period'] for point in series], [
+            date(2024, 1, 1), date(2024, 4, 1), date(2024, 7, 1), date(2024, 10, 1)
+        ])
+        self.assertEqual([point['revenue'] for point in series], [150.0, 0, 0, 10.0])
+        self.assertEqual([point['orders'] for point in series], [3, 0, 0, 1])
+
+    def test_timeseries_api_with_comparison(self):
+        DailyRollup.objects.create(date=date(2025, 5, 3), income=Decimal('100.00'))
+        DailyRollup.objects.create(date=date(2025, 6, 5), income=Decimal('150.00'))
+        self.client.login(username='owner', password='testpass123')
+
+        response = self.client.get('/api/analytics/timeseries/', {
+            'metric': 'income',
+            'granularity': 'month',
+            'start_date': '2025-06-01',
+            'end_date': '2025-06-30',
+            'compare': '1',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['points'], [{'period': '2025-06-01', 'value': 150.0}])
+        self.assertEqual(data['previous']['start'], '2025-05-01')
+        self.assertEqual(data['previous']['total'], 100.0)
+        self.assertEqual(data['change_percent'], 50.0)
+
+    def test_timeseries_api_validation(self):
+        self.client.login(username='owner', password='testpass123')
+        response = self.client.get('/api/analytics/timeseries/', {'metric': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.login(username='manager', password='testpass123')
+        response = self.client.get('/api/analytics/timeseries/')
+        self.assertEqual(response.status_code, 403)
+
+
+class LeaderboardTests(TestCase):
+    """Тесты рейтингов сотрудников"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owner',
+            password='testpass123',
+            role='owner'
+        )
+        self.managers = [
+            User.objects.create_user(username=f'manager{i}', password='testpass123', role='manager')
+            for i in range(3)
+        ]
+        self.installer = User.objects.create_user(
+            username='installer',
+            password='testpass123',
+            role='installer'
+        )
+        self.customer = CustomerClient.objects.create(
+            name='Рейтинг Клиент',
+            address='ул. Рейтинговая, 1',
+            phone='+7900000003',
+            source='website'
+        )
+        self.conditioner = Service.objects.create(
+            name='Кондиционер',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+        self.additional = Service.objects.create(
+            name='Доп. трасса',
+            cost_price=Decimal('500.00'),
+            selling_price=Decimal('1500.00'),
+            category='additional'
+        )
+
+    def _complete(self, manager, services, completed_at=None):
+        order = Order.objects.create(client=self.customer, manager=manager)
+        order.installers.add(self.installer)
+        for service in services:
+            OrderItem.objects.create(
+                order=order, service=service, price=service.selling_price, seller=manager
+            )
+        order.status = 'completed'
+        order.completed_at = completed_at or timezone.now()
+        order.save()
+        return order
+
+    def test_completion_updates_rankings(self):
+        """Завершение заказа сразу обновляет места в рейтинге"""
+        self._complete(self.managers[0], [self.conditioner])
+        self._complete(self.managers[1], [self.conditioner, self.additional])
+
+        board = leaderboards.get_leaderboard('manager_revenue', '30d')
+        self.assertEqual([entry.user for entry in board], [self.managers[1], self.managers[0]])
+        self.assertEqual([entry.rank for entry in board], [1, 2])
+
+        attach = LeaderboardEntry.objects.get(board='manager_attach_rate', window='30d', user=self.managers[1])
+        self.assertEqual(attach.value, Decimal('100.00'))
+        margin = LeaderboardEntry.objects.get(board='manager_margin', window='30d', user=self.managers[1])
+        self.assertEqual(margin.value, Decimal('11000.00'))
+
+        jobs = LeaderboardEntry.objects.get(board='installer_jobs', window='7d', user=self.installer)
+        self.assertEqual(jobs.value, Decimal('2'))
+
+    def test_save_without_changes_skips_refresh(self):
+        """Сохранение завершенного заказа без смены статуса и суммы не пересчитывает рейтинги"""
+        order = self._complete(self.managers[0], [self.conditioner])
+        order = Order.objects.get(pk=order.pk)
+        with patch.object(leaderboards, 'refresh_users') as refresh:
+            order.save()
+            order.save(update_fields=['manager'])
+            refresh.assert_not_called()
+
+            order.total_cost = Decimal('30000.00')
+            order.save()
+            refresh.assert_called_once()
+
+    def test_empty_boards_built_on_read(self):
+        """Новая установка: рейтинги строятся при первом чтении"""
+        self._complete(self.managers[0], [self.conditioner])
+        LeaderboardEntry.objects.all().delete()
+
+        top = leaderboards.top_managers()
+        self.assertEqual([row['manager__id'] for row in top], [self.managers[0].pk])
+        self.assertEqual(top[0]['revenue'], Decimal('20000.00'))
+
+    def test_ties_share_rank(self):
+        for manager in self.managers[:2]:
+            self._complete(manager, [self.conditioner])
+        self._complete(self.managers[2], [self.additional])
+
+        ranks = [entry.rank for entry in leaderboards.get_leaderboard('manager_revenue', '7d')]
+        self.assertEqual(ranks, [1, 1, 3])
+
+    def test_windows_exclude_old_orders(self):
+        """Старые заказы попадают только в длинные окна"""
+        self._complete(self.managers[0], [self.conditioner], timezone.now() - timedelta(days=45))
+
+        windows = set(
+            LeaderboardEntry.objects.filter(board='manager_orders', user=self.managers[0])
+            .values_list('window', flat=True)
+        )
+        self.assertNotIn('7d', windows)
+        self.assertNotIn('30d', windows)
+        self.assertIn('90d', windows)
+
+    def test_rebuild_matches_incremental(self):
+        self._complete(self.managers[0], [self.conditioner])
+        self._complete(self.managers[1], [self.additional])
+        before = set(LeaderboardEntry.objects.values_list('board', 'window', 'user_id', 'value', 'rank'))
+
+        LeaderboardEntry.objects.all().delete()
+        leaderboards.rebuild()
+
+        after = set(LeaderboardEntry.objects.values_list('board', 'window', 'user_id', 'value', 'rank'))
+        self.assertEqual(before, after)
+
+    def test_incremental_rerank_touches_changed_span(self):
+        """Пересчет сотрудника переставляет только места между прежним и новым значением"""
+        self._complete(self.managers[0], [self.conditioner])
+        self._complete(self.managers[1], [self.additional])
+        reopened = self._complete(self.managers[2], [self.additional, self.additional])
+
+        with patch.object(leaderboards, '_rerank', wraps=leaderboards._rerank) as rerank:
+            self._complete(self.managers[1], [self.additional])
+        spans = [call.args[0] for call in rerank.call_args_list if ('manager_revenue', '30d') in call.args[0]]
+        self.assertEqual(
+            [span[('manager_revenue', '30d')] for span in spans], [(Decimal('1500.00'), Decimal('3000.00'))]
+        )
+
+        board = leaderboards.get_leaderboard('manager_revenue', '30d')
+        self.assertEqual([(entry.user, entry.rank) for entry in board], [
+            (self.managers[0], 1), (self.managers[1], 2), (self.managers[2], 2)
+        ])
+
+        # Выбывший из рейтинга сдвигает места ниже себя
+        reopened.status = 'in_progress'
+        reopened.save()
+        before = set(LeaderboardEntry.objects.values_list('board', 'window', 'user_id', 'value', 'rank'))
+        leaderboards.rebuild()
+        after = set(LeaderboardEntry.objects.values_list('board', 'window', 'user_id', 'value', 'rank'))
+        self.assertEqual(before, after)
+
+    def test_leaderboard_read_is_constant(self):
+        for manager in self.managers:
+            self._complete(manager, [self.conditioner])
+        with self.assertNumQueries(1):
+            leaderboards.get_leaderboard('manager_revenue', '30d', limit=2)
+
+    def test_installer_on_time_and_km(self):
+        from calendar_app.models import InstallationSchedule, RouteOptimization
+
+        today = timezone.localdate()
+        for end_hour in (11, 15):
+            order = self._complete(self.managers[0], [self.conditioner])
+            schedule = InstallationSchedule.objects.create(
+                order=order,
+                scheduled_date=today,
+                scheduled_time_start=datetime.strptime('10:00', '%H:%M').time(),
+                scheduled_time_end=datetime.strptime('12:00', '%H:%M').time(),
+                estimated_duration=timedelta(hours=2)
+            )
+            schedule.installers.add(self.installer)
+            schedule.status = 'completed'
+            schedule.actual_start_time = timezone.make_aware(datetime.combine(today, datetime.min.time())) + timedelta(hours=10)
+            schedule.actual_end_time = schedule.actual_start_time + timedelta(hours=end_hour - 10)
+            schedule.save()
+        RouteOptimization.objects.create(date=today, installer=self.installer, total_distance=42.5)
+
+        on_time = LeaderboardEntry.objects.get(board='installer_on_time', window='7d', user=self.installer)
+        self.assertEqual(on_time.value, Decimal('50.00'))
+        km = LeaderboardEntry.objects.get(board='installer_km', window='ytd', user=self.installer)
+        self.assertEqual(km.value, Decimal('42.50'))
+
+    def test_leaderboard_api_permissions(self):
+        self._complete(self.managers[0], [self.conditioner])
+
+        self.client.login(username='installer', password='testpass123')
+        response = self.client.get('/api/analytics/leaderboards/', {'board': 'manager_revenue'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/analytics/leaderboards/', {'board': 'installer_jobs'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['entries'][0]['user_id'], self.installer.pk)
+
+
+class ClientCohortTests(TestCase):
+    """Тесты когорт клиентов и LTV"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owner',
+            password='testpass123',
+            role='owner'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.service = Service.objects.create(
+            name='Кондиционер',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+        self.january = timezone.make_aware(datetime(2025, 1, 15, 12, 0))
+        self.repeat_client = self._client('Повторный', 'avito', self.january)
+        self.single_client = self._client('Разовый', 'avito', self.january)
+        self.idle_client = self._client('Без заказов', 'vk', self.january)
+
+        self._order(self.repeat_client, timezone.make_aware(datetime(2025, 1, 20, 12, 0)))
+        self._order(self.repeat_client, timezone.make_aware(datetime(2025, 3, 5, 12, 0)))
+        self._order(self.single_client, timezone.make_aware(datetime(2025, 1, 25, 12, 0)))
+
+    def _client(self, name, source, created_at):
+        client = CustomerClient.objects.create(
+            name=name, address='ул. Когортная, 1', phone='+7900000004', source=source
+        )
+        CustomerClient.objects.filter(pk=client.pk).update(created_at=created_at)
+        return client
+
+    def _order(self, client, completed_at):
+        order = Order.objects.create(client=client, manager=self.manager)
+        OrderItem.objects.create(
+            order=order, service=self.service, price=Decimal('20000.00'), seller=self.manager
+        )
+        Order.objects.filter(pk=order.pk).update(status='completed', completed_at=completed_at)
+
+    def test_cohort_totals_and_periods(self):
+        cohorts.build()
+
+        avito = ClientCohort.objects.get(cohort_month=date(2025, 1, 1), source='avito')
+        self.assertEqual(avito.clients_count, 2)
+        self.assertEqual(avito.repeat_clients, 1)
+        self.assertEqual(avito.repeat_rate, 50.0)
+        self.assertEqual(avito.revenue, Decimal('60000.00'))
+        self.assertEqual(avito.profit, Decimal('30000.00'))
+
+        matrix = cohorts.get_cohort_matrix(source='avito')
+        self.assertEqual(
+            [(cell['period'], cell['active_clients']) for cell in matrix[0]['periods']],
+            [(0, 2), (2, 1)]
+        )
+
+        ltv = ClientLifetimeValue.objects.get(client=self.repeat_client)
+        self.assertEqual(ltv.orders_count, 2)
+        self.assertEqual(ltv.revenue, Decimal('40000.00'))
+        self.assertEqual(ClientLifetimeValue.objects.get(client=self.idle_client).orders_count, 0)
+
+    def test_orders_before_client_card(self):
+        """Заказы раньше даты карточки относят клиента к месяцу первого заказа"""
+        merged = self._client('Объединенный', 'vk', timezone.make_aware(datetime(2025, 3, 10, 12, 0)))
+        self._order(merged, timezone.make_aware(datetime(2025, 1, 5, 12, 0)))
+        self._order(merged, timezone.make_aware(datetime(2025, 2, 5, 12, 0)))
+        cohorts.build()
+
+        self.assertEqual(ClientLifetimeValue.objects.get(client=merged).cohort_month, date(2025, 1, 1))
+        matrix = cohorts.get_cohort_matrix(source='vk')
+        self.assertEqual(matrix[0]['clients'], 2)
+        self.assertEqual(
+            [(cell['period'], cell['active_clients']) for cell in matrix[0]['periods']],
+            [(0, 1), (1, 1)]
+        )
+
+    def test_batch_size_does_not_change_results(self):
+        """Пересчет мелкими пачками дает тот же результат"""
+        cohorts.build(batch_size=1000)
+        expected = cohorts.get_cohort_matrix()
+        cohorts.build(batch_size=1)
+        self.assertEqual(cohorts.get_cohort_matrix(), expected)
+
+    def test_cohort_api_owner_only(self):
+        cohorts.build()
+        self.client.login(username='manager', password='testpass123')
+        self.assertEqual(self.client.get('/api/analytics/cohorts/').status_code, 403)
+
+        self.client.login(username='owner', password='testpass123')
+        response = self.client.get('/api/analytics/ltv/', {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['client_id'], self.repeat_client.pk)
+
+
+class ServiceMixTests(TestCase):
+    """Тесты аналитики услуг"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='owner',
+            password='testpass123',
+            role='owner'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.installer = User.objects.create_user(
+            username='installer',
+            password='testpass123',
+            role='installer'
+        )
+        self.customer = CustomerClient.objects.create(
+            name='Ассортимент Клиент',
+            address='ул. Ассортиментная, 1',
+            phone='+7900000005',
+            source='website'
+        )
+        self.conditioner = Service.objects.create(
+            name='Кондиционер',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+        self.additional = Service.objects.create(
+            name='Доп. трасса',
+            cost_price=Decimal('500.00'),
+            selling_price=Decimal('1500.00'),
+            category='additional'
+        )
+        order = Order.objects.create(client=self.customer, manager=self.manager)
+        for service, seller in [
+            (self.conditioner, self.manager),
+            (self.conditioner, self.manager),
+            (self.additional, self.installer),
+        ]:
+            OrderItem.objects.create(
+                order=order, service=service, price=service.selling_price, seller=seller
+            )
+        order.status = 'completed'
+        order.completed_at = timezone.now()
+        order.save()
+
+    def test_breakdown_by_category_and_seller(self):
+        rows = service_mix.get_service_breakdown(group_by=['category', 'seller'])
+        by_key = {(row['category'], row['seller_id']): row for row in rows}
+
+        conditioners = by_key[('conditioner', self.manager.pk)]
+        self.assertEqual(conditioners['volume'], 2)
+        self.assertEqual(conditioners['revenue'], 40000.0)
+        self.assertEqual(conditioners['margin'], 20000.0)
+        self.assertEqual(conditioners['margin_percent'], 50.0)
+        self.assertEqual(by_key[('additional', self.installer.pk)]['margin'], 1000.0)
+
+    def test_history_uses_cost_snapshot(self):
+        """Изменение себестоимости услуги не меняет прошлую маржу"""
+        self.conditioner.cost_price = Decimal('19000.00')
+        self.conditioner.save()
+
+        rows = service_mix.get_service_breakdown(group_by=['service'])
+        conditioner = next(row for row in rows if row['service_id'] == self.conditioner.pk)
+        self.assertEqual(conditioner['margin'], 20000.0)
+
+    def test_breakdown_is_single_query(self):
+        with self.assertNumQueries(1):
+            service_mix.get_service_breakdown(group_by=['service', 'seller', 'period'], granularity='month')
+
+    def test_service_analytics_api(self):
+        self.client.login(username='owner', password='testpass123')
+        response = self.client.get('/api/analytics/services/', {'group_by': 'category'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['rows']), 2)
+
+        response = self.client.get('/api/analytics/services/', {'group_by': 'unknown'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,170 @@
+# analytics/timeseries.py
+"""
+Временные ряды показателей по дневным сводкам.
+
+Ряд строится группировкой DailyRollup по дню, неделе, месяцу или кварталу,
+поэтому трехлетний помесячный график - это несколько десятков строк,
+а не проход по всем заказам. Пустые периоды заполняются нулями.
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter
+
+from .models import DailyRollup
+
+METRICS = {
+    'orders': 'orders_count',
+    'completed_orders': 'completed_orders',
+    'revenue': 'revenue',
+    'profit': 'profit',
+    'income': 'income',
+    'expense': 'expense',
+    'new_clients': 'new_clients',
+}
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+# Ограничение на число точек в одном ряду
+MAX_POINTS = 1000
+
+
+def add_months(value, months):
+    """Сдвиг даты на календарные месяцы (31 января + 1 месяц = 28/29 февраля)"""
+    month_index = value.year * 12 + value.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def truncate(value, granularity):
+    """Начало периода, в который попадает дата"""
+    if granularity == 'day':
+        return value
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'quarter':
+        return date(value.year, (value.month - 1) // 3 * 3 + 1, 1)
+    raise ValueError(f'Неизвестная детализация: {granularity}')
+
+
+def shift(value, granularity, periods):
+    """Сдвиг даты на целое число периодов"""
+    if granularity == 'day':
+        return value + timedelta(days=periods)
+    if granularity == 'week':
+        return value + timedelta(weeks=periods)
+    if granularity == 'month':
+        return add_months(value, periods)
+    if granularity == 'quarter':
+        return add_months(value, periods * 3)
+    raise ValueError(f'Неизвестная детализация: {granularity}')
+
+
+def month_range(months, today=None):
+    """Первый день месяца months-1 календарных месяцев назад и сегодняшняя дата"""
+    today = today or date.today()
+    return add_months(today.replace(day=1), -(months - 1)), today
+
+
+def bucket_starts(start, end, granularity):
+    """Начала всех периодов, пересекающих диапазон"""
+    buckets = []
+    current = truncate(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        current = shift(current, granularity, 1)
+    return buckets
+
+
+def _as_number(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value or 0
+
+
+def get_series(metrics, granularity, start, end):
+    """
+    Значения показателей по периодам одним запросом.
+    Возвращает список словарей {'period': date, <metric>: value, ...}.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Неизвестная детализация: {granularity}')
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f'Неизвестный показатель: {metric}')
+    buckets = bucket_starts(start, end, granularity)
+    if len(buckets) > MAX_POINTS:
+        raise ValueError(f'Слишком много точек: {len(buckets)} (максимум {MAX_POINTS})')
+
+    rows = DailyRollup.objects.filter(
+        date__range=(start, end)
+    ).annotate(
+        period=GRANULARITIES[granularity]('date')
+    ).values('period').annotate(
+        **{metric: Sum(METRICS[metric]) for metric in metrics}
+    ).order_by('period')
+    by_period = {row['period']: row for row in rows}
+
+    series = []
+    for bucket in buckets:
+        row = by_period.get(bucket, {})
+        point = {'period': bucket}
+        for metric in metrics:
+            point[metric] = _as_number(row.get(metric))
+        series.append(point)
+    return series
+
+
+def _percent_change(current, previous):
+    if not previous:
+        return None
+    return round((current - previous) / abs(previous) * 100, 2)
+
+
+def build_time_series(metric, granularity, start, end, compare=False):
+    """
+    Ряд одного показателя для API. При compare=True добавляется предыдущий
+    период той же длины (в периодах детализации) и изменение в процентах.
+    """
+    points = get_series([metric], granularity, start, end)
+    result = {
+        'metric': metric,
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'points': [
+            {'period': point['period'].isoformat(), 'value': point[metric]}
+            for point in points
+        ],
+        'total': sum(point[metric] for point in points),
+    }
+
+    if compare:
+        periods = len(points)
+        previous_start = shift(start, granularity, -periods)
+        previous_end = shift(end, granularity, -periods)
+        previous_points = get_series([metric], granularity, previous_start, previous_end)
+        previous_total = sum(point[metric] for point in previous_points)
+        result['previous'] = {
+            'start': previous_start.isoformat(),
+            'end': previous_end.isoformat(),
+            'points': [
+                {'period': point['period'].isoformat(), 'value': point[metric]}
+                for point in previous_points
+            ],
+            'total': previous_total,
+        }
+        result['change_percent'] = _percent_change(result['total'], previous_total)
+
+    return result
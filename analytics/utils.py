@@ -3,9 +3,11 @@ from django.db.models.functions import TruncMonth, TruncDay
 from django.utils import timezone
 from datetime import timedelta
 from customer_clients.models import Client  # Исправлено с clients.models
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, item_profit
 from services.models import Service
 from finance.models import Transaction, SalaryPayment  # Исправлено с analytics.models
+from analytics.timeseries import month_range
+from analytics.leaderboards import top_managers
 
 def get_clients_by_source():
     """Получение статистики клиентов по источникам"""
@@ -16,12 +18,11 @@ def get_orders_by_status():
     return Order.objects.values('status').annotate(count=Count('id'))
 
 def get_orders_by_month(months=6):
-    """Получение статистики заказов по месяцам"""
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=30 * months)
+    """Получение статистики заказов по календарным месяцам (включая текущий)"""
+    start_date, _ = month_range(months, timezone.localdate())
     
     return Order.objects.filter(
-        created_at__range=(start_date, end_date)
+        created_at__date__gte=start_date
     ).annotate(
         month=TruncMonth('created_at')
     ).values('month').annotate(
@@ -39,15 +40,8 @@ def get_services_by_category():
     ).order_by('-revenue')
 
 def get_top_managers(limit=5):
-    """Получение топ менеджеров по продажам"""
-    return Order.objects.filter(
-        status='completed'
-    ).values(
-        'manager__id', 'manager__first_name', 'manager__last_name'
-    ).annotate(
-        orders_count=Count('id'),
-        revenue=Sum('total_cost')
-    ).order_by('-revenue')[:limit]
+    """Получение топ менеджеров по продажам с начала года (из рейтингов)"""
+    return top_managers(limit=limit, window='ytd')
 
 def get_profit_by_day(days=30):
     """Получение данных о прибыли по дням"""
@@ -60,7 +54,7 @@ def get_profit_by_day(days=30):
         order__status='completed'
     ).annotate(
         day=TruncDay('order__completed_at'),
-        profit=ExpressionWrapper(F('price') - F('service__cost_price'), output_field=DecimalField())
+        profit=item_profit()
     ).values('day').annotate(
         total_profit=Sum('profit'),
         revenue=Sum('price')
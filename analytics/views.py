@@ -10,6 +10,10 @@ from customer_clients.models import Client
 from orders.models import Order
 from services.models import Service
 from user_accounts.models import User
+from reference import lookups
+from . import cache as metrics_cache
+from .timeseries import month_range
+from .leaderboards import top_managers
 
 # Проверяем доступность модели Transaction
 try:
@@ -32,15 +36,21 @@ def dashboard(request):
     
     # Контент для владельца - полная статистика
     if request.user.role == 'owner':
-        context.update(_get_owner_dashboard_data(today, start_of_month))
+        compute = lambda: _get_owner_dashboard_data(today, start_of_month)
     
     # Контент для менеджера - статистика по его заказам
     elif request.user.role == 'manager':
-        context.update(_get_manager_dashboard_data(request.user, today, start_of_month))
+        compute = lambda: _get_manager_dashboard_data(request.user, today, start_of_month)
     
     # Контент для монтажника - только его заказы
     else:  # installer
-        context.update(_get_installer_dashboard_data(request.user, today, start_of_month))
+        compute = lambda: _get_installer_dashboard_data(request.user, today, start_of_month)
+    
+    # Показатели кешируются по роли, пользователю и месяцу
+    context.update(metrics_cache.get_or_compute(
+        'dashboard', request.user.role, request.user.pk,
+        start_of_month.strftime('%Y-%m'), compute
+    ))
     
     return render(request, 'dashboard/dashboard.html', context)
 
@@ -77,13 +87,13 @@ def _get_owner_dashboard_data(today, start_of_month):
             pass
     
     # Заказы по месяцам
-    orders_by_month = get_orders_by_month(months=6)
+    orders_by_month = list(get_orders_by_month(months=6))
     
     # Источники клиентов
     clients_by_source_data = get_clients_by_source()
     clients_by_source = []
     for item in clients_by_source_data:
-        source_display = dict(Client.SOURCE_CHOICES).get(item['source'], item['source'])
+        source_display = lookups.display(Client, 'source', item['source'])
         clients_by_source.append({
             'source': item['source'],
             'source_display': source_display,
@@ -91,10 +101,12 @@ def _get_owner_dashboard_data(today, start_of_month):
         })
     
     # Топ менеджеры
-    top_managers = get_top_managers(limit=5)
+    top_managers = list(get_top_managers(limit=5))
     
     # Последние заказы
-    recent_orders = Order.objects.all().order_by('-created_at')[:5]
+    recent_orders = list(
+        Order.objects.select_related('client', 'manager').order_by('-created_at')[:5]
+    )
     
     return {
         'total_orders': total_orders,
@@ -131,7 +143,9 @@ def _get_manager_dashboard_data(user, today, start_of_month):
     ).aggregate(total=Sum('total_cost'))['total'] or Decimal('0.00')
     
     # Последние заказы менеджера
-    recent_orders = manager_orders.order_by('-created_at')[:5]
+    recent_orders = list(
+        manager_orders.select_related('client', 'manager').order_by('-created_at')[:5]
+    )
     
     # Расчет зарплаты менеджера (если доступен)
     salary_data = None
@@ -168,7 +182,9 @@ def _get_installer_dashboard_data(user, today, start_of_month):
     orders_this_month = installer_orders.filter(created_at__gte=start_of_month).count()
     
     # Последние заказы монтажника
-    recent_orders = installer_orders.order_by('-created_at')[:5]
+    recent_orders = list(
+        installer_orders.select_related('client', 'manager').order_by('-created_at')[:5]
+    )
     
     # Расчет зарплаты монтажника (если доступен)
     salary_data = None
@@ -193,12 +209,11 @@ def get_clients_by_source():
     return Client.objects.values('source').annotate(count=Count('id'))
 
 def get_orders_by_month(months=6):
-    """Получение статистики заказов по месяцам"""
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=30 * months)
+    """Получение статистики заказов по календарным месяцам (включая текущий)"""
+    start_date, _ = month_range(months, timezone.localdate())
     
     return Order.objects.filter(
-        created_at__range=(start_date, end_date)
+        created_at__date__gte=start_date
     ).annotate(
         month=TruncMonth('created_at')
     ).values('month').annotate(
@@ -207,12 +222,5 @@ def get_orders_by_month(months=6):
     ).order_by('month')
 
 def get_top_managers(limit=5):
-    """Получение топ менеджеров по продажам"""
-    return Order.objects.filter(
-        status='completed'
-    ).values(
-        'manager__id', 'manager__first_name', 'manager__last_name'
-    ).annotate(
-        orders_count=Count('id'),
-        revenue=Sum('total_cost')
-    ).order_by('-revenue')[:limit]
\ No newline at end of file
+    """Получение топ менеджеров по продажам с начала года (из рейтингов)"""
+    return top_managers(limit=limit, window='ytd')
\ No newline at end of file
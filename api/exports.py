@@ -6,6 +6,7 @@ from customer_clients.models import Client
 from orders.models import Order, OrderItem
 from services.models import Service
 from finance.models import Transaction
+from reference import lookups
 
 def export_clients_to_excel():
     """Экспорт клиентов в Excel"""
@@ -26,8 +27,9 @@ def export_clients_to_excel():
     
     # Данные
     clients = Client.objects.all().order_by('id')
+    sources = lookups.choice_map(Client, 'source')
     for row_num, client in enumerate(clients, 2):
-        source_display = dict(Client.SOURCE_CHOICES).get(client.source, client.source)
+        source_display = sources.get(client.source, client.source)
         
         ws.cell(row=row_num, column=1, value=client.id)
         ws.cell(row=row_num, column=2, value=client.name)
@@ -67,14 +69,19 @@ def export_orders_to_excel():
         ws_orders.cell(row=1, column=col_num, value=header)
     
     # Данные заказов
-    orders = Order.objects.all().order_by('id')
+    # Клиент - JOIN'ом, сотрудники и услуги - из справочников процесса
+    users = lookups.users_by_id()
+    services = lookups.services_by_id()
+    statuses = lookups.choice_map(Order, 'status')
+    orders = Order.objects.select_related('client').order_by('id')
     for row_num, order in enumerate(orders, 2):
-        status_display = dict(Order.STATUS_CHOICES).get(order.status, order.status)
+        status_display = statuses.get(order.status, order.status)
+        manager = users.get(order.manager_id)
         completed_at = order.completed_at.strftime('%Y-%m-%d %H:%M:%S') if order.completed_at else ''
         
         ws_orders.cell(row=row_num, column=1, value=order.id)
         ws_orders.cell(row=row_num, column=2, value=order.client.name)
-        ws_orders.cell(row=row_num, column=3, value=order.manager.get_full_name())
+        ws_orders.cell(row=row_num, column=3, value=manager.full_name if manager else order.manager.get_full_name())
         ws_orders.cell(row=row_num, column=4, value=status_display)
         ws_orders.cell(row=row_num, column=5, value=float(order.total_cost))
         ws_orders.cell(row=row_num, column=6, value=order.created_at.strftime('%Y-%m-%d %H:%M:%S'))
@@ -91,13 +98,15 @@ def export_orders_to_excel():
     # Данные позиций
     items = OrderItem.objects.all().order_by('order__id')
     for row_num, item in enumerate(items, 2):
-        category_display = dict(Service.CATEGORY_CHOICES).get(item.service.category, item.service.category)
+        service = services.get(item.service_id) or item.service
+        seller = users.get(item.seller_id)
+        category_display = lookups.display(Service, 'category', service.category)
         
-        ws_items.cell(row=row_num, column=1, value=item.order.id)
-        ws_items.cell(row=row_num, column=2, value=item.service.name)
+        ws_items.cell(row=row_num, column=1, value=item.order_id)
+        ws_items.cell(row=row_num, column=2, value=service.name)
         ws_items.cell(row=row_num, column=3, value=category_display)
         ws_items.cell(row=row_num, column=4, value=float(item.price))
-        ws_items.cell(row=row_num, column=5, value=item.seller.get_full_name())
+        ws_items.cell(row=row_num, column=5, value=seller.full_name if seller else item.seller.get_full_name())
         ws_items.cell(row=row_num, column=6, value=item.created_at.strftime('%Y-%m-%d %H:%M:%S'))
     
     # Автоподбор ширины колонок для всех листов
@@ -131,9 +140,10 @@ def export_finance_to_excel():
     
     # Данные
     transactions = Transaction.objects.all().order_by('-created_at')
+    types = lookups.choice_map(Transaction, 'type')
     for row_num, transaction in enumerate(transactions, 2):
-        type_display = dict(Transaction.TYPE_CHOICES).get(transaction.type, transaction.type)
-        order_id = transaction.order.id if transaction.order else ''
+        type_display = types.get(transaction.type, transaction.type)
+        order_id = transaction.order_id or ''
         
         ws.cell(row=row_num, column=1, value=transaction.id)
         ws.cell(row=row_num, column=2, value=type_display)
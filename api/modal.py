@@ -8,17 +8,26 @@ from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 
 from customer_clients.models import Client
+from customer_clients.dedup import find_duplicates
 from services.models import Service
 from orders.models import Order, OrderItem
 from user_accounts.models import User
+from orders.listing import orders_for
 from finance.models import Transaction, SalaryPayment
+from calendar_app.models import InstallationSchedule
 
+from reference import lookups
 from .serializers import (
     ClientSerializer, ServiceSerializer, OrderSerializer, 
     OrderItemSerializer, UserSerializer, TransactionSerializer, 
-    SalaryPaymentSerializer
+    SalaryPaymentSerializer, OrderScheduleSerializer
 )
 
+
+def _person(user):
+    return {'id': user.id, 'first_name': user.first_name, 'last_name': user.last_name}
+
+
 @method_decorator(login_required, name='dispatch')
 class ModalClientDataView(APIView):
     """
@@ -32,7 +41,7 @@ class ModalClientDataView(APIView):
             return Response(serializer.data)
         
         # Если ID не указан - возвращаем данные для создания нового клиента
-        sources = dict(Client.SOURCE_CHOICES)
+        sources = lookups.choice_map(Client, 'source')
         return Response({
             'sources': [{'value': key, 'label': value} for key, value in sources.items()]
         })
@@ -41,7 +50,14 @@ class ModalClientDataView(APIView):
         # Создание нового клиента
         serializer = ClientSerializer(data=request.data)
         if serializer.is_valid():
-            client = serializer.save()
+            duplicates = find_duplicates(Client(**serializer.validated_data))
+            if duplicates and not request.data.get('confirm_duplicate'):
+                # Клиент не создается, пока пользователь не выберет существующего или не подтвердит
+                return Response({
+                    'error': 'Найдены похожие клиенты',
+                    'duplicates': ClientSerializer(duplicates, many=True).data
+                }, status=status.HTTP_409_CONFLICT)
+            serializer.save(duplicate_of=duplicates[0] if duplicates else None)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -63,14 +79,12 @@ class ModalOrderDataView(APIView):
     def get(self, request, order_id=None):
         # Данные для формы создания/редактирования заказа
         clients = Client.objects.all().values('id', 'name', 'phone')
-        managers = User.objects.filter(role='manager').values('id', 'first_name', 'last_name')
-        installers = User.objects.filter(role='installer').values('id', 'first_name', 'last_name')
-        statuses = dict(Order.STATUS_CHOICES)
+        statuses = lookups.choice_map(Order, 'status')
         
         data = {
             'clients': list(clients),
-            'managers': list(managers),
-            'installers': list(installers),
+            'managers': [_person(user) for user in lookups.users_by_role('manager')],
+            'installers': [_person(user) for user in lookups.users_by_role('installer')],
             'statuses': [{'value': key, 'label': value} for key, value in statuses.items()]
         }
         
@@ -85,11 +99,9 @@ class ModalOrderDataView(APIView):
             item_serializer = OrderItemSerializer(items, many=True)
             data['items'] = item_serializer.data
             
-            # Добавляем данные для позиций заказа
-            services = Service.objects.all().values('id', 'name', 'category', 'selling_price')
-            sellers = User.objects.filter(role__in=['manager', 'installer']).values('id', 'first_name', 'last_name', 'role')
-            data['services'] = list(services)
-            data['sellers'] = list(sellers)
+            # Добавляем данные для позиций заказа (из справочников процесса)
+            data['services'] = lookups.form_data('services', request.user.role)
+            data['sellers'] = lookups.form_data('sellers', request.user.role)
         
         return Response(data)
     
@@ -129,21 +141,12 @@ class ModalOrderItemDataView(APIView):
         try:
             # Данные для формы добавления позиции
             order = get_object_or_404(Order, id=order_id)
-            services = Service.objects.all().values('id', 'name', 'category', 'selling_price')
-            sellers = User.objects.filter(role__in=['manager', 'installer']).values('id', 'first_name', 'last_name', 'role')
-            
-            # Добавляем display имена для категорий
-            category_choices = dict(Service.CATEGORY_CHOICES)
-            services_list = []
-            for service in services:
-                service_dict = dict(service)
-                service_dict['category_display'] = category_choices.get(service['category'], service['category'])
-                services_list.append(service_dict)
             
+            # Каталог и продавцы - из справочников процесса; страница заказов берет их из /api/reference/
             return Response({
                 'order': OrderSerializer(order).data,
-                'services': services_list,
-                'sellers': list(sellers)
+                'services': lookups.form_data('services', request.user.role),
+                'sellers': lookups.form_data('sellers', request.user.role)
             })
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -242,6 +245,27 @@ class ModalOrderItemDataView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@method_decorator(login_required, name='dispatch')
+class ModalOrderViewDataView(APIView):
+    """
+    API-эндпоинт карточки заказа: заказ с позициями (услуга и продавец - JOIN'ом),
+    монтаж и монтажники одним ответом за фиксированное число запросов.
+    Справочники для редактирования позиций отдает reference.views.ReferenceDataView.
+    """
+    def get(self, request, order_id):
+        order = get_object_or_404(orders_for(request.user).with_details(), pk=order_id)
+        schedule = InstallationSchedule.objects.filter(order=order).prefetch_related('installers').first()
+        
+        return Response({
+            'order': OrderSerializer(order).data,
+            'schedule': OrderScheduleSerializer(schedule).data if schedule else None,
+            'installers': [
+                {'id': installer.id, 'name': installer.get_full_name(), 'phone': installer.phone}
+                for installer in order.installers.all()
+            ]
+        })
+
+
 @method_decorator(login_required, name='dispatch')
 class ModalTransactionDataView(APIView):
     """
@@ -249,7 +273,7 @@ class ModalTransactionDataView(APIView):
     """
     def get(self, request, transaction_id=None):
         # Данные для формы создания/редактирования транзакции
-        types = dict(Transaction.TYPE_CHOICES)
+        types = lookups.choice_map(Transaction, 'type')
         orders = Order.objects.all().select_related('client').values('id', 'client__name')
         
         data = {
@@ -2,8 +2,9 @@ from rest_framework import serializers
 from user_accounts.models import User
 from customer_clients.models import Client
 from services.models import Service
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, money
 from finance.models import Transaction, SalaryPayment
+from calendar_app.models import InstallationSchedule
 
 class UserSerializer(serializers.ModelSerializer):
     role_display = serializers.CharField(source='get_role_display', read_only=True)
@@ -19,7 +20,8 @@ class ClientSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Client
-        fields = ['id', 'name', 'address', 'phone', 'source', 'source_display', 'created_at']
+        fields = ['id', 'name', 'address', 'phone', 'source', 'source_display', 'duplicate_of', 'created_at']
+        read_only_fields = ['duplicate_of']
 
 class ServiceSerializer(serializers.ModelSerializer):
     category_display = serializers.CharField(source='get_category_display', read_only=True)
@@ -30,9 +32,7 @@ class ServiceSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'cost_price', 'selling_price', 'category', 'category_display', 'profit_margin', 'created_at']
     
     def get_profit_margin(self, obj):
-        if obj.selling_price > 0:
-            return float((obj.selling_price - obj.cost_price) / obj.selling_price * 100)
-        return 0
+        return float(obj.margin_percent)
 
 class OrderItemSerializer(serializers.ModelSerializer):
     service_name = serializers.CharField(source='service.name', read_only=True)
@@ -47,11 +47,12 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order', 'service', 'price', 'seller', 'created_at',
             'service_name', 'service_category', 'service_category_display',
-            'service_cost_price', 'seller_name', 'profit'
+            'service_cost_price', 'cost_price_at_sale', 'seller_name', 'profit'
         ]
+        read_only_fields = ['cost_price_at_sale']
     
     def get_profit(self, obj):
-        return float(obj.price - obj.service.cost_price)
+        return float(obj.profit)
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
@@ -76,22 +77,44 @@ class OrderSerializer(serializers.ModelSerializer):
         return [{'id': installer.id, 'name': installer.get_full_name()} for installer in obj.installers.all()]
     
     def get_items_count(self, obj):
+        # Аннотации Order.objects.with_details(); для одиночных заказов - по позициям
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
         return obj.items.count()
     
     def get_total_profit(self, obj):
+        if hasattr(obj, 'items_profit'):
+            return float(money(obj.items_profit))
         total_profit = sum(
-            float(item.price - item.service.cost_price) 
+            float(item.profit)
             for item in obj.items.all()
         )
         return total_profit
 
+class OrderScheduleSerializer(serializers.ModelSerializer):
+    """Монтаж в карточке заказа: без вложенного заказа, монтажники - списком id"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    priority_display = serializers.CharField(source='get_priority_display', read_only=True)
+    
+    class Meta:
+        model = InstallationSchedule
+        fields = [
+            'id', 'scheduled_date', 'scheduled_time_start', 'scheduled_time_end',
+            'installers', 'status', 'status_display', 'priority', 'priority_display',
+            'estimated_duration', 'actual_start_time', 'actual_end_time', 'notes'
+        ]
+        read_only_fields = fields
+
 class TransactionSerializer(serializers.ModelSerializer):
     type_display = serializers.CharField(source='get_type_display', read_only=True)
     order_display = serializers.CharField(source='order.__str__', read_only=True)
     
     class Meta:
         model = Transaction
-        fields = ['id', 'type', 'amount', 'description', 'order', 'created_at', 'type_display', 'order_display']
+        fields = ['id', 'type', 'kind', 'amount', 'description', 'order', 'created_at', 'type_display', 'order_display']
+        read_only_fields = ['kind']
+        # Ограничение (заказ, вид) касается только автоматических проводок - ручные вид не задают
+        validators = []
 
 class SalaryPaymentSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -5,15 +5,18 @@ from .views import (
     UserViewSet, ClientViewSet, ServiceViewSet, OrderViewSet,
     TransactionViewSet, SalaryPaymentViewSet,
     FinanceBalanceView, CalculateSalaryView, DashboardStatsView, FinanceStatsView,
+    MetricsCacheStatsView, AnalyticsTimeSeriesView, LeaderboardView,
+    CohortAnalyticsView, ClientLifetimeValueView, ServiceAnalyticsView,
     ExportClientsView, ExportOrdersView, ExportFinanceView,
     # Импорты для зарплат
     SalaryConfigViewSet, UserSalaryAssignmentViewSet, SalaryAdjustmentViewSet,
     SalaryCalculationAPIView, SalaryStatsAPIView
 )
 from .modal import (
-    ModalClientDataView, ModalOrderDataView, ModalOrderItemDataView,
+    ModalClientDataView, ModalOrderDataView, ModalOrderItemDataView, ModalOrderViewDataView,
     ModalTransactionDataView, ModalSalaryPaymentDataView
 )
+from reference.views import ReferenceDataView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -33,6 +36,12 @@ urlpatterns = [
     
     # Статистика и дашборды
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('dashboard/cache-stats/', MetricsCacheStatsView.as_view(), name='dashboard-cache-stats'),
+    path('analytics/timeseries/', AnalyticsTimeSeriesView.as_view(), name='analytics-timeseries'),
+    path('analytics/leaderboards/', LeaderboardView.as_view(), name='analytics-leaderboards'),
+    path('analytics/cohorts/', CohortAnalyticsView.as_view(), name='analytics-cohorts'),
+    path('analytics/ltv/', ClientLifetimeValueView.as_view(), name='analytics-ltv'),
+    path('analytics/services/', ServiceAnalyticsView.as_view(), name='analytics-services'),
     
     # Финансы
     path('finance/balance/', FinanceBalanceView.as_view(), name='finance-balance'),
@@ -53,12 +62,16 @@ urlpatterns = [
     path('modal/client/<int:client_id>/', ModalClientDataView.as_view(), name='modal-client-edit'),
     path('modal/order/', ModalOrderDataView.as_view(), name='modal-order-create'),
     path('modal/order/<int:order_id>/', ModalOrderDataView.as_view(), name='modal-order-edit'),
+    path('modal/order/<int:order_id>/view/', ModalOrderViewDataView.as_view(), name='modal-order-view'),
     path('modal/order/<int:order_id>/items/', ModalOrderItemDataView.as_view(), name='modal-order-item-add'),
     path('modal/order/<int:order_id>/items/<int:item_id>/', ModalOrderItemDataView.as_view(), name='modal-order-item-delete'),
     path('modal/transaction/', ModalTransactionDataView.as_view(), name='modal-transaction-create'),
     path('modal/transaction/<int:transaction_id>/', ModalTransactionDataView.as_view(), name='modal-transaction-edit'),
     path('modal/salary-payment/<int:user_id>/', ModalSalaryPaymentDataView.as_view(), name='modal-salary-payment'),
     
+    # Справочники форм
+    path('reference/<str:name>/', ReferenceDataView.as_view(), name='reference-data'),
+    
     # Календарь и маршрутизация
     path('calendar/', include('calendar_app.urls')),
 ]
\ No newline at end of file
@@ -15,9 +15,22 @@ from decimal import Decimal
 
 from user_accounts.models import User
 from customer_clients.models import Client
+from customer_clients import search as client_search
+from customer_clients import dedup as client_dedup
 from services.models import Service
 from orders.models import Order, OrderItem
+from orders import completion as order_completion
 from finance.models import Transaction, SalaryPayment
+from analytics import cache as metrics_cache
+from analytics import leaderboards
+from analytics import cohorts
+from analytics import service_mix
+from analytics.models import LeaderboardEntry
+from reference import lookups
+from analytics.timeseries import (
+    METRICS as TIMESERIES_METRICS, GRANULARITIES, build_time_series,
+    get_series, month_range, shift, truncate
+)
 from .serializers import (
     UserSerializer, ClientSerializer, ServiceSerializer, 
     OrderSerializer, OrderItemSerializer, TransactionSerializer, 
@@ -66,18 +79,25 @@ class UserViewSet(viewsets.ModelViewSet):
             # Монтажник может видеть только себя
             return User.objects.filter(id=self.request.user.id)
 
+class ClientSearchFilter(filters.SearchFilter):
+    """Параметр search через поисковый индекс клиентов (customer_clients.search)"""
+    
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return client_search.filter_clients(queryset, query, getattr(view, 'client_search_prefix', ''))
+
 class ClientViewSet(viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     authentication_classes = [SessionAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ClientSearchFilter]
     filterset_fields = ['source']
     search_fields = ['name', 'phone', 'address']
     
     def get_permissions(self):
         """Права доступа к клиентам"""
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'merge']:
             # Создание и редактирование только для владельца и менеджера
             if hasattr(self.request, 'user') and self.request.user.is_authenticated:
                 if self.request.user.role not in ['owner', 'manager']:
@@ -106,6 +126,54 @@ class ClientViewSet(viewsets.ModelViewSet):
             return Client.objects.filter(
                 order__installers=self.request.user
             ).distinct()
+    
+    def create(self, request, *args, **kwargs):
+        """Создание клиента с проверкой дублей, как в модальном окне"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        duplicates = client_dedup.find_duplicates(Client(**serializer.validated_data))
+        if duplicates and not request.data.get('confirm_duplicate'):
+            return Response({
+                'error': 'Найдены похожие клиенты',
+                'duplicates': ClientSerializer(duplicates, many=True).data
+            }, status=status.HTTP_409_CONFLICT)
+        serializer.save(duplicate_of=duplicates[0] if duplicates else None)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(serializer.data))
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Подсказки поиска клиентов: ?q=...&limit=10 (не более 50)"""
+        query = request.query_params.get('q') or request.query_params.get('search', '')
+        try:
+            limit = int(request.query_params.get('limit', client_search.DEFAULT_LIMIT))
+        except ValueError:
+            limit = client_search.DEFAULT_LIMIT
+        clients = client_search.search_clients(self.get_queryset(), query, limit)
+        return Response(ClientSerializer(clients, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def duplicates(self, request, pk=None):
+        """Возможные дубли клиента"""
+        client = self.get_object()
+        return Response(ClientSerializer(client_dedup.find_duplicates(client), many=True).data)
+    
+    @action(detail=True, methods=['post'])
+    def merge(self, request, pk=None):
+        """Слияние дублей в клиента: {"duplicate_ids": [...]} - заказы переносятся, дубли удаляются"""
+        client = self.get_object()
+        try:
+            duplicate_ids = {int(pk) for pk in request.data.get('duplicate_ids') or []} - {client.pk}
+        except (TypeError, ValueError):
+            return Response({'error': 'duplicate_ids должен быть списком id'}, status=status.HTTP_400_BAD_REQUEST)
+        duplicates = list(Client.objects.filter(pk__in=duplicate_ids))
+        if not duplicates or len(duplicates) != len(duplicate_ids):
+            return Response({'error': 'Клиенты для слияния не найдены'}, status=status.HTTP_404_NOT_FOUND)
+        moved = client_dedup.merge(client, duplicates)
+        return Response({
+            'client': ClientSerializer(client).data,
+            'merged': len(duplicates),
+            'orders_moved': moved
+        })
 
 class ServiceViewSet(viewsets.ModelViewSet):
     queryset = Service.objects.all()
@@ -133,9 +201,10 @@ class ServiceViewSet(viewsets.ModelViewSet):
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ClientSearchFilter]
     filterset_fields = ['status', 'manager']
     search_fields = ['client__name', 'client__phone']
+    client_search_prefix = 'client__'
     
     def get_permissions(self):
         """Права доступа к заказам"""
@@ -159,13 +228,46 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Order.objects.none()
             
         if self.request.user.role == 'owner':
-            return Order.objects.all()
+            orders = Order.objects.all()
         elif self.request.user.role == 'manager':
             # Менеджер видит только свои заказы
-            return Order.objects.filter(manager=self.request.user)
+            orders = Order.objects.filter(manager=self.request.user)
         else:  # installer
             # Монтажник видит только заказы, где он назначен
-            return Order.objects.filter(installers=self.request.user)
+            orders = Order.objects.filter(installers=self.request.user)
+        # Связанные данные и вычисляемые поля сериализатора - фиксированным числом запросов
+        return orders.with_details()
+    
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Массовая смена статуса: {"order_ids": [...], "status": "completed"}.
+        Все заказы меняются в одной транзакции; монтажник может только завершать.
+        """
+        new_status = request.data.get('status')
+        if new_status not in lookups.choice_map(Order, 'status'):
+            return Response({'error': 'Некорректный статус заказа'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.role == 'installer' and new_status != 'completed':
+            return Response({'error': 'Монтажники могут только завершать заказы'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            order_ids = {int(pk) for pk in request.data.get('order_ids') or []}
+        except (TypeError, ValueError):
+            return Response({'error': 'order_ids должен быть списком id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        orders = self.get_queryset().filter(pk__in=order_ids)
+        found = set(orders.values_list('pk', flat=True))
+        if not order_ids or found != order_ids:
+            return Response({
+                'error': 'Заказы не найдены',
+                'missing': sorted(order_ids - found)
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        transitions = order_completion.transition_orders(Order.objects.filter(pk__in=found), new_status)
+        return Response({
+            'status': new_status,
+            'changed': sorted(transitions),
+            'unchanged': sorted(found - set(transitions))
+        })
 
 class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
@@ -220,30 +322,20 @@ class FinanceBalanceView(APIView):
         
         balance = Transaction.get_company_balance()
         
-        today = datetime.now()
-        start_date = today.replace(day=1, month=today.month-5 if today.month > 5 else today.month+7, 
-                                  year=today.year if today.month > 5 else today.year-1)
-        
-        transactions = Transaction.objects.filter(created_at__gte=start_date)
-        monthly_data = {}
-        
-        for transaction in transactions:
-            month_key = transaction.created_at.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {'income': 0, 'expense': 0}
-            
-            if transaction.type == 'income':
-                monthly_data[month_key]['income'] += float(transaction.amount)
-            else:
-                monthly_data[month_key]['expense'] += float(transaction.amount)
+        try:
+            months = max(1, min(int(request.query_params.get('months', 6)), 60))
+        except ValueError:
+            return Response({'error': 'Неверное количество месяцев'}, status=400)
         
+        # Помесячные итоги из дневных сводок, включая месяцы без операций
+        start_date, end_date = month_range(months, timezone.localdate())
         monthly_stats = []
-        for month, data in sorted(monthly_data.items()):
+        for point in get_series(['income', 'expense'], 'month', start_date, end_date):
             monthly_stats.append({
-                'month': month,
-                'income': data['income'],
-                'expense': data['expense'],
-                'profit': data['income'] - data['expense']
+                'month': point['period'].strftime('%Y-%m'),
+                'income': point['income'],
+                'expense': point['expense'],
+                'profit': point['income'] - point['expense']
             })
         
         return Response({
@@ -336,37 +428,22 @@ class FinanceStatsView(APIView):
             created_at__gte=start_of_month
         ).aggregate(total=Sum('amount'))['total'] or 0
         
-        # Статистика доходов/расходов по дням
-        from django.db.models.functions import TruncDay
-        
-        # За последние 30 дней
-        start_date = today - timedelta(days=30)
-        
-        daily_stats = Transaction.objects.filter(
-            created_at__gte=start_date
-        ).annotate(
-            day=TruncDay('created_at')
-        ).values('day', 'type').annotate(
-            total=Sum('amount')
-        ).order_by('day')
-        
-        # Преобразуем в формат, удобный для клиента
-        days_data = {}
-        for stat in daily_stats:
-            day_str = stat['day'].strftime('%Y-%m-%d')
-            if day_str not in days_data:
-                days_data[day_str] = {'income': 0, 'expense': 0}
-                
-            days_data[day_str][stat['type']] = float(stat['total'])
+        # Статистика доходов/расходов по дням из дневных сводок
+        try:
+            days = max(1, min(int(request.query_params.get('days', 30)), 366))
+        except ValueError:
+            return Response({'error': 'Неверное количество дней'}, status=400)
+        
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=days - 1)
         
-        # Формируем список с расчетом прибыли
         daily_result = []
-        for day, data in sorted(days_data.items()):
+        for point in get_series(['income', 'expense'], 'day', start_date, end_date):
             daily_result.append({
-                'date': day,
-                'income': data['income'],
-                'expense': data['expense'],
-                'profit': data['income'] - data['expense']
+                'date': point['period'].strftime('%Y-%m-%d'),
+                'income': point['income'],
+                'expense': point['expense'],
+                'profit': point['income'] - point['expense']
             })
         
         return Response({
@@ -376,6 +453,175 @@ class FinanceStatsView(APIView):
             'daily_stats': daily_result
         })
 
+class AnalyticsTimeSeriesView(APIView):
+    """Временной ряд показателя по дневным сводкам - только для владельца"""
+    
+    DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12, 'quarter': 8}
+    
+    def get(self, request):
+        if request.user.role != 'owner':
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        metric = request.query_params.get('metric', 'revenue')
+        granularity = request.query_params.get('granularity', 'month')
+        if metric not in TIMESERIES_METRICS:
+            return Response({
+                'error': f'Неизвестный показатель. Доступны: {", ".join(TIMESERIES_METRICS)}'
+            }, status=400)
+        if granularity not in GRANULARITIES:
+            return Response({
+                'error': f'Неизвестная детализация. Доступны: {", ".join(GRANULARITIES)}'
+            }, status=400)
+        
+        try:
+            end_date = self._parse_date(request.query_params.get('end_date')) or timezone.localdate()
+            start_date = self._parse_date(request.query_params.get('start_date')) or shift(
+                truncate(end_date, granularity), granularity, -(self.DEFAULT_PERIODS[granularity] - 1)
+            )
+        except ValueError:
+            return Response({'error': 'Неверный формат даты. Используйте YYYY-MM-DD'}, status=400)
+        
+        if start_date > end_date:
+            return Response({'error': 'Начальная дата позже конечной'}, status=400)
+        
+        compare = request.query_params.get('compare', '').lower() in ('1', 'true', 'yes')
+        try:
+            data = build_time_series(metric, granularity, start_date, end_date, compare=compare)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response(data)
+    
+    def _parse_date(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
+
+class LeaderboardView(APIView):
+    """Рейтинги сотрудников. Владелец видит все, сотрудники - рейтинги своей роли"""
+    
+    def get(self, request):
+        board = request.query_params.get('board', 'manager_revenue')
+        window = request.query_params.get('window', '30d')
+        
+        if board not in dict(LeaderboardEntry.BOARD_CHOICES):
+            return Response({'error': 'Неизвестный рейтинг'}, status=400)
+        if window not in leaderboards.WINDOWS:
+            return Response({'error': 'Неизвестный период'}, status=400)
+        if request.user.role != 'owner' and not board.startswith(f'{request.user.role}_'):
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            return Response({'error': 'Неверный лимит'}, status=400)
+        
+        entries = leaderboards.get_leaderboard(board, window, limit)
+        return Response({
+            'board': board,
+            'window': window,
+            'entries': [
+                {
+                    'rank': entry.rank,
+                    'user_id': entry.user_id,
+                    'user_name': entry.user.get_full_name() or entry.user.username,
+                    'value': float(entry.value),
+                }
+                for entry in entries
+            ]
+        })
+
+class CohortAnalyticsView(APIView):
+    """Когорты клиентов по месяцу привлечения - только для владельца"""
+    
+    def get(self, request):
+        if request.user.role != 'owner':
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        source = request.query_params.get('source') or None
+        if source and source not in lookups.choice_map(Client, 'source'):
+            return Response({'error': 'Неизвестный источник'}, status=400)
+        
+        try:
+            start = self._parse_month(request.query_params.get('start'))
+            end = self._parse_month(request.query_params.get('end'))
+        except ValueError:
+            return Response({'error': 'Неверный формат месяца. Используйте YYYY-MM'}, status=400)
+        
+        return Response({
+            'source': source,
+            'cohorts': cohorts.get_cohort_matrix(source=source, start=start, end=end)
+        })
+    
+    def _parse_month(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m').date()
+
+
+class ClientLifetimeValueView(APIView):
+    """Клиенты с наибольшей накопленной выручкой - только для владельца"""
+    
+    def get(self, request):
+        if request.user.role != 'owner':
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 500))
+        except ValueError:
+            return Response({'error': 'Неверный лимит'}, status=400)
+        
+        source = request.query_params.get('source') or None
+        return Response([
+            {
+                'client_id': value.client_id,
+                'client_name': value.client.name,
+                'source': value.source,
+                'cohort_month': value.cohort_month.strftime('%Y-%m'),
+                'orders_count': value.orders_count,
+                'revenue': float(value.revenue),
+                'profit': float(value.profit),
+                'last_order_at': value.last_order_at,
+            }
+            for value in cohorts.get_top_clients(limit=limit, source=source)
+        ])
+
+class ServiceAnalyticsView(APIView):
+    """Объем, выручка и маржа по услугам, категориям и продавцам - только для владельца"""
+    
+    def get(self, request):
+        if request.user.role != 'owner':
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        group_by = [
+            dimension.strip()
+            for dimension in request.query_params.get('group_by', 'service').split(',')
+            if dimension.strip()
+        ]
+        try:
+            start_date = self._parse_date(request.query_params.get('start_date'))
+            end_date = self._parse_date(request.query_params.get('end_date'))
+        except ValueError:
+            return Response({'error': 'Неверный формат даты. Используйте YYYY-MM-DD'}, status=400)
+        
+        try:
+            rows = service_mix.get_service_breakdown(
+                group_by=group_by,
+                start=start_date,
+                end=end_date,
+                granularity=request.query_params.get('granularity', 'month'),
+                seller_id=request.query_params.get('seller') or None,
+                category=request.query_params.get('category') or None,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        return Response({'group_by': group_by, 'rows': rows})
+    
+    def _parse_date(self, value):
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
+
 class DashboardStatsView(APIView):
     """Статистика дашборда с учетом роли пользователя"""
     
@@ -384,11 +630,17 @@ class DashboardStatsView(APIView):
         start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         
         if request.user.role == 'owner':
-            return self._get_owner_stats(today, start_of_month)
+            compute = lambda: self._get_owner_stats(today, start_of_month)
         elif request.user.role == 'manager':
-            return self._get_manager_stats(request.user, today, start_of_month)
+            compute = lambda: self._get_manager_stats(request.user, today, start_of_month)
         else:  # installer
-            return self._get_installer_stats(request.user, today, start_of_month)
+            compute = lambda: self._get_installer_stats(request.user, today, start_of_month)
+        
+        stats = metrics_cache.get_or_compute(
+            'api_stats', request.user.role, request.user.pk,
+            start_of_month.strftime('%Y-%m'), compute
+        )
+        return Response(stats)
     
     def _get_owner_stats(self, today, start_of_month):
         """Полная статистика для владельца"""
@@ -411,7 +663,7 @@ class DashboardStatsView(APIView):
             created_at__gte=start_of_month
         ).aggregate(total=Sum('amount'))['total'] or 0
         
-        return Response({
+        return {
             'total_orders': total_orders,
             'completed_orders': completed_orders,
             'orders_this_month': orders_this_month,
@@ -421,7 +673,7 @@ class DashboardStatsView(APIView):
             'income_this_month': float(income_this_month),
             'expense_this_month': float(expense_this_month),
             'role': 'owner'
-        })
+        }
     
     def _get_manager_stats(self, user, today, start_of_month):
         """Статистика для менеджера"""
@@ -434,13 +686,13 @@ class DashboardStatsView(APIView):
             total=Sum('total_cost')
         )['total'] or 0
         
-        return Response({
+        return {
             'total_orders': total_orders,
             'completed_orders': completed_orders,
             'orders_this_month': orders_this_month,
             'total_revenue': float(total_revenue),
             'role': 'manager'
-        })
+        }
     
     def _get_installer_stats(self, user, today, start_of_month):
         """Статистика для монтажника"""
@@ -450,13 +702,30 @@ class DashboardStatsView(APIView):
         in_progress_orders = installer_orders.filter(status='in_progress').count()
         orders_this_month = installer_orders.filter(created_at__gte=start_of_month).count()
         
-        return Response({
+        return {
             'total_orders': total_orders,
             'completed_orders': completed_orders,
             'in_progress_orders': in_progress_orders,
             'orders_this_month': orders_this_month,
             'role': 'installer'
-        })
+        }
+
+class MetricsCacheStatsView(APIView):
+    """Счетчики кеша метрик дашбордов - только для владельца"""
+    
+    def get(self, request):
+        if request.user.role != 'owner':
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        return Response(metrics_cache.get_stats())
+    
+    def delete(self, request):
+        """Сброс счетчиков перед новым замером"""
+        if request.user.role != 'owner':
+            return Response({'error': 'Нет прав доступа'}, status=403)
+        
+        metrics_cache.reset_stats()
+        return Response(metrics_cache.get_stats())
 
 # Классы для экспорта данных в Excel
 from .exports import export_clients_to_excel, export_orders_to_excel, export_finance_to_excel
@@ -4,8 +4,9 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from user_accounts.models import User
 from orders.models import Order
+from events.outbox import OutboxMixin
 
-class InstallationSchedule(models.Model):
+class InstallationSchedule(OutboxMixin, models.Model):
     """Расписание монтажей"""
     STATUS_CHOICES = (
         ('scheduled', 'Запланировано'),
@@ -110,6 +111,15 @@ class InstallationSchedule(models.Model):
             if self.actual_start_time >= self.actual_end_time:
                 raise ValidationError('Фактическое время начала должно быть раньше времени окончания')
     
+    outbox_topic = 'schedule'
+    
+    def outbox_payload(self):
+        return {
+            'order_id': self.order_id,
+            'status': self.status,
+            'scheduled_date': self.scheduled_date,
+        }
+    
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
@@ -0,0 +1,226 @@
+# calendar_app/sync.py
+"""
+Синхронизация мобильного приложения монтажника.
+
+Выдача: маршрут и работы монтажника на день (клиент, телефон, адрес, услуги)
+одним компактным ответом. Токен синхронизации - подписанный список
+{id работы: хеш ее данных} с прошлой выдачи: в ответ попадают только новые
+и изменившиеся работы и id работ, которых больше нет в дне. Без токена, с
+чужим или испорченным токеном и при смене дня выдается весь день (full).
+Данные дня читаются фиксированным числом запросов (работы, позиции заказов,
+точки маршрута), названия услуг берутся из справочника в памяти процесса.
+
+Загрузка: накопленные офлайн действия (start, complete, note) применяются
+одной транзакцией. Конфликты определяются по текущему статусу работы:
+действие, которое нельзя применить, возвращается со статусом conflict и
+текущим состоянием работы, остальные применяются. Повтор уже примененного
+действия (ответ потерялся в сети) распознается по времени действия и
+возвращается как duplicate.
+"""
+import hashlib
+import json
+
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from orders.completion import transition_orders
+from orders.models import Order, OrderItem
+from reference import lookups
+from .models import InstallationSchedule, RoutePoint
+
+TOKEN_SALT = 'calendar.installer-sync'
+ACTIONS = ('start', 'complete', 'note')
+
+
+def _time(value):
+    return value.strftime('%H:%M') if value else None
+
+
+def _job(schedule, point, services):
+    order = schedule.order
+    client = order.client
+    return {
+        'id': schedule.pk,
+        'order': order.pk,
+        'seq': point[0] if point else None,
+        'eta': _time(point[1]) if point else None,
+        'from': _time(schedule.scheduled_time_start),
+        'to': _time(schedule.scheduled_time_end),
+        'status': schedule.status,
+        'priority': schedule.priority,
+        'client': client.name,
+        'phone': client.phone,
+        'address': client.address,
+        'lat': schedule.latitude,
+        'lon': schedule.longitude,
+        'services': [
+            services[item.service_id].name if item.service_id in services else None
+            for item in order.items.all()
+        ],
+        'notes': schedule.notes,
+        'started': schedule.actual_start_time,
+        'finished': schedule.actual_end_time,
+    }
+
+
+def day_jobs(user, day):
+    """Работы монтажника на день в порядке маршрута (без маршрута - по времени начала)"""
+    schedules = InstallationSchedule.objects.filter(
+        installers=user, scheduled_date=day
+    ).select_related('order__client').prefetch_related(
+        Prefetch('order__items', queryset=OrderItem.objects.only('id', 'order_id', 'service_id'))
+    )
+    points = {
+        schedule_id: (sequence_number, arrival_time)
+        for schedule_id, sequence_number, arrival_time in RoutePoint.objects.filter(
+            route__installer=user, route__date=day
+        ).values_list('schedule_id', 'sequence_number', 'arrival_time')
+    }
+    services = lookups.services_by_id()
+    jobs = [_job(schedule, points.get(schedule.pk), services) for schedule in schedules]
+    jobs.sort(key=lambda job: (job['seq'] is None, job['seq'] or 0, job['from']))
+    return jobs
+
+
+def _digest(job):
+    data = json.dumps(job, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.md5(data.encode()).hexdigest()[:8]
+
+
+def _read_token(token, user, day):
+    """{id работы: хеш} из токена или None, если токен не подходит"""
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get('u') != user.pk or data.get('d') != day.isoformat():
+        return None
+    return {int(pk): digest for pk, digest in data.get('j', {}).items()}
+
+
+def sync_payload(user, day, token=None):
+    """Изменения дня монтажника с момента выдачи token и новый токен"""
+    known = _read_token(token, user, day)
+    jobs = day_jobs(user, day)
+    digests = {job['id']: _digest(job) for job in jobs}
+    if known is None:
+        changed = jobs
+        removed = []
+    else:
+        changed = [job for job in jobs if known.get(job['id']) != digests[job['id']]]
+        removed = sorted(set(known) - set(digests))
+    return {
+        'token': signing.dumps(
+            {'u': user.pk, 'd': day.isoformat(), 'j': {str(pk): digest for pk, digest in digests.items()}},
+            salt=TOKEN_SALT, compress=True
+        ),
+        'date': day.isoformat(),
+        'full': known is None,
+        'route': [job['id'] for job in jobs],
+        'jobs': changed,
+        'removed': removed,
+    }
+
+
+def _moment(value, now):
+    """Время действия с устройства; без времени - сейчас, из будущего - сейчас"""
+    if not value:
+        return now
+    moment = parse_datetime(str(value))
+    if moment is None:
+        raise ValueError('Неверный формат времени действия')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return min(moment, now)
+
+
+def _note_line(user, moment, text):
+    name = f'{user.first_name} {user.last_name}'.strip() or user.username
+    return f'{timezone.localtime(moment):%d.%m %H:%M} {name}: {text}'
+
+
+def _apply(user, action, schedule, moment):
+    """Применяет действие к работе; возвращает (результат, ошибка)"""
+    kind = action['type']
+    if kind == 'start':
+        if schedule.status in ('in_progress', 'completed') and schedule.actual_start_time == moment:
+            return 'duplicate', None
+        if schedule.status != 'scheduled':
+            return 'conflict', 'Работа уже начата или завершена'
+        schedule.status = 'in_progress'
+        schedule.actual_start_time = moment
+    elif kind == 'complete':
+        if schedule.status == 'completed' and schedule.actual_end_time == moment:
+            return 'duplicate', None
+        if schedule.status != 'in_progress':
+            return 'conflict', 'Работа не была начата'
+        if schedule.actual_start_time and moment <= schedule.actual_start_time:
+            return 'error', 'Время завершения раньше времени начала'
+        schedule.status = 'completed'
+        schedule.actual_end_time = moment
+    else:
+        text = str(action.get('text') or '').strip()
+        if not text:
+            return 'error', 'Пустая заметка'
+        line = _note_line(user, moment, text)
+        lines = schedule.notes.splitlines()
+        if line in lines:
+            return 'duplicate', None
+        schedule.notes = '\n'.join(lines + [line])
+    return 'applied', None
+
+
+def apply_actions(user, actions):
+    """
+    Применяет пачку офлайн действий монтажника одной транзакцией.
+    Возвращает результат по каждому действию в порядке пачки.
+    """
+    now = timezone.now()
+    schedule_ids = {action.get('schedule') for action in actions if isinstance(action, dict)}
+    results = []
+    with transaction.atomic():
+        schedules = {
+            schedule.pk: schedule
+            for schedule in InstallationSchedule.objects.select_for_update().filter(
+                pk__in=[pk for pk in schedule_ids if isinstance(pk, int)], installers=user
+            )
+        }
+        changed = {}
+        for action in actions:
+            action = action if isinstance(action, dict) else {}
+            result = {'id': action.get('id')}
+            schedule = schedules.get(action.get('schedule'))
+            if action.get('type') not in ACTIONS:
+                outcome, error = 'error', 'Неизвестное действие'
+            elif schedule is None:
+                outcome, error = 'error', 'Работа не найдена или не назначена'
+            else:
+                try:
+                    outcome, error = _apply(user, action, schedule, _moment(action.get('at'), now))
+                except ValueError as e:
+                    outcome, error = 'error', str(e)
+            if outcome == 'applied':
+                changed.setdefault(schedule.pk, set()).add(action['type'])
+            result['result'] = outcome
+            if error:
+                result['error'] = error
+            if schedule is not None:
+                result['status'] = schedule.status
+            results.append(result)
+
+        for pk in changed:
+            schedules[pk].save(update_fields=['status', 'actual_start_time', 'actual_end_time', 'notes', 'updated_at'])
+
+        completed = {schedules[pk].order_id for pk, kinds in changed.items() if 'complete' in kinds}
+        started = {schedules[pk].order_id for pk, kinds in changed.items() if 'start' in kinds} - completed
+        if started:
+            transition_orders(Order.objects.filter(pk__in=started, status='new'), 'in_progress')
+        if completed:
+            transition_orders(Order.objects.filter(pk__in=completed), 'completed')
+    return results
@@ -0,0 +1,149 @@
+# calendar_app/test.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from customer_clients.models import Client as CustomerClient
+from finance.models import Transaction
+from orders.models import Order, OrderItem
+from reference import lookups
+from services.models import Service
+from .models import InstallationSchedule, RouteOptimization, RoutePoint
+from .sync import day_jobs
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'calendar-sync-test'}})
+class InstallerSyncTests(TestCase):
+    """Тесты синхронизации мобильного приложения монтажника"""
+
+    def setUp(self):
+        lookups.reset()
+        self.manager = User.objects.create_user(username='manager', password='testpass123', role='manager')
+        self.installer = User.objects.create_user(
+            username='installer', password='testpass123', role='installer', first_name='Петр'
+        )
+        self.service = Service.objects.create(
+            name='Монтаж',
+            cost_price=Decimal('1000.00'),
+            selling_price=Decimal('3000.00'),
+            category='installation'
+        )
+        self.today = timezone.localdate()
+        self.schedules = [self._schedule(f'Клиент {i}', f'{9 + i * 3:02d}:00') for i in range(2)]
+        self.url = reverse('installer_sync')
+        self.client.force_login(self.installer)
+
+    def _schedule(self, name, start):
+        client = CustomerClient.objects.create(name=name, address='ул. Тестовая, 1', phone='+79001234567', source='avito')
+        order = Order.objects.create(client=client, manager=self.manager)
+        OrderItem.objects.create(order=order, service=self.service, price=Decimal('3000.00'), seller=self.manager)
+        schedule = InstallationSchedule.objects.create(
+            order=order,
+            scheduled_date=self.today,
+            scheduled_time_start=start,
+            scheduled_time_end=f'{int(start[:2]) + 2:02d}:00',
+            estimated_duration=timedelta(hours=2)
+        )
+        schedule.installers.add(self.installer)
+        return schedule
+
+    def test_full_then_delta(self):
+        """Первая выдача - весь день, следующая - только изменения"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['full'])
+        self.assertEqual([job['id'] for job in data['jobs']], [s.pk for s in self.schedules])
+        self.assertEqual(data['jobs'][0]['client'], 'Клиент 0')
+        self.assertEqual(data['jobs'][0]['services'], ['Монтаж'])
+
+        response = self.client.get(self.url, {'token': data['token']})
+        delta = response.json()
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['jobs'], [])
+        self.assertEqual(delta['removed'], [])
+
+        client = self.schedules[1].order.client
+        client.phone = '+79007654321'
+        client.save()
+        self.schedules[0].installers.remove(self.installer)
+        delta = self.client.get(self.url, {'token': delta['token']}).json()
+        self.assertEqual([job['phone'] for job in delta['jobs']], ['+79007654321'])
+        self.assertEqual(delta['removed'], [self.schedules[0].pk])
+        self.assertEqual(delta['route'], [self.schedules[1].pk])
+
+    def test_route_order_and_query_count(self):
+        """Порядок маршрута и фиксированное число запросов"""
+        route = RouteOptimization.objects.create(date=self.today, installer=self.installer)
+        RoutePoint.objects.create(route=route, schedule=self.schedules[1], sequence_number=1)
+        RoutePoint.objects.create(route=route, schedule=self.schedules[0], sequence_number=2)
+        lookups.services_by_id()
+        with CaptureQueriesContext(connection) as queries:
+            jobs = day_jobs(self.installer, self.today)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual([job['id'] for job in jobs], [self.schedules[1].pk, self.schedules[0].pk])
+
+        self._schedule('Клиент 2', '15:00')
+        with CaptureQueriesContext(connection) as queries:
+            day_jobs(self.installer, self.today)
+        self.assertEqual(len(queries), 3)
+
+    def test_actions_batch(self):
+        """Пачка офлайн действий применяется с обнаружением конфликтов и повторов"""
+        first, second = self.schedules
+        started = timezone.now() - timedelta(hours=2)
+        finished = started + timedelta(hours=1)
+        InstallationSchedule.objects.filter(pk=second.pk).update(status='cancelled')
+        actions = [
+            {'id': 'a1', 'type': 'start', 'schedule': first.pk, 'at': started.isoformat()},
+            {'id': 'a2', 'type': 'note', 'schedule': first.pk, 'at': started.isoformat(), 'text': 'Нужна лестница'},
+            {'id': 'a3', 'type': 'complete', 'schedule': first.pk, 'at': finished.isoformat()},
+            {'id': 'a4', 'type': 'start', 'schedule': second.pk},
+            {'id': 'a5', 'type': 'fly', 'schedule': first.pk},
+        ]
+        response = self.client.post(self.url, {'actions': actions}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [(result['id'], result['result']) for result in data['results']],
+            [('a1', 'applied'), ('a2', 'applied'), ('a3', 'applied'), ('a4', 'conflict'), ('a5', 'error')]
+        )
+        self.assertEqual(data['results'][3]['status'], 'cancelled')
+        self.assertTrue(data['full'])
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'completed')
+        self.assertEqual(first.actual_start_time, started)
+        self.assertEqual(first.actual_end_time, finished)
+        self.assertIn('Петр: Нужна лестница', first.notes)
+        self.assertEqual(Order.objects.get(pk=first.order_id).status, 'completed')
+        self.assertEqual(Transaction.objects.filter(order_id=first.order_id, kind='order_income').count(), 1)
+
+        # Повтор пачки после потерянного ответа ничего не меняет
+        response = self.client.post(self.url, {'actions': actions[:3]}, content_type='application/json')
+        self.assertEqual([result['result'] for result in response.json()['results']], ['duplicate'] * 3)
+        first.refresh_from_db()
+        self.assertEqual(first.notes.count('Нужна лестница'), 1)
+
+    def test_foreign_schedule_and_role(self):
+        """Чужие работы не изменяются, менеджеру синхронизация недоступна"""
+        other = User.objects.create_user(username='other', password='testpass123', role='installer')
+        self.client.force_login(other)
+        response = self.client.post(
+            self.url,
+            {'actions': [{'id': 1, 'type': 'start', 'schedule': self.schedules[0].pk}]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['results'][0]['result'], 'error')
+        self.assertEqual(InstallationSchedule.objects.get(pk=self.schedules[0].pk).status, 'scheduled')
+
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -3,6 +3,8 @@
 from django.urls import path
 from django.http import JsonResponse
 
+from .views import InstallerSyncView
+
 # Временная заглушка для календаря
 def calendar_placeholder(request):
     return JsonResponse({
@@ -12,4 +14,5 @@ def calendar_placeholder(request):
 
 urlpatterns = [
     path('', calendar_placeholder, name='calendar_placeholder'),
-]
\ No newline at end of file
+    path('installer/sync/', InstallerSyncView.as_view(), name='installer_sync'),
+]
@@ -11,6 +11,7 @@ from django.db.models import Q
 
 from .models import InstallationSchedule, RouteOptimization
 from .services import CalendarService, RouteOptimizationService
+from .sync import apply_actions, sync_payload
 from .serializers import InstallationScheduleSerializer, RouteOptimizationSerializer
 from orders.models import Order
 from user_accounts.models import User
@@ -216,8 +217,7 @@ class StartWorkView(APIView):
         
         # Обновляем статус заказа
         if schedule.order.status == 'new':
-            schedule.order.status = 'in_progress'
-            schedule.order.save()
+            schedule.order.transition_to('in_progress')
         
         return Response({
             'message': 'Работа начата',
@@ -245,9 +245,7 @@ class CompleteWorkView(APIView):
         schedule.save()
         
         # Обновляем статус заказа на завершенный
-        schedule.order.status = 'completed'
-        schedule.order.completed_at = timezone.now()
-        schedule.order.save()
+        schedule.order.transition_to('completed')
         
         return Response({
             'message': 'Работа завершена',
@@ -409,4 +407,45 @@ class AvailabilityCheckView(APIView):
             'available': len(conflicts) == 0,
             'conflicts': conflicts,
             'message': 'Все монтажники доступны' if not conflicts else f'Конфликты: {", ".join(conflicts)}'
-        })
\ No newline at end of file
+        })
+
+@method_decorator(login_required, name='dispatch')
+class InstallerSyncView(APIView):
+    """Синхронизация мобильного приложения монтажника"""
+    
+    def _day(self, value):
+        if not value:
+            return timezone.localdate()
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    
+    def get(self, request):
+        """Изменения дня с момента выдачи token (без token - весь день)"""
+        if request.user.role != 'installer':
+            return Response({'error': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            day = self._day(request.GET.get('date'))
+        except ValueError:
+            return Response({'error': 'Неверный формат даты. Используйте YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(sync_payload(request.user, day, request.GET.get('token')))
+    
+    def post(self, request):
+        """Пачка офлайн действий и изменения дня одним ответом"""
+        if request.user.role != 'installer':
+            return Response({'error': 'Недостаточно прав'}, status=status.HTTP_403_FORBIDDEN)
+        
+        actions = request.data.get('actions', [])
+        if not isinstance(actions, list):
+            return Response({'error': 'actions должен быть списком'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            day = self._day(request.data.get('date'))
+        except ValueError:
+            return Response({'error': 'Неверный формат даты. Используйте YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = apply_actions(request.user, actions)
+        return Response({
+            'results': results,
+            **sync_payload(request.user, day, request.data.get('token'))
+        })
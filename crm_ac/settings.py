@@ -41,6 +41,8 @@ INSTALLED_APPS = [
     'api',
     'calendar_app',
     'salary_config',  # Новое приложение
+    'events',
+    'reference',
 ]
 
 MIDDLEWARE = [
@@ -121,6 +123,35 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Кеши: кеш метрик дашбордов вынесен в отдельный алиас и настраивается через окружение
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'metrics': {
+        'BACKEND': os.environ.get('METRICS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('METRICS_CACHE_LOCATION', 'crm-metrics'),
+    },
+}
+METRICS_CACHE_ALIAS = 'metrics'
+METRICS_CACHE_TIMEOUT = int(os.environ.get('METRICS_CACHE_TIMEOUT', '300'))
+
+# События outbox: пропуск id ниже позиции обработчика ждет запоздавшее событие
+# (сек); сводки, кэш метрик и рейтинги пересчитывает процесс dispatch_events
+# (ANALYTICS_VIA_OUTBOX=0 - пересчет в запросе, без этого процесса)
+EVENTS_GAP_TIMEOUT = int(os.environ.get('EVENTS_GAP_TIMEOUT', '300'))
+ANALYTICS_VIA_OUTBOX = os.environ.get('ANALYTICS_VIA_OUTBOX', '1') == '1'
+
+# Справочники в памяти процесса: метки версий - в общем кеше (для нескольких
+# процессов нужен общий бэкенд), копия старше REFERENCE_MAX_AGE сек перечитывается
+REFERENCE_CACHE_ALIAS = os.environ.get('REFERENCE_CACHE_ALIAS', 'default')
+REFERENCE_MAX_AGE = int(os.environ.get('REFERENCE_MAX_AGE', '300'))
+
+# Снимок конфигураций зарплат: версия - в общем кеше (как у справочников),
+# снимок старше SALARY_CONFIG_MAX_AGE сек перечитывается
+SALARY_CONFIG_CACHE_ALIAS = os.environ.get('SALARY_CONFIG_CACHE_ALIAS', REFERENCE_CACHE_ALIAS)
+SALARY_CONFIG_MAX_AGE = int(os.environ.get('SALARY_CONFIG_MAX_AGE', '300'))
+
 # Custom user model
 AUTH_USER_MODEL = 'user_accounts.User'
 
@@ -23,11 +23,17 @@ PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
 ]
 
+# Аналитика пересчитывается синхронно; путь через outbox - override_settings в тестах
+ANALYTICS_VIA_OUTBOX = False
+
 # Отключаем кеширование
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+    },
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
 }
 
 # Отключаем логирование в тестах
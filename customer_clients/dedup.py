@@ -0,0 +1,156 @@
+# customer_clients/dedup.py
+"""
+Поиск и слияние дублей клиентов.
+
+При создании клиента кандидаты ищутся по индексам: тот же нормализованный
+телефон (phone_digits) или тот же нормализованный адрес (address_key)
+с похожим именем. Пакетный поиск find_clusters() не сравнивает клиентов
+попарно: строки сортируются по ключам блокировки (цифры телефона, слова
+адреса) и связываются только внутри одного блока, поэтому вся работа -
+сортировка O(n log n). Связанные клиенты собираются в группы системой
+непересекающихся множеств; слияние переносит заказы одним UPDATE на пачку.
+
+UPDATE не вызывает сигналов заказов, поэтому после переноса заказов (до удаления
+дублей) отправляется сигнал clients_merged: по нему пишутся события outbox
+и пересчитываются LTV и когорты затронутых клиентов.
+"""
+import re
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.dispatch import Signal
+
+from orders.models import Order
+from .models import Client, normalize_address, normalize_phone
+
+# Более короткий номер не отличает клиента (городские без кода, опечатки)
+MIN_PHONE_DIGITS = 7
+MAX_CANDIDATES = 20
+MERGE_BATCH_SIZE = 500
+
+# Заказы перенесены, дубли еще не удалены: merges - {id дубля: id клиента},
+# orders - {id заказа: (id прежнего клиента, id нового клиента)}
+clients_merged = Signal()
+
+
+def name_tokens(name):
+    """Слова имени в нижнем регистре (от двух букв)"""
+    return {word for word in re.findall(r'[^\W\d_]+', (name or '').lower().replace('ё', 'е')) if len(word) > 1}
+
+
+def find_duplicates(client):
+    """
+    Существующие клиенты, похожие на client (можно несохраненного):
+    с тем же телефоном или с тем же адресом и общим словом в имени
+    """
+    phone = normalize_phone(client.phone)
+    address = normalize_address(client.address)[:200]
+    conditions = Q()
+    if len(phone) >= MIN_PHONE_DIGITS:
+        conditions |= Q(phone_digits=phone)
+    if address:
+        conditions |= Q(address_key=address)
+    if not conditions:
+        return []
+
+    candidates = Client.objects.filter(conditions).order_by('created_at', 'pk')
+    if client.pk:
+        candidates = candidates.exclude(pk=client.pk)
+    tokens = name_tokens(client.name)
+    return [
+        candidate for candidate in candidates[:MAX_CANDIDATES]
+        if (len(phone) >= MIN_PHONE_DIGITS and candidate.phone_digits == phone)
+        or tokens & name_tokens(candidate.name)
+    ]
+
+
+def merge(target, duplicates):
+    """Переносит заказы дублей на target и удаляет дубли; возвращает число перенесенных заказов"""
+    duplicate_ids = [duplicate.pk for duplicate in duplicates if duplicate.pk != target.pk]
+    if not duplicate_ids:
+        return 0
+    with transaction.atomic():
+        orders = {
+            order_id: (client_id, target.pk)
+            for order_id, client_id in Order.objects.filter(client_id__in=duplicate_ids).values_list('id', 'client_id')
+        }
+        moved = Order.objects.filter(pk__in=list(orders)).update(client=target)
+        Client.objects.filter(duplicate_of_id__in=duplicate_ids).exclude(
+            pk__in=duplicate_ids + [target.pk]
+        ).update(duplicate_of=target)
+        clients_merged.send(sender=Client, merges=dict.fromkeys(duplicate_ids, target.pk), orders=orders)
+        Client.objects.filter(pk__in=duplicate_ids).delete()
+    target.refresh_from_db()
+    return moved
+
+
+def find_clusters(queryset=None):
+    """Группы дублей [[pk, ...]] по возрастанию pk; первый в группе - самый ранний клиент"""
+    if queryset is None:
+        queryset = Client.objects.all()
+    rows = list(queryset.values_list('pk', 'name', 'phone_digits', 'address_key'))
+
+    parent = {row[0]: row[0] for row in rows}
+
+    def root(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    def union(first, second):
+        first, second = root(first), root(second)
+        if first != second:
+            parent[max(first, second)] = min(first, second)
+
+    # Блок по телефону: один номер - один клиент
+    by_phone = sorted((phone, pk) for pk, _, phone, _ in rows if len(phone) >= MIN_PHONE_DIGITS)
+    for _, block in groupby(by_phone, key=itemgetter(0)):
+        block_ids = [pk for _, pk in block]
+        for pk in block_ids[1:]:
+            union(block_ids[0], pk)
+
+    # Блок по адресу: внутри связываются клиенты с общим словом в имени
+    by_address = sorted((address, pk, name) for pk, name, _, address in rows if address)
+    for _, block in groupby(by_address, key=itemgetter(0)):
+        first_with_token = {}
+        for _, pk, name in block:
+            for token in name_tokens(name):
+                if token in first_with_token:
+                    union(first_with_token[token], pk)
+                else:
+                    first_with_token[token] = pk
+
+    clusters = {}
+    for pk in parent:
+        clusters.setdefault(root(pk), []).append(pk)
+    return sorted(sorted(cluster) for cluster in clusters.values() if len(cluster) > 1)
+
+
+def merge_clusters(clusters, batch_size=MERGE_BATCH_SIZE):
+    """
+    Слияние групп find_clusters(): заказы переносятся на первого клиента
+    группы пачками. Возвращает (удалено клиентов, перенесено заказов)
+    """
+    targets = {pk: cluster[0] for cluster in clusters for pk in cluster[1:]}
+    items = sorted(targets.items())
+    removed = moved = 0
+    orders = {}
+    with transaction.atomic():
+        for offset in range(0, len(items), batch_size):
+            batch = dict(items[offset:offset + batch_size])
+            orders.update(
+                (order_id, (client_id, batch[client_id]))
+                for order_id, client_id in Order.objects.filter(client_id__in=list(batch)).values_list('id', 'client_id')
+            )
+            moved += Order.objects.filter(client_id__in=list(batch)).update(client_id=Case(
+                *[When(client_id=pk, then=Value(target)) for pk, target in batch.items()]
+            ))
+        if targets:
+            clients_merged.send(sender=Client, merges=targets, orders=orders)
+        for offset in range(0, len(items), batch_size):
+            batch = [pk for pk, _ in items[offset:offset + batch_size]]
+            removed += Client.objects.filter(pk__in=batch).delete()[1].get(Client._meta.label, 0)
+    return removed, moved
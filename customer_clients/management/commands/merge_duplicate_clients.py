@@ -0,0 +1,45 @@
+# customer_clients/management/commands/merge_duplicate_clients.py
+from django.core.management.base import BaseCommand
+
+from customer_clients import dedup
+from customer_clients.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Находит дубли клиентов по телефону и адресу и объединяет их заказы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать найденные группы, ничего не менять'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=dedup.MERGE_BATCH_SIZE,
+            help='Количество дублей в одной пачке слияния'
+        )
+
+    def handle(self, *args, **options):
+        clusters = dedup.find_clusters()
+        if not clusters:
+            self.stdout.write(self.style.SUCCESS('Дубли клиентов не найдены'))
+            return
+
+        if options['dry_run']:
+            names = dict(Client.objects.filter(
+                pk__in=[pk for cluster in clusters for pk in cluster]
+            ).values_list('pk', 'name'))
+            for cluster in clusters:
+                self.stdout.write(', '.join(f'#{pk} {names[pk]}' for pk in cluster))
+            self.stdout.write(self.style.SUCCESS(
+                f'Групп дублей: {len(clusters)}, будет удалено клиентов: '
+                f'{sum(len(cluster) - 1 for cluster in clusters)}'
+            ))
+            return
+
+        removed, moved = dedup.merge_clusters(clusters, batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Групп дублей: {len(clusters)}, удалено клиентов: {removed}, перенесено заказов: {moved}'
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:56
+
+from django.db import migrations, models
+
+
+def fill_phone_digits(apps, schema_editor):
+    from customer_clients.models import normalize_phone
+
+    Client = apps.get_model('customer_clients', 'Client')
+    clients = list(Client.objects.only('id', 'phone'))
+    for client in clients:
+        client.phone_digits = normalize_phone(client.phone)
+        client.phone_digits_reversed = client.phone_digits[::-1]
+    Client.objects.bulk_update(clients, ['phone_digits', 'phone_digits_reversed'], batch_size=1000)
+
+
+def install_text_index(apps, schema_editor):
+    from customer_clients.search import install_index
+
+    install_index(schema_editor.connection)
+
+
+def uninstall_text_index(apps, schema_editor):
+    from customer_clients.search import uninstall_index
+
+    uninstall_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_clients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=15, verbose_name='Цифры телефона'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='phone_digits_reversed',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=15, verbose_name='Цифры телефона (обратно)'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+        migrations.RunPython(install_text_index, uninstall_text_index),
+    ]
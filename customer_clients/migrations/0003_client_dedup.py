@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-19 01:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_address_key(apps, schema_editor):
+    from customer_clients.models import normalize_address
+
+    Client = apps.get_model('customer_clients', 'Client')
+    clients = list(Client.objects.only('id', 'address'))
+    for client in clients:
+        client.address_key = normalize_address(client.address)[:200]
+    Client.objects.bulk_update(clients, ['address_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_clients', '0002_client_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='address_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, verbose_name='Ключ адреса'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='possible_duplicates', to='customer_clients.client', verbose_name='Возможный дубль клиента'),
+        ),
+        migrations.RunPython(fill_address_key, migrations.RunPython.noop),
+    ]
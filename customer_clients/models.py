@@ -1,5 +1,26 @@
+import re
+
 from django.db import models
 
+def normalize_phone(value):
+    """Цифры телефона; российский номер через 8 приводится к 7"""
+    digits = re.sub(r'\D', '', value or '')
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    return digits
+
+# Служебные слова адреса, не различающие адреса между собой
+ADDRESS_STOP_WORDS = {
+    'г', 'город', 'ул', 'улица', 'пр', 'т', 'проспект', 'пер', 'переулок',
+    'ш', 'шоссе', 'б', 'р', 'бульвар', 'д', 'дом', 'к', 'корп', 'корпус',
+    'стр', 'строение', 'кв', 'квартира', 'офис', 'оф',
+}
+
+def normalize_address(value):
+    """Значимые слова адреса в нижнем регистре без сокращений и знаков препинания"""
+    words = re.findall(r'[^\W_]+', (value or '').lower().replace('ё', 'е'))
+    return ' '.join(word for word in words if word not in ADDRESS_STOP_WORDS)
+
 class Client(models.Model):
     SOURCE_CHOICES = (
         ('avito', 'Авито'),
@@ -12,13 +33,34 @@ class Client(models.Model):
     name = models.CharField(max_length=100, verbose_name="Имя")
     address = models.CharField(max_length=200, verbose_name="Адрес")
     phone = models.CharField(max_length=15, verbose_name="Телефон")
+    # Цифры телефона для поиска по началу и (в обратном порядке) по концу номера
+    phone_digits = models.CharField(max_length=15, blank=True, editable=False, db_index=True, verbose_name="Цифры телефона")
+    phone_digits_reversed = models.CharField(max_length=15, blank=True, editable=False, db_index=True, verbose_name="Цифры телефона (обратно)")
+    # Нормализованный адрес - ключ поиска дублей
+    address_key = models.CharField(max_length=200, blank=True, editable=False, db_index=True, verbose_name="Ключ адреса")
     source = models.CharField(max_length=15, choices=SOURCE_CHOICES, verbose_name="Источник")
+    # Клиент создан несмотря на совпадение с существующим - кандидат на слияние
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='possible_duplicates', verbose_name="Возможный дубль клиента")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     
     def __str__(self):
         return f"{self.name} ({self.phone})"
     
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone)
+        self.phone_digits_reversed = self.phone_digits[::-1]
+        self.address_key = normalize_address(self.address)[:200]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'phone' in update_fields:
+                update_fields |= {'phone_digits', 'phone_digits_reversed'}
+            if 'address' in update_fields:
+                update_fields.add('address_key')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = "Клиент"
         verbose_name_plural = "Клиенты"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
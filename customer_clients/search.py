@@ -0,0 +1,198 @@
+# customer_clients/search.py
+"""
+Поиск клиентов по телефону, имени и адресу.
+
+Телефон ищется по нормализованным цифрам (phone_digits) диапазоном
+по индексу: начало номера - по phone_digits, конец - по перевернутым
+цифрам phone_digits_reversed. Если начало и конец номера ничего не дали
+(введены цифры из середины), для запросов от CONTAINS_MIN_DIGITS цифр
+ищется вхождение цифр - уже без индекса.
+Имя и адрес ищутся по триграммному индексу:
+в PostgreSQL - GIN pg_trgm, в SQLite - таблица FTS5 с токенизатором trigram,
+которую синхронизируют триггеры. Без индекса (или для запросов короче
+трех символов) используется прежний icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Client, normalize_phone
+
+FTS_TABLE = 'customer_clients_client_fts'
+TRIGRAM = 3
+# Вхождение цифр в середине номера - полный просмотр, только для длинных запросов
+CONTAINS_MIN_DIGITS = 4
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+_PHONE_QUERY = re.compile(r'^[\d\s()+\-]+$')
+
+
+def install_index(db):
+    """Создает текстовый индекс клиентов для текущей СУБД (вызывается из миграции)"""
+    table = Client._meta.db_table
+    db.client_fts_available = None
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for column in ('name', 'address'):
+                # icontains в PostgreSQL сравнивает UPPER(колонка) LIKE ...
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+                    f'ON {table} USING gin (UPPER({column}) gin_trgm_ops)'
+                )
+        elif db.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"name, address, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {FTS_TABLE}(rowid, name, address) VALUES (new.id, new.name, new.address); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address) "
+                f"VALUES ('delete', old.id, old.name, old.address); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, address ON {table} BEGIN '
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address) "
+                f"VALUES ('delete', old.id, old.name, old.address); "
+                f'INSERT INTO {FTS_TABLE}(rowid, name, address) VALUES (new.id, new.name, new.address); END'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_index(db):
+    table = Client._meta.db_table
+    db.client_fts_available = None
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            for column in ('name', 'address'):
+                cursor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+        elif db.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _fts_available():
+    """Есть ли таблица FTS (проверяется один раз на соединение, миграции сбрасывают)"""
+    if connection.vendor != 'sqlite':
+        return False
+    available = getattr(connection, 'client_fts_available', None)
+    if available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            available = cursor.fetchone() is not None
+        connection.client_fts_available = available
+    return available
+
+
+def _phone_digits(query):
+    """Цифры запроса, если запрос похож на номер телефона (иначе None)"""
+    if not _PHONE_QUERY.match(query):
+        return None
+    digits = re.sub(r'\D', '', query)
+    return digits if len(digits) >= TRIGRAM else None
+
+
+def _prefix_range(field, value):
+    # Диапазон вместо LIKE 'x%': использует индекс в любой СУБД (':' идет сразу после '9')
+    return Q(**{f'{field}__gte': value, f'{field}__lt': value + ':'})
+
+
+def phone_q(digits, prefix=''):
+    """Номер начинается или заканчивается на digits"""
+    candidates = {digits, normalize_phone(digits)}
+    if digits.startswith('8'):
+        candidates.add('7' + digits[1:])
+    q = Q()
+    for candidate in candidates:
+        q |= _prefix_range(f'{prefix}phone_digits', candidate)
+    return q | _prefix_range(f'{prefix}phone_digits_reversed', digits[::-1])
+
+
+def phone_contains_q(digits, prefix=''):
+    """Цифры встречаются в любом месте номера (полный просмотр, только как запасной вариант)"""
+    return Q(**{f'{prefix}phone_digits__contains': digits})
+
+
+def _fts_match(query):
+    """Выражение MATCH: все слова запроса от трех символов (None - искать нечем)"""
+    words = [word for word in query.split() if len(word) >= TRIGRAM]
+    if not words:
+        return None
+    return ' AND '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def text_q(query, prefix=''):
+    """Имя или адрес содержат запрос"""
+    match = _fts_match(query) if _fts_available() else None
+    if match is None:
+        return Q(**{f'{prefix}name__icontains': query}) | Q(**{f'{prefix}address__icontains': query})
+    return Q(**{f'{prefix}pk__in': RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]
+    )})
+
+
+def filter_clients(queryset, query, prefix=''):
+    """
+    Фильтр по поисковой строке для любого queryset.
+    prefix - путь к клиенту от модели queryset, например 'client__'.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    digits = _phone_digits(query)
+    if digits:
+        matched = queryset.filter(phone_q(digits, prefix))
+        if len(digits) < CONTAINS_MIN_DIGITS or matched.exists():
+            return matched
+        return queryset.filter(phone_contains_q(digits, prefix))
+    return queryset.filter(text_q(query, prefix))
+
+
+def search_clients(queryset, query, limit=DEFAULT_LIMIT):
+    """Подсказки для поиска: лучшие совпадения по релевантности"""
+    query = query.strip()
+    limit = max(1, min(limit, MAX_LIMIT))
+    if not query:
+        return []
+
+    digits = _phone_digits(query)
+    if digits:
+        clients = list(queryset.filter(phone_q(digits)).order_by('phone_digits')[:limit])
+        # Полное совпадение номера - первым
+        clients.sort(key=lambda client: client.phone_digits != normalize_phone(digits))
+        if len(clients) < limit and len(digits) >= CONTAINS_MIN_DIGITS:
+            # Дополняем совпадениями в середине номера
+            clients += list(queryset.filter(phone_contains_q(digits)).exclude(
+                pk__in=[client.pk for client in clients]
+            ).order_by('phone_digits')[:limit - len(clients)])
+        return clients
+
+    match = _fts_match(query) if _fts_available() else None
+    if match is not None:
+        table = Client._meta.db_table
+        return list(queryset.filter(text_q(query)).annotate(search_rank=RawSQL(
+            # bm25: чем меньше, тем релевантнее; совпадение в имени весит больше адреса
+            f'SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id', [match]
+        )).order_by('search_rank', 'name')[:limit])
+
+    if connection.vendor == 'postgresql' and len(query) >= TRIGRAM:
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Greatest
+        return list(queryset.filter(text_q(query)).annotate(
+            search_rank=Greatest(TrigramSimilarity('name', query), TrigramSimilarity('address', query))
+        ).order_by('-search_rank', 'name')[:limit])
+
+    # Короткий запрос: сначала имена, начинающиеся с него
+    return sorted(
+        queryset.filter(text_q(query)).order_by('name')[:limit],
+        key=lambda client: not client.name.lower().startswith(query.lower())
+    )
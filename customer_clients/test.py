@@ -2,10 +2,20 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
 from rest_framework.test import APITestCase
 from rest_framework import status
 from .models import Client as CustomerClient
 from .forms import ClientForm
+from . import search, dedup
+from orders.models import Order
+from analytics import cohorts
+from analytics.models import ClientCohort, ClientLifetimeValue
+from events.models import OutboxEvent
 
 User = get_user_model()
 
@@ -344,6 +354,169 @@ class ClientAPITests(APITestCase):
         self.assertIn('API', response.data['results'][0]['name'])
 
 
+class ClientSearchTests(APITestCase):
+    """Тесты поискового индекса клиентов"""
+    
+    def setUp(self):
+        # Тестовая БД создается без миграций - индекс ставим явно
+        search.install_index(connection)
+        # Откат транзакции теста удаляет индекс - сбрасываем проверку его наличия
+        self.addCleanup(setattr, connection, 'client_fts_available', None)
+        self.manager = User.objects.create_user(username='search_manager', password='testpass123', role='manager')
+        self.installer = User.objects.create_user(username='search_installer', password='testpass123', role='installer')
+        self.petrov = CustomerClient.objects.create(
+            name='Иван Петров', address='ул. Садовая, 1', phone='8 (900) 111-22-33', source='website'
+        )
+        self.street = CustomerClient.objects.create(
+            name='Анна Смирнова', address='ул. Петровская, 5', phone='+79005556677', source='avito'
+        )
+    
+    def test_phone_digits_normalized(self):
+        self.assertEqual(self.petrov.phone_digits, '79001112233')
+        self.assertEqual(self.petrov.phone_digits_reversed, '33221110097')
+    
+    def test_phone_prefix_and_suffix(self):
+        queryset = CustomerClient.objects.all()
+        self.assertEqual(list(search.filter_clients(queryset, '8900111')), [self.petrov])
+        self.assertEqual(list(search.filter_clients(queryset, '+7 900 555')), [self.street])
+        self.assertEqual(list(search.filter_clients(queryset, '6677')), [self.street])
+    
+    def test_phone_middle_digits(self):
+        """Цифры из середины номера находятся запасным поиском по вхождению"""
+        queryset = CustomerClient.objects.all()
+        self.assertEqual(list(search.filter_clients(queryset, '0555')), [self.street])
+        self.assertEqual(search.search_clients(queryset, '1122'), [self.petrov])
+        # Короткий запрос - только по индексу, без полного просмотра
+        self.assertEqual(list(search.filter_clients(queryset, '555')), [])
+        with self.assertNumQueries(1):
+            self.assertEqual(search.search_clients(queryset, '555'), [])
+        # Совпадение в начале номера идет раньше совпадения в середине
+        self.assertEqual(search.search_clients(queryset, '7900'), [self.petrov, self.street])
+    
+    def test_text_search_ranks_name_first(self):
+        """Ранжирование bm25 по индексу FTS5: совпадение в имени выше совпадения в адресе"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 есть только в SQLite')
+        self.assertTrue(search._fts_available())
+        with self.assertNumQueries(0):
+            self.assertTrue(search._fts_available())
+        results = search.search_clients(CustomerClient.objects.all(), 'петров')
+        self.assertEqual(results, [self.petrov, self.street])
+        self.assertLess(results[0].search_rank, results[1].search_rank)
+        self.assertEqual(search.search_clients(CustomerClient.objects.all(), 'садов'), [self.petrov])
+    
+    def test_index_follows_updates(self):
+        self.petrov.name = 'Иван Сидоров'
+        self.petrov.save()
+        queryset = CustomerClient.objects.all()
+        self.assertEqual(list(search.filter_clients(queryset, 'сидор')), [self.petrov])
+        self.assertEqual(list(search.filter_clients(queryset, 'Иван Петров')), [])
+    
+    def test_search_endpoint(self):
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/clients/search/', {'q': 'смирн'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [self.street.id])
+        
+        # Монтажник видит только клиентов своих заказов
+        self.client.force_authenticate(user=self.installer)
+        response = self.client.get('/api/clients/search/', {'q': 'смирн'})
+        self.assertEqual(response.data, [])
+
+
+class ClientDeduplicationTests(APITestCase):
+    """Тесты поиска и слияния дублей клиентов"""
+    
+    def setUp(self):
+        self.manager = User.objects.create_user(username='dedup_manager', password='testpass123', role='manager')
+        self.original = CustomerClient.objects.create(
+            name='Иван Петров', address='г. Москва, ул. Садовая, д. 1, кв. 5', phone='+7 (900) 123-45-67', source='avito'
+        )
+    
+    def _order(self, client):
+        return Order.objects.create(client=client, manager=self.manager)
+    
+    def test_find_duplicates_by_phone_and_address(self):
+        by_phone = CustomerClient(name='Другой', address='Тверь', phone='89001234567')
+        self.assertEqual(dedup.find_duplicates(by_phone), [self.original])
+        by_address = CustomerClient(name='петров И.', address='Москва Садовая 1 кв 5', phone='111')
+        self.assertEqual(dedup.find_duplicates(by_address), [self.original])
+        neighbour = CustomerClient(name='Анна Смирнова', address='Москва, Садовая 1, 5', phone='+79990000000')
+        self.assertEqual(dedup.find_duplicates(neighbour), [])
+    
+    def test_modal_create_reports_duplicates(self):
+        self.client.force_login(self.manager)
+        data = {'name': 'Иван', 'address': 'Тверь', 'phone': '89001234567', 'source': 'vk'}
+        response = self.client.post('/api/modal/client/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([item['id'] for item in response.data['duplicates']], [self.original.id])
+        
+        response = self.client.post('/api/modal/client/', {**data, 'confirm_duplicate': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['duplicate_of'], self.original.id)
+    
+    def test_api_create_reports_duplicates(self):
+        """Быстрое создание клиента из списка заказов тоже проверяет дубли"""
+        self.client.force_authenticate(user=self.manager)
+        data = {'name': 'Иван', 'address': 'Тверь', 'phone': '89001234567', 'source': 'vk'}
+        response = self.client.post('/api/clients/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([item['id'] for item in response.data['duplicates']], [self.original.id])
+        self.assertEqual(CustomerClient.objects.count(), 1)
+        
+        response = self.client.post('/api/clients/', {**data, 'confirm_duplicate': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['duplicate_of'], self.original.id)
+    
+    def test_merge_refreshes_ltv_cohorts_and_outbox(self):
+        """Перенос заказов при слиянии пересчитывает LTV, когорты и пишет события"""
+        duplicate = CustomerClient.objects.create(name='Петров', address='Тверь', phone='89001234567', source='vk')
+        order = self._order(duplicate)
+        completed_at = timezone.now() - timedelta(days=100)
+        Order.objects.filter(pk=order.pk).update(status='completed', completed_at=completed_at)
+        cohorts.build()
+        self.assertEqual(ClientCohort.objects.get(source='vk').ordering_clients, 1)
+        
+        dedup.merge(self.original, [duplicate])
+        value = ClientLifetimeValue.objects.get()
+        self.assertEqual(value.client, self.original)
+        self.assertEqual(value.orders_count, 1)
+        self.assertEqual(value.cohort_month, cohorts.month_start(completed_at))
+        self.assertFalse(ClientCohort.objects.filter(source='vk').exists())
+        cohort = ClientCohort.objects.get(source='avito')
+        self.assertEqual((cohort.cohort_month, cohort.clients_count, cohort.orders_count), (value.cohort_month, 1, 1))
+        
+        event = OutboxEvent.objects.get(topic='order.client_changed')
+        self.assertEqual(event.aggregate_id, order.pk)
+        self.assertEqual(event.payload, {'client_id': self.original.pk, 'previous_client_id': duplicate.pk})
+    
+    def test_merge_endpoint_moves_orders(self):
+        duplicate = CustomerClient.objects.create(name='Петров', address='Тверь', phone='89001234567', source='vk')
+        self._order(duplicate)
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post(
+            f'/api/clients/{self.original.id}/merge/', {'duplicate_ids': [duplicate.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['orders_moved'], 1)
+        self.assertFalse(CustomerClient.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(Order.objects.get().client, self.original)
+    
+    def test_batch_merge_clusters(self):
+        by_phone = CustomerClient.objects.create(name='Петров', address='Тверь', phone='8-900-123-45-67', source='vk')
+        by_address = CustomerClient.objects.create(name='И. Петров', address='Москва, Садовая, 1, кв 5', phone='', source='vk')
+        other = CustomerClient.objects.create(name='Анна', address='Москва, Садовая, 1, кв 5', phone='+79990000000', source='vk')
+        for client in (by_phone, by_address, other):
+            self._order(client)
+        
+        self.assertEqual(dedup.find_clusters(), [[self.original.pk, by_phone.pk, by_address.pk]])
+        call_command('merge_duplicate_clients', stdout=StringIO())
+        self.assertEqual(
+            sorted(CustomerClient.objects.values_list('pk', flat=True)), [self.original.pk, other.pk]
+        )
+        self.assertEqual(Order.objects.filter(client=self.original).count(), 2)
+
+
 class ClientFormsTests(TestCase):
     """Тесты форм клиентов"""
     
@@ -1,8 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
 from .models import Client
+from .search import filter_clients
+from .dedup import find_duplicates
 from .forms import ClientForm
 from orders.models import Order
 
@@ -16,14 +17,10 @@ def client_list(request):
     else:
         clients = Client.objects.all().order_by('-created_at')
     
-    # Поиск по имени или телефону
+    # Поиск по имени, телефону или адресу через поисковый индекс
     search_query = request.GET.get('search')
     if search_query:
-        clients = clients.filter(
-            Q(name__icontains=search_query) | 
-            Q(phone__icontains=search_query) |
-            Q(address__icontains=search_query)
-        )
+        clients = filter_clients(clients, search_query)
     
     return render(request, 'clients/list.html', {'clients': clients})
 
@@ -51,8 +48,20 @@ def client_new(request):
     if request.method == 'POST':
         form = ClientForm(request.POST)
         if form.is_valid():
-            client = form.save()
-            messages.success(request, 'Клиент успешно создан!')
+            # Похожие клиенты показываются до создания; создать все равно можно с подтверждением
+            duplicates = find_duplicates(form.instance)
+            if duplicates and not request.POST.get('confirm_duplicate'):
+                return render(request, 'customer_clients/client_form.html', {
+                    'form': form,
+                    'duplicates': duplicates
+                })
+            client = form.save(commit=False)
+            client.duplicate_of = duplicates[0] if duplicates else None
+            client.save()
+            if duplicates:
+                messages.warning(request, 'Клиент создан и отмечен как возможный дубль.')
+            else:
+                messages.success(request, 'Клиент успешно создан!')
             return redirect('client_detail', pk=client.pk)
     else:
         form = ClientForm()
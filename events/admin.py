@@ -0,0 +1,14 @@
+# events/admin.py
+from django.contrib import admin
+from .models import OutboxEvent, OutboxCheckpoint
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'aggregate_id', 'created_at')
+    list_filter = ('topic',)
+    search_fields = ('aggregate_id',)
+
+@admin.register(OutboxCheckpoint)
+class OutboxCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('handler', 'last_event_id', 'failures', 'updated_at')
+    readonly_fields = ('last_error',)
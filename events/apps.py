@@ -0,0 +1,10 @@
+# events/apps.py
+from django.apps import AppConfig
+
+class EventsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'events'
+    verbose_name = 'События'
+    
+    def ready(self):
+        import events.signals  # События массовых операций
@@ -0,0 +1,158 @@
+# events/dispatcher.py
+"""
+Доставка событий outbox зарегистрированным обработчикам.
+
+Обработчик регистрируется декоратором register() с именем и префиксами тем
+и получает события своих тем пачками в порядке id. После успешной пачки позиция
+обработчика (OutboxCheckpoint) сдвигается в той же транзакции, что и его
+изменения в БД; при ошибке позиция остается, и пачка придет снова -
+доставка "хотя бы один раз", обработчики должны быть идемпотентны.
+
+id назначается при вставке, а фиксируются транзакции в своем порядке: событие
+с меньшим id может стать видимым после того, как позиция его прошла. Поэтому
+id, пропущенные ниже позиции, запоминаются в checkpoint.gaps и проверяются
+при каждой выдаче; появившееся событие доставляется, а пропуск, не
+заполнившийся за EVENTS_GAP_TIMEOUT секунд (откат транзакции), забывается.
+
+События пишут и сохранения моделей (OutboxMixin), и массовые операции:
+transition_orders (order.status_changed, transaction.created), выплата
+ведомости (transaction.created) и объединение дублей клиентов
+(order.client_changed).
+"""
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxCheckpoint, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_INTERVAL = 2.0
+
+Handler = namedtuple('Handler', ['name', 'topics', 'func'])
+
+_handlers = {}
+
+
+def register(name, topics=()):
+    """Регистрирует обработчик func(events) для тем с префиксами topics (пусто - все темы)"""
+    def decorator(func):
+        _handlers[name] = Handler(name, tuple(topics), func)
+        return func
+    return decorator
+
+
+def handlers():
+    return dict(_handlers)
+
+
+def _gap_timeout():
+    return getattr(settings, 'EVENTS_GAP_TIMEOUT', 300)
+
+
+def _matches(handler, event):
+    return not handler.topics or event.topic.startswith(handler.topics)
+
+
+def pending(checkpoint, batch_size=DEFAULT_BATCH_SIZE):
+    """Появившиеся события из пропусков и следующая пачка после позиции обработчика (всех тем)"""
+    late = list(OutboxEvent.objects.filter(pk__in=[pk for pk, _ in checkpoint.gaps]).order_by('pk'))
+    return late + list(OutboxEvent.objects.filter(
+        pk__gt=checkpoint.last_event_id
+    ).order_by('pk')[:batch_size])
+
+
+def _advance(checkpoint, events):
+    """Сдвигает позицию за события пачки, запоминая пропущенные id и забывая старые пропуски"""
+    now = time.time()
+    seen = {event.pk for event in events}
+    gaps = [
+        [pk, noticed] for pk, noticed in checkpoint.gaps
+        if pk not in seen and now - noticed < _gap_timeout()
+    ]
+    last = max([checkpoint.last_event_id, *seen])
+    # У нового обработчика id до первого события - удаленная история, а не пропуски
+    first = checkpoint.last_event_id + 1 if checkpoint.last_event_id else min(seen, default=last)
+    gaps += [[pk, now] for pk in range(first, last) if pk not in seen]
+    checkpoint.last_event_id = last
+    checkpoint.gaps = gaps
+
+
+def deliver(handler, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Одна пачка одному обработчику. Обработчик получает только события своих тем,
+    а позиция сдвигается на всю просмотренную пачку. Возвращает число просмотренных событий.
+    """
+    checkpoint, _ = OutboxCheckpoint.objects.get_or_create(handler=handler.name)
+    events = pending(checkpoint, batch_size)
+    if not events:
+        if checkpoint.gaps:
+            _advance(checkpoint, events)
+            checkpoint.save(update_fields=['gaps', 'updated_at'])
+        return 0
+    matching = [event for event in events if _matches(handler, event)]
+    try:
+        with transaction.atomic():
+            if matching:
+                handler.func(matching)
+            _advance(checkpoint, events)
+            checkpoint.failures = 0
+            checkpoint.last_error = ''
+            checkpoint.save(update_fields=['last_event_id', 'gaps', 'failures', 'last_error', 'updated_at'])
+    except Exception as error:
+        logger.exception('Обработчик событий %s: ошибка на событиях %s-%s', handler.name, events[0].pk, events[-1].pk)
+        OutboxCheckpoint.objects.filter(pk=checkpoint.pk).update(
+            failures=F('failures') + 1,
+            last_error=str(error)[:1000]
+        )
+        return 0
+    return len(events)
+
+
+def dispatch(batch_size=DEFAULT_BATCH_SIZE, names=None):
+    """Один проход по обработчикам: {имя: просмотрено событий}"""
+    return {
+        name: deliver(handler, batch_size)
+        for name, handler in sorted(_handlers.items())
+        if not names or name in names
+    }
+
+
+def run(batch_size=DEFAULT_BATCH_SIZE, interval=DEFAULT_INTERVAL, names=None, once=False):
+    """Цикл доставки: пока есть события - без пауз, иначе ожидание interval секунд"""
+    total = 0
+    while True:
+        delivered = sum(dispatch(batch_size, names).values())
+        total += delivered
+        if once and not delivered:
+            return total
+        if not delivered:
+            time.sleep(interval)
+
+
+def purge(keep_days=7):
+    """Удаляет события, доставленные всем обработчикам и старше keep_days дней"""
+    names = list(_handlers)
+    if not names:
+        return 0
+    checkpoints = OutboxCheckpoint.objects.filter(handler__in=names)
+    if checkpoints.count() < len(names):
+        # Обработчик еще ни разу не запускался - ему нужны все события
+        return 0
+    # Событие из пропуска может еще появиться - границу держим ниже него
+    delivered = min(
+        min([checkpoint.last_event_id, *(pk - 1 for pk, _ in checkpoint.gaps)])
+        for checkpoint in checkpoints
+    )
+    deleted, _ = OutboxEvent.objects.filter(
+        pk__lte=delivered,
+        created_at__lt=timezone.now() - timedelta(days=keep_days)
+    ).delete()
+    return deleted
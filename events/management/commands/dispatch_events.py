@@ -0,0 +1,61 @@
+# events/management/commands/dispatch_events.py
+from django.core.management.base import BaseCommand
+
+from events import dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Доставляет события outbox зарегистрированным обработчикам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=dispatcher.DEFAULT_BATCH_SIZE,
+            help='Количество событий в одной пачке'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=dispatcher.DEFAULT_INTERVAL,
+            help='Пауза в секундах, когда новых событий нет'
+        )
+        parser.add_argument(
+            '--handler',
+            action='append',
+            dest='handlers',
+            help='Запустить только указанные обработчики (можно повторять)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать накопившиеся события и завершиться'
+        )
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            default=None,
+            help='После разбора удалить доставленные события старше N дней'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['handlers'] or []) - set(dispatcher.handlers())
+        if unknown:
+            self.stdout.write(self.style.ERROR(f'Неизвестные обработчики: {", ".join(sorted(unknown))}'))
+            return
+
+        try:
+            delivered = dispatcher.run(
+                batch_size=max(options['batch_size'], 1),
+                interval=options['interval'],
+                names=options['handlers'],
+                once=options['once']
+            )
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
+            return
+
+        message = f'Доставлено событий: {delivered}'
+        if options['purge_days'] is not None:
+            message += f', удалено: {dispatcher.purge(options["purge_days"])}'
+        self.stdout.write(self.style.SUCCESS(message))
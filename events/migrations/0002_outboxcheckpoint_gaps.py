@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-19 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxcheckpoint',
+            name='gaps',
+            field=models.JSONField(blank=True, default=list, verbose_name='Пропуски'),
+        ),
+    ]
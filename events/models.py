@@ -0,0 +1,34 @@
+# events/models.py
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+class OutboxEvent(models.Model):
+    """Доменное событие, записанное в одной транзакции с изменением данных"""
+    topic = models.CharField(max_length=50, db_index=True, verbose_name="Тема")
+    aggregate_id = models.BigIntegerField(verbose_name="ID объекта")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Данные")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата создания")
+    
+    def __str__(self):
+        return f"#{self.pk} {self.topic} ({self.aggregate_id})"
+    
+    class Meta:
+        verbose_name = "Событие"
+        verbose_name_plural = "События"
+        ordering = ['id']
+
+class OutboxCheckpoint(models.Model):
+    """Последнее доставленное обработчику событие"""
+    handler = models.CharField(max_length=100, unique=True, verbose_name="Обработчик")
+    last_event_id = models.BigIntegerField(default=0, verbose_name="Последнее событие")
+    gaps = models.JSONField(default=list, blank=True, verbose_name="Пропуски")  # [[id, время обнаружения], ...]
+    failures = models.PositiveIntegerField(default=0, verbose_name="Ошибок подряд")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+    
+    def __str__(self):
+        return f"{self.handler}: {self.last_event_id}"
+    
+    class Meta:
+        verbose_name = "Позиция обработчика"
+        verbose_name_plural = "Позиции обработчиков"
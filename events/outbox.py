@@ -0,0 +1,64 @@
+# events/outbox.py
+"""
+Запись доменных событий в outbox.
+
+Модели с OutboxMixin сохраняются и удаляются внутри transaction.atomic()
+вместе со строкой OutboxEvent: событие появляется только если изменение
+зафиксировано, и наоборот. Тема события - "<outbox_topic>.<created|updated|deleted>",
+данные - outbox_payload() модели (и список update_fields, если он задан).
+
+Массовые операции (QuerySet.update, bulk_create) модель не сохраняют;
+для них событие пишется явно через record()/record_many()/record_created()
+в той же транзакции.
+Каскадные удаления отдельных событий не порождают - достаточно события
+удаленного родителя.
+"""
+from django.db import transaction
+
+from .models import OutboxEvent
+
+
+def record(topic, aggregate_id, payload=None):
+    return OutboxEvent.objects.create(topic=topic, aggregate_id=aggregate_id, payload=payload or {})
+
+
+def record_many(topic, payloads):
+    """События одной темы пакетом: payloads - {id объекта: данные}"""
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, aggregate_id=aggregate_id, payload=payload)
+        for aggregate_id, payload in payloads.items()
+    ])
+
+
+def record_created(objects):
+    """События created для объектов с OutboxMixin, вставленных bulk_create (pk заполнены)"""
+    payloads = {}
+    for obj in objects:
+        payloads.setdefault(obj.outbox_topic, {})[obj.pk] = obj.outbox_payload()
+    for topic, topic_payloads in payloads.items():
+        record_many(f'{topic}.created', topic_payloads)
+
+
+class OutboxMixin:
+    """Сохранение и удаление модели вместе с событием в outbox"""
+    outbox_topic = None
+
+    def outbox_payload(self):
+        return {}
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            payload = self.outbox_payload()
+            if kwargs.get('update_fields') is not None:
+                payload['fields'] = sorted(kwargs['update_fields'])
+            record(f"{self.outbox_topic}.{'created' if created else 'updated'}", self.pk, payload)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        payload = self.outbox_payload()
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            record(f'{self.outbox_topic}.deleted', pk, payload)
+        return result
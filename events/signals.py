@@ -0,0 +1,31 @@
+# events/signals.py
+from django.dispatch import receiver
+
+from customer_clients.dedup import clients_merged
+from customer_clients.models import Client
+from orders.completion import orders_transitioned
+from orders.models import Order
+from .outbox import record_many
+
+
+@receiver(orders_transitioned, sender=Order)
+def record_order_transitions(sender, transitions, status, **kwargs):
+    """Массовая смена статуса идет UPDATE'ом - события пишем сами, в той же транзакции"""
+    managers = dict(Order.objects.filter(pk__in=list(transitions)).values_list('id', 'manager_id'))
+    record_many('order.status_changed', {
+        order_id: {
+            'status': status,
+            'previous_status': previous_status,
+            'manager_id': managers.get(order_id),
+        }
+        for order_id, previous_status in transitions.items()
+    })
+
+
+@receiver(clients_merged, sender=Client)
+def record_merged_orders(sender, orders, **kwargs):
+    """Объединение дублей переносит заказы UPDATE'ом - пишем смену клиента сами"""
+    record_many('order.client_changed', {
+        order_id: {'client_id': client_id, 'previous_client_id': previous_client_id}
+        for order_id, (previous_client_id, client_id) in orders.items()
+    })
@@ -0,0 +1,177 @@
+# events/test.py
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analytics import cache as metrics_cache
+from analytics import rollups
+from analytics.models import DailyRollup, LeaderboardEntry
+from customer_clients.models import Client as CustomerClient
+from orders.completion import transition_orders
+from orders.models import Order, OrderItem
+from services.models import Service
+from . import dispatcher
+from .models import OutboxCheckpoint, OutboxEvent
+
+User = get_user_model()
+
+
+class OutboxTestMixin:
+    def setUp(self):
+        self.manager = User.objects.create_user(username='outbox_manager', password='testpass123', role='manager')
+        self.customer = CustomerClient.objects.create(
+            name='Клиент событий', address='ул. Событийная, 1', phone='+79001230000', source='website'
+        )
+        self.service = Service.objects.create(
+            name='Услуга', cost_price=Decimal('300.00'), selling_price=Decimal('1000.00'), category='installation'
+        )
+
+    def _order(self):
+        order = Order.objects.create(client=self.customer, manager=self.manager)
+        OrderItem.objects.create(order=order, service=self.service, price=Decimal('1000.00'), seller=self.manager)
+        return order
+
+
+class OutboxRecordTests(OutboxTestMixin, TestCase):
+    """Тесты записи событий вместе с изменениями"""
+
+    def test_model_changes_write_events(self):
+        order = self._order()
+        order.transition_to('completed')
+
+        topics = list(OutboxEvent.objects.values_list('topic', flat=True))
+        self.assertEqual(topics[:3], ['order.created', 'order.updated', 'order_item.created'])
+        self.assertIn('transaction.created', topics)
+
+        completed = OutboxEvent.objects.filter(topic='order.updated', payload__status='completed').first()
+        self.assertEqual(completed.aggregate_id, order.pk)
+        self.assertEqual(completed.payload['previous_status'], 'new')
+        self.assertEqual(completed.payload['fields'], ['completed_at', 'status'])
+
+    def test_rolled_back_change_leaves_no_event(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Order.objects.create(client=self.customer, manager=self.manager)
+                raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_bulk_transition_writes_events(self):
+        orders = [self._order() for _ in range(3)]
+        OutboxEvent.objects.all().delete()
+        transition_orders(Order.objects.filter(pk__in=[order.pk for order in orders]), 'completed')
+
+        events = OutboxEvent.objects.filter(topic='order.status_changed')
+        self.assertEqual(sorted(event.aggregate_id for event in events), [order.pk for order in orders])
+        self.assertEqual({event.payload['previous_status'] for event in events}, {'new'})
+
+
+class OutboxDispatchTests(OutboxTestMixin, TestCase):
+    """Тесты доставки событий обработчикам"""
+
+    def setUp(self):
+        super().setUp()
+        self.received = []
+        self.fail = False
+
+        def collect(events):
+            if self.fail:
+                raise ValueError('обработчик недоступен')
+            self.received.extend(event.pk for event in events)
+
+        dispatcher.register('test.orders', topics=['order.'])(collect)
+
+    def tearDown(self):
+        dispatcher._handlers.pop('test.orders', None)
+
+    def test_batches_and_checkpoint(self):
+        for _ in range(3):
+            self._order()
+        order_events = list(OutboxEvent.objects.filter(topic__startswith='order.').values_list('pk', flat=True))
+
+        self.assertEqual(dispatcher.dispatch(batch_size=2, names={'test.orders'}), {'test.orders': 2})
+        dispatcher.run(batch_size=2, names={'test.orders'}, once=True)
+        self.assertEqual(self.received, order_events)
+        # Позиция проходит и события чужих тем
+        self.assertEqual(
+            OutboxCheckpoint.objects.get(handler='test.orders').last_event_id,
+            OutboxEvent.objects.order_by('-pk').values_list('pk', flat=True).first()
+        )
+
+    def test_failed_batch_is_redelivered(self):
+        self._order()
+        self.fail = True
+        self.assertEqual(dispatcher.dispatch(names={'test.orders'}), {'test.orders': 0})
+        checkpoint = OutboxCheckpoint.objects.get(handler='test.orders')
+        self.assertEqual((checkpoint.last_event_id, checkpoint.failures), (0, 1))
+
+        self.fail = False
+        dispatcher.dispatch(names={'test.orders'})
+        self.assertEqual(len(self.received), OutboxEvent.objects.filter(topic__startswith='order.').count())
+        self.assertEqual(OutboxCheckpoint.objects.get(handler='test.orders').failures, 0)
+
+    def test_late_committed_event_is_delivered(self):
+        """Событие с меньшим id, зафиксированное после сдвига позиции, не теряется"""
+        for _ in range(2):
+            self._order()
+        late = OutboxEvent.objects.filter(topic='order.created').last()
+        late_pk = late.pk
+        late.delete()  # транзакция с этим событием еще не зафиксирована
+        dispatcher.run(names={'test.orders'}, once=True)
+        checkpoint = OutboxCheckpoint.objects.get(handler='test.orders')
+        self.assertGreater(checkpoint.last_event_id, late_pk)
+        self.assertEqual([pk for pk, _ in checkpoint.gaps], [late_pk])
+        self.assertNotIn(late_pk, self.received)
+
+        OutboxEvent.objects.create(pk=late_pk, topic=late.topic, aggregate_id=late.aggregate_id, payload=late.payload)
+        dispatcher.run(names={'test.orders'}, once=True)
+        self.assertEqual(self.received.count(late_pk), 1)
+        self.assertEqual(OutboxCheckpoint.objects.get(handler='test.orders').gaps, [])
+
+    @override_settings(EVENTS_GAP_TIMEOUT=0)
+    def test_rolled_back_gap_is_forgotten(self):
+        self._order()
+        OutboxEvent.objects.filter(topic='order_item.created').delete()
+        self._order()
+        dispatcher.run(names={'test.orders'}, once=True)
+        self.assertEqual(OutboxCheckpoint.objects.get(handler='test.orders').gaps, [])
+
+    def test_purge_keeps_undelivered(self):
+        self._order()
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(dispatcher.purge(keep_days=7), 0)
+
+        total = OutboxEvent.objects.count()
+        dispatcher.run(once=True)
+        self.assertEqual(dispatcher.purge(keep_days=7), total)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(ANALYTICS_VIA_OUTBOX=True)
+    def test_leaderboards_refreshed_by_dispatcher(self):
+        self._order().transition_to('completed')
+        self.assertFalse(LeaderboardEntry.objects.filter(user=self.manager).exists())
+
+        dispatcher.run(names={'analytics.leaderboards'}, once=True)
+        self.assertTrue(LeaderboardEntry.objects.filter(user=self.manager).exists())
+
+    @override_settings(
+        ANALYTICS_VIA_OUTBOX=True,
+        CACHES={'metrics': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'outbox'}}
+    )
+    def test_rollups_and_metrics_refreshed_by_dispatcher(self):
+        orders = [self._order() for _ in range(2)]
+        key = metrics_cache.build_key('dashboard', 'manager', self.manager.pk, 'month')
+        orders[0].transition_to('completed')
+        transition_orders(Order.objects.filter(pk=orders[1].pk), 'completed')
+        today = rollups.local_date(timezone.now())
+        self.assertFalse(DailyRollup.objects.filter(date=today, completed_orders__gt=0).exists())
+        self.assertEqual(metrics_cache.build_key('dashboard', 'manager', self.manager.pk, 'month'), key)
+
+        dispatcher.run(names={'analytics.rollups', 'analytics.metrics_cache'}, once=True)
+        rollup = DailyRollup.objects.get(date=today)
+        self.assertEqual(rollup.completed_orders, 2)
+        self.assertEqual(rollup.revenue, Decimal('2000.00'))
+        self.assertNotEqual(metrics_cache.build_key('dashboard', 'manager', self.manager.pk, 'month'), key)
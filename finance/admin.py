@@ -3,8 +3,8 @@ from .models import Transaction, SalaryPayment
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ('type', 'amount', 'description', 'order', 'created_at')
-    list_filter = ('type', 'created_at')
+    list_display = ('type', 'kind', 'amount', 'description', 'order', 'created_at')
+    list_filter = ('type', 'kind', 'created_at')
     search_fields = ('description',)
     date_hierarchy = 'created_at'
 
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary_config', '0003_payroll_runs'),
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salarypayment',
+            name='payroll_run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='payments', to='salary_config.payrollrun', verbose_name='Ведомость'),
+        ),
+        migrations.AddConstraint(
+            model_name='salarypayment',
+            constraint=models.UniqueConstraint(condition=models.Q(('payroll_run__isnull', False)), fields=('user', 'period_start', 'period_end'), name='unique_payroll_salary_payment'),
+        ),
+    ]
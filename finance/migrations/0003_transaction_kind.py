@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+
+def fill_kind(apps, schema_editor):
+    """Вид существующих проводок по описанию; из повторов по заказу отмечается только первая"""
+    Transaction = apps.get_model('finance', 'Transaction')
+    seen = set()
+    updates = []
+    for transaction in Transaction.objects.order_by('id').only('id', 'type', 'description', 'order_id'):
+        if transaction.order_id is not None and transaction.type == 'income':
+            kind = 'order_income'
+        elif transaction.order_id is not None and 'Себестоимость' in transaction.description:
+            kind = 'order_cost'
+        elif transaction.order_id is None and transaction.description.startswith('Выплата зарплаты'):
+            kind = 'salary'
+        else:
+            continue
+        if kind != 'salary':
+            if (transaction.order_id, kind) in seen:
+                continue
+            seen.add((transaction.order_id, kind))
+        transaction.kind = kind
+        updates.append(transaction)
+    Transaction.objects.bulk_update(updates, ['kind'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_salary_payment_payroll_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='kind',
+            field=models.CharField(choices=[('other', 'Прочее'), ('order_income', 'Доход по заказу'), ('order_cost', 'Себестоимость заказа'), ('salary', 'Выплата зарплаты')], default='other', max_length=15, verbose_name='Вид'),
+        ),
+        migrations.RunPython(fill_kind, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind__in', ['order_income', 'order_cost'])), fields=('order', 'kind'), name='unique_order_transaction_kind'),
+        ),
+    ]
@@ -2,25 +2,54 @@ from django.db import models
 from django.db.models import Sum
 from user_accounts.models import User  # Исправлено с accounts.models
 from orders.models import Order
+from events.outbox import OutboxMixin
 
-class Transaction(models.Model):
+class Transaction(OutboxMixin, models.Model):
     TYPE_CHOICES = (
         ('income', 'Доход'),
         ('expense', 'Расход'),
     )
+    KIND_CHOICES = (
+        ('other', 'Прочее'),
+        ('order_income', 'Доход по заказу'),
+        ('order_cost', 'Себестоимость заказа'),
+        ('salary', 'Выплата зарплаты'),
+    )
+    # Проводки по заказу, которые создаются автоматически, - не больше одной каждого вида
+    ORDER_KINDS = ('order_income', 'order_cost')
     
     type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name="Тип")
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES, default='other', verbose_name="Вид")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Сумма")
     description = models.TextField(verbose_name="Описание")
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Связанный заказ")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     
+    outbox_topic = 'transaction'
+    
     def __str__(self):
         return f"{self.get_type_display()} - {self.amount}"
     
+    def outbox_payload(self):
+        return {
+            'type': self.type,
+            'kind': self.kind,
+            'amount': self.amount,
+            'order_id': self.order_id,
+            'created_at': self.created_at,
+        }
+    
     class Meta:
         verbose_name = "Транзакция"
         verbose_name_plural = "Транзакции"
+        constraints = [
+            # Повторное завершение заказа не создает вторую проводку того же вида
+            models.UniqueConstraint(
+                fields=['order', 'kind'],
+                condition=models.Q(kind__in=['order_income', 'order_cost']),
+                name='unique_order_transaction_kind'
+            ),
+        ]
         
     @classmethod
     def get_company_balance(cls):
@@ -33,6 +62,14 @@ class SalaryPayment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Сумма")
     period_start = models.DateField(verbose_name="Начало периода")
     period_end = models.DateField(verbose_name="Конец периода")
+    payroll_run = models.ForeignKey(
+        'salary_config.PayrollRun',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='payments',
+        verbose_name="Ведомость"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     
     def __str__(self):
@@ -40,4 +77,12 @@ class SalaryPayment(models.Model):
     
     class Meta:
         verbose_name = "Выплата зарплаты"
-        verbose_name_plural = "Выплаты зарплат"
\ No newline at end of file
+        verbose_name_plural = "Выплаты зарплат"
+        constraints = [
+            # Выплата по ведомости - одна на сотрудника за период (повтор не платит дважды)
+            models.UniqueConstraint(
+                fields=['user', 'period_start', 'period_end'],
+                condition=models.Q(payroll_run__isnull=False),
+                name='unique_payroll_salary_payment'
+            ),
+        ]
\ No newline at end of file
@@ -10,6 +10,8 @@ from user_accounts.models import User  # Исправлено с accounts.models
 from .models import Transaction, SalaryPayment
 from .forms import TransactionForm, SalaryPaymentForm
 from .utils import calculate_installer_salary, calculate_manager_salary, calculate_owner_salary
+from analytics.timeseries import get_series
+from salary_config import payroll
 
 @login_required
 def finance_dashboard(request):
@@ -113,11 +115,16 @@ def salary_calculation(request):
         start_date = datetime(today.year, today.month, 1)
         end_date = today
     
+    # Закрытый период отдается из утвержденной ведомости без пересчета
+    snapshot = payroll.get_snapshot_results(start_date.date(), end_date.date())
+    
     # Список с расчетами зарплат
     salary_calculations = []
     
     for user in users:
-        if user.role == 'installer':
+        if snapshot is not None and user.id in snapshot:
+            calculation = snapshot[user.id]
+        elif user.role == 'installer':
             calculation = calculate_installer_salary(user, start_date, end_date)
         elif user.role == 'manager':
             calculation = calculate_manager_salary(user, start_date, end_date)
@@ -134,6 +141,7 @@ def salary_calculation(request):
         'salary_calculations': salary_calculations,
         'start_date': start_date,
         'end_date': end_date,
+        'from_payroll_run': snapshot is not None,
     }
     
     return render(request, 'finance/salary_calculation.html', context)
@@ -158,6 +166,7 @@ def create_salary_payment(request, user_id):
             # Создаем соответствующую транзакцию расхода
             Transaction.objects.create(
                 type='expense',
+                kind='salary',
                 amount=payment.amount,
                 description=f'Выплата зарплаты {user.get_full_name()} за период {payment.period_start} - {payment.period_end}',
                 order=None
@@ -216,41 +225,22 @@ def finance_stats_api(request):
     if request.user.role != 'owner':
         return JsonResponse({'error': 'Недостаточно прав'}, status=403)
     
-    days = int(request.GET.get('days', 30))
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=days)
-    
-    # Статистика по дням
-    daily_stats = Transaction.objects.filter(
-        created_at__gte=start_date,
-        created_at__lte=end_date
-    ).annotate(
-        date=TruncDate('created_at')
-    ).values('date', 'type').annotate(
-        total=Sum('amount')
-    ).order_by('date')
-    
-    # Группируем по дням
-    days_data = {}
-    for stat in daily_stats:
-        date_str = stat['date'].strftime('%Y-%m-%d')
-        if date_str not in days_data:
-            days_data[date_str] = {'income': 0, 'expense': 0}
-        days_data[date_str][stat['type']] = float(stat['total'])
-    
-    # Формируем итоговый список
+    try:
+        days = max(1, min(int(request.GET.get('days', 30)), 366))
+    except ValueError:
+        return JsonResponse({'error': 'Неверное количество дней'}, status=400)
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=days - 1)
+    
+    # Статистика по дням из дневных сводок (дни без операций - нули)
     daily_result = []
-    current_date = start_date.date()
-    while current_date <= end_date.date():
-        date_str = current_date.strftime('%Y-%m-%d')
-        data = days_data.get(date_str, {'income': 0, 'expense': 0})
+    for point in get_series(['income', 'expense'], 'day', start_date, end_date):
         daily_result.append({
-            'date': date_str,
-            'income': data['income'],
-            'expense': data['expense'],
-            'profit': data['income'] - data['expense']
+            'date': point['period'].strftime('%Y-%m-%d'),
+            'income': point['income'],
+            'expense': point['expense'],
+            'profit': point['income'] - point['expense']
         })
-        current_date += timedelta(days=1)
     
     return JsonResponse({
         'success': True,
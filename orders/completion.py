@@ -0,0 +1,95 @@
+# orders/completion.py
+"""
+Проводки по завершению заказов.
+
+При завершении заказа создаются доход (стоимость позиций) и расход
+на себестоимость. Повторов не допускает уникальное ограничение
+(заказ, вид проводки), поэтому перед вставкой ничего не проверяется.
+
+transition_orders() переводит пачку заказов в статус в одной транзакции:
+статус меняется одним UPDATE, выручка и себестоимость всех завершаемых
+заказов считаются одним агрегирующим запросом, проводки вставляются одним
+bulk_create. Сигналы post_save при этом не вызываются - производные данные
+обновляют обработчики сигнала orders_transitioned, а события transaction.created
+для действительно вставленных проводок пишутся в outbox в той же транзакции.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.dispatch import Signal
+
+from events import outbox
+from finance.models import Transaction
+from .models import Order, item_cost, money
+
+COMPLETION_KINDS = ('order_income', 'order_cost')
+
+# Массовый переход статуса: transitions - {id заказа: прежний статус}, status - новый статус
+orders_transitioned = Signal()
+
+
+def completion_transactions(order_id, client_name, revenue, cost):
+    """Несохраненные проводки завершенного заказа (нулевые суммы не проводятся)"""
+    entries = []
+    if revenue > 0:
+        entries.append(Transaction(
+            type='income',
+            kind='order_income',
+            amount=revenue,
+            description=f'Доход от завершения заказа #{order_id} - {client_name}',
+            order_id=order_id
+        ))
+    if cost > 0:
+        entries.append(Transaction(
+            type='expense',
+            kind='order_cost',
+            amount=cost,
+            description=f'Себестоимость заказа #{order_id} - {client_name}',
+            order_id=order_id
+        ))
+    return entries
+
+
+def create_once(entry):
+    """Сохраняет проводку, если такой же по заказу и виду еще нет"""
+    try:
+        with transaction.atomic():
+            entry.save()
+    except IntegrityError:
+        return False
+    return True
+
+
+def order_totals(order_ids):
+    """{id заказа: (имя клиента, выручка, себестоимость)} одним запросом"""
+    rows = Order.objects.filter(pk__in=order_ids).values('id', 'client__name').annotate(
+        revenue=Sum('items__price'),
+        cost=Sum(item_cost('items__'))
+    )
+    return {
+        row['id']: (row['client__name'], money(row['revenue']), money(row['cost']))
+        for row in rows
+    }
+
+
+def transition_orders(orders, status):
+    """
+    Переход заказов queryset orders в статус одной транзакцией.
+    Возвращает {id заказа: прежний статус} для заказов, статус которых изменился.
+    """
+    with transaction.atomic():
+        transitions = orders.transition_to(status)
+        if not transitions:
+            return transitions
+        if status == 'completed':
+            # С ignore_conflicts pk вставленных строк не возвращаются: новые проводки
+            # находим как проводки по завершению, которых не было до вставки
+            entries = Transaction.objects.filter(order_id__in=list(transitions), kind__in=COMPLETION_KINDS)
+            existing = list(entries.values_list('pk', flat=True))
+            Transaction.objects.bulk_create([
+                entry
+                for order_id, (client_name, revenue, cost) in order_totals(list(transitions)).items()
+                for entry in completion_transactions(order_id, client_name, revenue, cost)
+            ], ignore_conflicts=True)
+            outbox.record_created(entries.exclude(pk__in=existing))
+        orders_transitioned.send(sender=Order, transitions=transitions, status=status)
+    return transitions
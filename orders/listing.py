@@ -0,0 +1,132 @@
+# orders/listing.py
+"""
+Список заказов для HTML-страницы.
+
+Фильтры (статус, менеджер, период, поиск) и сортировка применяются в БД,
+страница читается через with_details() - число запросов не зависит
+от числа заказов на странице. Счетчики по статусам считаются одним
+агрегирующим запросом. Строки таблицы кэшируются фрагментами по версии
+строки: версия меняется вместе с любым выводимым в строке значением.
+"""
+from datetime import timedelta
+
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from customer_clients.search import filter_clients
+from reference import lookups
+from .models import Order
+
+PAGE_SIZE = 20
+ROW_CACHE_TIMEOUT = 600
+
+SORT_OPTIONS = ('-created_at', 'created_at', '-total_cost', 'total_cost', 'status')
+DEFAULT_SORT = '-created_at'
+PERIODS = ('today', 'week', 'month')
+
+
+def orders_for(user):
+    """Заказы, доступные пользователю по роли"""
+    if user.role == 'owner':
+        return Order.objects.all()
+    if user.role == 'manager':
+        return Order.objects.filter(manager=user)
+    return Order.objects.filter(installers=user)
+
+
+def period_start(period):
+    """Начало периода today/week/month (None - без ограничения)"""
+    now = timezone.localtime()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'today':
+        return today
+    if period == 'week':
+        return now - timedelta(days=7)
+    if period == 'month':
+        return today.replace(day=1)
+    return None
+
+
+def clean_filters(params, user):
+    """Значения фильтров из GET-параметров; неизвестные значения отбрасываются"""
+    filters = {
+        'search': params.get('search', '').strip(),
+        'status': params.get('status', ''),
+        'manager': '',
+        'period': params.get('period', ''),
+        'sort': params.get('sort', DEFAULT_SORT),
+    }
+    if filters['status'] not in lookups.choice_map(Order, 'status'):
+        filters['status'] = ''
+    if user.role == 'owner' and params.get('manager', '').isdigit():
+        filters['manager'] = params['manager']
+    if filters['period'] not in PERIODS:
+        filters['period'] = ''
+    if filters['sort'] not in SORT_OPTIONS:
+        filters['sort'] = DEFAULT_SORT
+    return filters
+
+
+def filter_orders(queryset, filters):
+    """Фильтры clean_filters() без сортировки"""
+    search = filters['search']
+    if search:
+        matched = filter_clients(queryset, search, prefix='client__')
+        number = search.lstrip('#')
+        if number.isdigit():
+            matched = matched | queryset.filter(pk=int(number))
+        queryset = matched
+    if filters['status']:
+        queryset = queryset.filter(status=filters['status'])
+    if filters['manager']:
+        queryset = queryset.filter(manager_id=filters['manager'])
+    start = period_start(filters['period'])
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    return queryset
+
+
+def status_totals(queryset):
+    """Всего заказов и по каждому статусу одним запросом"""
+    aggregates = {'total': Count('id')}
+    for status, _ in Order.STATUS_CHOICES:
+        aggregates[status] = Count('id', filter=Q(status=status))
+    return queryset.aggregate(**aggregates)
+
+
+def row_version(order):
+    """Версия строки списка: все выводимые в строке значения заказа и связанных объектов"""
+    return '|'.join(str(value) for value in (
+        order.status,
+        order.total_cost,
+        order.completed_at,
+        order.items_count,
+        order.items_profit,
+        order.client.name,
+        order.client.phone,
+        order.manager.get_full_name(),
+        ','.join(f'{installer.pk}:{installer.get_full_name()}' for installer in order.installers.all()),
+    ))
+
+
+def kanban_columns(orders):
+    """Заказы страницы по колонкам канбана: [(статус, название, [заказы])]"""
+    return [
+        (status, label, [order for order in orders if order.status == status])
+        for status, label in Order.STATUS_CHOICES
+    ]
+
+
+def order_page(user, params):
+    """
+    Страница списка: (страница Paginator, фильтры, счетчики по статусам).
+    Счетчики считаются по всем доступным заказам, без учета фильтров.
+    """
+    filters = clean_filters(params, user)
+    scope = orders_for(user)
+    queryset = filter_orders(scope, filters).order_by(filters['sort'], '-pk').with_details()
+    page = Paginator(queryset, PAGE_SIZE).get_page(params.get('page'))
+    for order in page.object_list:
+        order.row_version = row_version(order)
+    return page, filters, status_totals(scope)
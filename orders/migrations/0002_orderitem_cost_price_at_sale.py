@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:29
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_cost_prices(apps, schema_editor):
+    """Существующим позициям проставляем текущую себестоимость услуги"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Service = apps.get_model('services', 'Service')
+    OrderItem.objects.filter(cost_price_at_sale__isnull=True).update(
+        cost_price_at_sale=Subquery(
+            Service.objects.filter(pk=OuterRef('service_id')).values('cost_price')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='cost_price_at_sale',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Фиксируется при создании позиции, чтобы изменение цены услуги не меняло историю', max_digits=10, null=True, verbose_name='Себестоимость на момент продажи'),
+        ),
+        migrations.RunPython(snapshot_cost_prices, migrations.RunPython.noop),
+    ]
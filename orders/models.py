@@ -1,11 +1,47 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from user_accounts.models import User  # Исправлено с accounts.models
 from customer_clients.models import Client  # Исправлено с clients.models
 from services.models import Service
+from events.outbox import OutboxMixin
 
-class Order(models.Model):
+class OrderQuerySet(models.QuerySet):
+    def with_details(self):
+        """
+        Заказы для чтения списком: клиент и менеджер - JOIN'ом, монтажники и позиции
+        (с услугой и продавцом) - по одному запросу на страницу, число позиций
+        и прибыль - аннотациями. Фильтры по монтажникам применять до вызова.
+        """
+        return self.select_related('client', 'manager').prefetch_related(
+            'installers',
+            models.Prefetch('items', queryset=OrderItem.objects.select_related('service', 'seller')),
+        ).annotate(
+            items_count=Count('items', distinct=True),
+            items_profit=Sum(item_profit('items__')),
+        )
+    
+    def transition_to(self, status):
+        """
+        Массовый переход заказов в статус одним UPDATE (без сигналов post_save).
+        Заказам, которые только сейчас завершаются, проставляется дата завершения.
+        Возвращает {id заказа: прежний статус} для заказов, статус которых изменился.
+        """
+        Order.check_status(status)
+        changed = self.exclude(status=status)
+        transitions = dict(changed.values_list('id', 'status'))
+        if transitions:
+            updates = {'status': status}
+            if status == 'completed':
+                updates['completed_at'] = timezone.now()
+            Order.objects.filter(pk__in=list(transitions)).update(**updates)
+        return transitions
+
+class Order(OutboxMixin, models.Model):
     STATUS_CHOICES = (
         ('new', 'Новый'),
         ('in_progress', 'В работе'),
@@ -20,31 +56,166 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата завершения")
     
+    objects = OrderQuerySet.as_manager()
+    outbox_topic = 'order'
+    
+    # Статус, записанный в БД: фиксируется при загрузке и при каждом сохранении статуса,
+    # чтобы сигналы видели переход без повторного SELECT (None - заказ еще не сохранен)
+    _loaded_status = None
+    # Дата завершения и сумма, записанные в БД (аналогично статусу) - аналитика
+    # пересчитывает по ним прежний день сводок и пропускает пересчет рейтингов
+    _loaded_completed_at = None
+    _loaded_total_cost = None
+    
     def __str__(self):
         return f"Заказ #{self.id} - {self.client.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status', models.DEFERRED)
+        instance._loaded_completed_at = instance.__dict__.get('completed_at', models.DEFERRED)
+        instance._loaded_total_cost = instance.__dict__.get('total_cost', models.DEFERRED)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Вложенное сохранение из обработчиков post_save не должно подменять
+        # переход статуса, который видят остальные обработчики внешнего сохранения
+        nested = self.__dict__.get('_saving', False)
+        outer_status = self.__dict__.get('_old_status')
+        self._saving = True
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self._saving = nested
+            if nested:
+                self._old_status = outer_status
+    
+    def outbox_payload(self):
+        return {
+            'status': self.status,
+            'previous_status': self.__dict__.get('_old_status'),
+            'client_id': self.client_id,
+            'manager_id': self.manager_id,
+            'total_cost': self.total_cost,
+            'completed_at': self.completed_at,
+            'previous_completed_at': self.__dict__.get('_old_completed_at'),
+        }
+    
+    @classmethod
+    def check_status(cls, status):
+        if status not in dict(cls.STATUS_CHOICES):
+            raise ValueError(f'Некорректный статус заказа: {status}')
+    
+    def transition_to(self, status, save=True):
+        """
+        Переход заказа в статус. При завершении проставляется дата завершения;
+        сохраняются только статус и дата, побочные действия выполняют сигналы.
+        """
+        self.check_status(status)
+        if status == 'completed' and (self.status != 'completed' or not self.completed_at):
+            self.completed_at = timezone.now()
+        self.status = status
+        if save:
+            self.save(update_fields=['status', 'completed_at'])
+        return self
+    
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
 
-class OrderItem(models.Model):
+class OrderItem(OutboxMixin, models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items", verbose_name="Заказ")
     service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Услуга")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     seller = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Продавец")
+    cost_price_at_sale = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True,
+        verbose_name="Себестоимость на момент продажи",
+        help_text="Фиксируется при создании позиции, чтобы изменение цены услуги не меняло историю"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     
+    outbox_topic = 'order_item'
+    
     def __str__(self):
         return f"{self.service.name} - {self.price}"
     
+    def outbox_payload(self):
+        return {
+            'order_id': self.order_id,
+            'service_id': self.service_id,
+            'seller_id': self.seller_id,
+            'price': self.price,
+        }
+    
+    def save(self, *args, **kwargs):
+        if self.cost_price_at_sale is None and self.service_id:
+            self.cost_price_at_sale = self.service.cost_price
+        super().save(*args, **kwargs)
+    
+    @property
+    def unit_cost(self):
+        """Себестоимость позиции (снимок, для старых записей - текущая)"""
+        if self.cost_price_at_sale is not None:
+            return self.cost_price_at_sale
+        return self.service.cost_price
+    
+    @property
+    def profit(self):
+        return self.price - self.unit_cost
+    
     class Meta:
         verbose_name = "Позиция заказа"
         verbose_name_plural = "Позиции заказа"
 
+def item_cost(prefix=''):
+    """
+    Выражение себестоимости позиции для запросов.
+    prefix - путь к позиции от модели запроса, например 'items__'.
+    """
+    return Coalesce(
+        F(f'{prefix}cost_price_at_sale'),
+        F(f'{prefix}service__cost_price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+def item_profit(prefix=''):
+    """Выражение прибыли позиции: цена продажи минус себестоимость"""
+    return ExpressionWrapper(
+        F(f'{prefix}price') - item_cost(prefix),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+def money(value):
+    """
+    Денежный агрегат из БД с точностью до копейки: SQLite суммирует
+    десятичные значения во float, и в хвосте остается погрешность
+    """
+    return (value or Decimal('0.00')).quantize(Decimal('0.01'))
+
+def profit_by_category(items, categories):
+    """
+    Число позиций и прибыль по категориям услуг одним агрегирующим запросом:
+    {категория: (позиций, прибыль)}. Прибыль суммируется в БД до копеек,
+    а проценты к суммам применяются уже в Decimal - так результат совпадает
+    с поштучным расчетом (SQLite считает десятичные выражения во float).
+    """
+    aggregates = {}
+    for index, category in enumerate(categories):
+        in_category = Q(service__category=category)
+        aggregates[f'count_{index}'] = Count('id', filter=in_category)
+        aggregates[f'profit_{index}'] = Sum(item_profit(), filter=in_category)
+    row = items.aggregate(**aggregates)
+    return {
+        category: (row[f'count_{index}'], money(row[f'profit_{index}']))
+        for index, category in enumerate(categories)
+    }
+
 @receiver(post_save, sender=OrderItem)
 def update_order_total(sender, instance, **kwargs):
     order = instance.order
     total = sum(item.price for item in order.items.all())
     order.total_cost = total
-    order.save()
+    order.save(update_fields=['total_cost'])
 
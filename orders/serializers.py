@@ -37,5 +37,6 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order', 'service', 'price', 'seller', 'created_at',
             'service_name', 'service_category', 'service_category_display',
-            'service_cost_price', 'seller_name'
-        ]
\ No newline at end of file
+            'service_cost_price', 'cost_price_at_sale', 'seller_name'
+        ]
+        read_only_fields = ['cost_price_at_sale']
\ No newline at end of file
@@ -1,80 +1,53 @@
 # orders/signals.py
+from django.db.models import DEFERRED, Sum
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Order
-from finance.models import Transaction
+from .models import Order, item_cost, money
+from .completion import completion_transactions, create_once
 
 @receiver(pre_save, sender=Order)
-def track_order_status_change(sender, instance, **kwargs):
-    """Отслеживаем изменение статуса заказа"""
-    if instance.pk:  # Если заказ уже существует
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            instance._old_status = old_instance.status
-        except Order.DoesNotExist:
-            instance._old_status = None
-    else:
-        instance._old_status = None
+def track_order_status_change(sender, instance, update_fields=None, **kwargs):
+    """Отслеживаем изменение статуса заказа по статусу, загруженному из БД"""
+    if update_fields is not None and 'status' not in update_fields:
+        # Статус не сохраняется - перехода нет
+        instance._old_status = instance.__dict__.get('status')
+        return
+    old_status = instance._loaded_status
+    if old_status is DEFERRED:
+        # Заказ загружен без статуса (only/defer) - берем из БД
+        old_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    instance._old_status = old_status
+    instance._loaded_status = instance.status
+
+def _completed_now(instance, created):
+    """Заказ только что перешел в статус 'completed'"""
+    return (
+        not created and
+        getattr(instance, '_old_status', None) != 'completed' and
+        instance.status == 'completed'
+    )
 
 @receiver(post_save, sender=Order)
 def create_transaction_on_completion(sender, instance, created, **kwargs):
-    """Создаем транзакцию при завершении заказа"""
-    if not created:  # Только для обновленных заказов
-        old_status = getattr(instance, '_old_status', None)
-        
-        # Если статус изменился на 'completed' и заказ имеет позиции
-        if (old_status != 'completed' and 
-            instance.status == 'completed' and 
-            instance.total_cost > 0):
-            
-            # Проверяем, что транзакция еще не создана для этого заказа
-            existing_transaction = Transaction.objects.filter(
-                order=instance,
-                type='income'
-            ).first()
-            
-            if not existing_transaction:
-                # Создаем доходную транзакцию
-                Transaction.objects.create(
-                    type='income',
-                    amount=instance.total_cost,
-                    description=f'Доход от завершения заказа #{instance.id} - {instance.client.name}',
-                    order=instance
-                )
-                
-                # Обновляем дату завершения, если она не была установлена
-                if not instance.completed_at:
-                    instance.completed_at = timezone.now()
-                    instance.save(update_fields=['completed_at'])
+    """Создаем доходную транзакцию при завершении заказа"""
+    if not _completed_now(instance, created) or instance.total_cost <= 0:
+        return
+    
+    # Повтор исключает уникальное ограничение (заказ, вид проводки)
+    income = completion_transactions(instance.id, instance.client.name, instance.total_cost, 0)
+    if create_once(income[0]) and not instance.completed_at:
+        # Обновляем дату завершения, если она не была установлена
+        instance.completed_at = timezone.now()
+        instance.save(update_fields=['completed_at'])
 
 @receiver(post_save, sender=Order)
 def create_expense_transactions_on_completion(sender, instance, created, **kwargs):
-    """Создаем расходные транзакции при завершении заказа"""
-    if not created:  # Только для обновленных заказов
-        old_status = getattr(instance, '_old_status', None)
-        
-        # Если статус изменился на 'completed'
-        if old_status != 'completed' and instance.status == 'completed':
-            
-            # Проверяем, что расходные транзакции еще не созданы
-            existing_expenses = Transaction.objects.filter(
-                order=instance,
-                type='expense',
-                description__contains='Себестоимость'
-            ).exists()
-            
-            if not existing_expenses and instance.items.exists():
-                # Рассчитываем общую себестоимость
-                total_cost_price = sum(
-                    item.service.cost_price for item in instance.items.all()
-                )
-                
-                if total_cost_price > 0:
-                    # Создаем расходную транзакцию на себестоимость
-                    Transaction.objects.create(
-                        type='expense',
-                        amount=total_cost_price,
-                        description=f'Себестоимость заказа #{instance.id} - {instance.client.name}',
-                        order=instance
-                    )
\ No newline at end of file
+    """Создаем расходную транзакцию на себестоимость при завершении заказа"""
+    if not _completed_now(instance, created):
+        return
+    
+    # Себестоимость всех позиций одним запросом
+    cost = money(instance.items.aggregate(cost=Sum(item_cost()))['cost'])
+    for entry in completion_transactions(instance.id, instance.client.name, 0, cost):
+        create_once(entry)
@@ -3,14 +3,19 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
+from datetime import timedelta
 from decimal import Decimal
 from .models import Order, OrderItem
+from .completion import transition_orders
 from .forms import OrderForm, OrderItemForm
 from customer_clients.models import Client as CustomerClient
 from services.models import Service
 from finance.models import Transaction
+from events.models import OutboxEvent
 
 User = get_user_model()
 
@@ -192,6 +197,23 @@ class OrderItemModelTests(TestCase):
         self.order.refresh_from_db()
         self.assertEqual(self.order.total_cost, Decimal('3500.00'))
 
+    def test_cost_price_snapshot(self):
+        """Себестоимость фиксируется при продаже и не меняется вместе с услугой"""
+        item = OrderItem.objects.create(
+            order=self.order,
+            service=self.service,
+            price=Decimal('2500.00'),
+            seller=self.manager
+        )
+        self.assertEqual(item.cost_price_at_sale, Decimal('1000.00'))
+        
+        self.service.cost_price = Decimal('1800.00')
+        self.service.save()
+        
+        item = OrderItem.objects.get(pk=item.pk)
+        self.assertEqual(item.unit_cost, Decimal('1000.00'))
+        self.assertEqual(item.profit, Decimal('1500.00'))
+
 
 class OrderViewsTests(TestCase):
     """Тесты представлений заказов"""
@@ -275,7 +297,67 @@ class OrderViewsTests(TestCase):
         self.assertContains(response, f'Заказ #{self.order.id}')
         self.assertFalse(response.context['can_edit'])
         self.assertFalse(response.context['can_create'])
-    
+
+    def test_order_list_filters_and_pagination(self):
+        """Фильтры, сортировка и постраничный вывод списка заказов"""
+        other_manager = User.objects.create_user(username='manager2', password='testpass123', role='manager')
+        for _ in range(21):
+            Order.objects.create(client=self.customer, manager=self.manager, status='in_progress')
+        other = Order.objects.create(client=self.customer, manager=other_manager)
+        self.client.login(username='owner', password='testpass123')
+
+        response = self.client.get(reverse('order_list'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 23)
+        self.assertEqual(len(response.context['orders']), 20)
+        self.assertEqual(response.context['totals'], {'total': 23, 'new': 2, 'in_progress': 21, 'completed': 0})
+
+        response = self.client.get(reverse('order_list'), {'status': 'in_progress', 'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.count, 21)
+        self.assertEqual(len(response.context['orders']), 1)
+
+        response = self.client.get(reverse('order_list'), {'manager': other_manager.pk, 'sort': 'unknown'})
+        self.assertEqual([order.pk for order in response.context['orders']], [other.pk])
+        self.assertEqual(response.context['filters']['sort'], '-created_at')
+
+        response = self.client.get(reverse('order_list'), {'search': f'#{other.pk}'})
+        self.assertIn(other.pk, [order.pk for order in response.context['orders']])
+
+        # Менеджер не фильтрует по чужим заказам
+        self.client.login(username='manager', password='testpass123')
+        response = self.client.get(reverse('order_list'), {'manager': other_manager.pk})
+        self.assertEqual(response.context['page_obj'].paginator.count, 22)
+
+    def test_order_list_partial_response(self):
+        """Обновление списка со страницы возвращает фрагмент и счетчики"""
+        self.client.login(username='owner', password='testpass123')
+        response = self.client.get(reverse('order_list'), {'partial': 1})
+
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['totals']['new'], 1)
+        self.assertIn(f'data-order-id="{self.order.id}"', data['html'])
+
+    def test_order_list_query_count_is_fixed(self):
+        """Страница списка читается фиксированным числом запросов"""
+        self.client.login(username='owner', password='testpass123')
+
+        def create_orders(count):
+            for _ in range(count):
+                order = Order.objects.create(client=self.customer, manager=self.manager)
+                order.installers.add(self.installer)
+                OrderItem.objects.create(order=order, service=self.service, price=Decimal('3000.00'), seller=self.manager)
+
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('order_list'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        create_orders(2)
+        few = list_queries()
+        create_orders(6)
+        self.assertEqual(few, list_queries())
+
     def test_order_detail_view(self):
         """Тест детального просмотра заказа"""
         self.client.login(username='manager', password='testpass123')
@@ -493,6 +575,116 @@ class OrderSignalsTests(TestCase):
         # Количество транзакций не должно увеличиться
         final_transactions_count = Transaction.objects.filter(order=self.order).count()
         self.assertEqual(initial_transactions_count, final_transactions_count)
+    
+    def test_status_tracked_without_reloading_order(self):
+        """Прежний статус берется из загруженного заказа, без повторного SELECT"""
+        order = Order.objects.get(pk=self.order.pk)
+        with CaptureQueriesContext(connection) as queries:
+            order.transition_to('in_progress')
+            order.total_cost = Decimal('10.00')
+            order.save(update_fields=['total_cost'])
+        reloads = [query['sql'] for query in queries if query['sql'].startswith('SELECT "orders_order"."id"')]
+        self.assertEqual(reloads, [])
+        self.assertEqual(order._loaded_status, 'in_progress')
+    
+    def test_transition_to_completed_sets_date_and_transactions(self):
+        """Завершение без даты: дата проставляется, создаются доход и себестоимость"""
+        OrderItem.objects.create(
+            order=self.order,
+            service=self.service,
+            price=Decimal('2500.00'),
+            seller=self.manager
+        )
+        self.order.transition_to('completed')
+        
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.completed_at)
+        self.assertEqual(
+            sorted(Transaction.objects.filter(order=self.order).values_list('type', flat=True)),
+            ['expense', 'income']
+        )
+        with self.assertRaises(ValueError):
+            self.order.transition_to('cancelled')
+    
+    def test_bulk_transition(self):
+        """Массовый переход меняет только заказы в другом статусе"""
+        other = Order.objects.create(client=self.customer, manager=self.manager, status='completed')
+        orders = Order.objects.filter(pk__in=[self.order.pk, other.pk])
+        
+        self.assertEqual(orders.transition_to('completed'), {self.order.pk: 'new'})
+        self.assertEqual(orders.transition_to('completed'), {})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'completed')
+        self.assertIsNotNone(self.order.completed_at)
+
+
+class OrderBulkCompletionTests(APITestCase):
+    """Тесты массового завершения заказов"""
+    
+    def setUp(self):
+        self.manager = User.objects.create_user(username='bulk_manager', password='testpass123', role='manager')
+        self.customer = CustomerClient.objects.create(
+            name='Пакетный Клиент', address='ул. Пакетная, 1', phone='+79001110000', source='website'
+        )
+        self.service = Service.objects.create(
+            name='Пакетная услуга', cost_price=Decimal('400.00'), selling_price=Decimal('1000.00'), category='installation'
+        )
+        self.orders = []
+        for _ in range(5):
+            order = Order.objects.create(client=self.customer, manager=self.manager)
+            for _ in range(2):
+                OrderItem.objects.create(order=order, service=self.service, price=Decimal('1000.00'), seller=self.manager)
+            self.orders.append(order)
+    
+    def test_bulk_completion_creates_transactions_once(self):
+        queryset = Order.objects.filter(pk__in=[order.pk for order in self.orders])
+        with CaptureQueriesContext(connection) as queries:
+            transitions = transition_orders(queryset, 'completed')
+        self.assertEqual(len(transitions), 5)
+        # Число запросов не зависит от числа заказов
+        self.assertLess(len(queries), 30)
+        
+        income = Transaction.objects.filter(kind='order_income')
+        self.assertEqual(income.count(), 5)
+        self.assertEqual({entry.amount for entry in income}, {Decimal('2000.00')})
+        self.assertEqual(
+            {entry.amount for entry in Transaction.objects.filter(kind='order_cost')}, {Decimal('800.00')}
+        )
+        
+        # Повторное завершение после переоткрытия не дублирует проводки
+        transition_orders(queryset, 'in_progress')
+        transition_orders(queryset, 'completed')
+        self.orders[0].refresh_from_db()
+        self.orders[0].transition_to('in_progress')
+        self.orders[0].transition_to('completed')
+        self.assertEqual(Transaction.objects.filter(order__in=self.orders).count(), 10)
+    
+    def test_bulk_completion_records_transaction_events(self):
+        """Проводки из bulk_create попадают в outbox один раз"""
+        queryset = Order.objects.filter(pk__in=[order.pk for order in self.orders])
+        transition_orders(queryset, 'completed')
+        events = OutboxEvent.objects.filter(topic='transaction.created')
+        self.assertEqual(
+            set(events.values_list('aggregate_id', flat=True)),
+            set(Transaction.objects.values_list('pk', flat=True))
+        )
+        self.assertEqual(events.count(), 10)
+        
+        transition_orders(queryset, 'in_progress')
+        transition_orders(queryset, 'completed')
+        self.assertEqual(events.count(), 10)
+    
+    def test_bulk_status_endpoint(self):
+        self.client.force_authenticate(user=self.manager)
+        ids = [order.pk for order in self.orders[:3]]
+        response = self.client.post('/api/orders/bulk-status/', {'order_ids': ids, 'status': 'completed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['changed'], ids)
+        self.assertEqual(Order.objects.filter(status='completed').count(), 3)
+        
+        response = self.client.post('/api/orders/bulk-status/', {'order_ids': ids + [999999], 'status': 'new'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Order.objects.filter(status='completed').count(), 3)
 
 
 class OrderAPITests(APITestCase):
@@ -536,6 +728,72 @@ class OrderAPITests(APITestCase):
             manager=self.manager
         )
     
+    def test_order_list_query_count_is_fixed(self):
+        """Список заказов читается фиксированным числом запросов"""
+        self.client.force_authenticate(user=self.owner)
+        
+        def create_orders(count):
+            for _ in range(count):
+                order = Order.objects.create(client=self.customer, manager=self.manager)
+                order.installers.add(self.installer)
+                OrderItem.objects.create(order=order, service=self.service, price=Decimal('3000.00'), seller=self.manager)
+        
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/orders/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response, len(queries)
+        
+        create_orders(2)
+        _, few = list_queries()
+        create_orders(6)
+        response, many = list_queries()
+        self.assertEqual(few, many)
+        
+        order = max(response.data['results'], key=lambda item: item['id'])
+        self.assertEqual(order['items_count'], 1)
+        self.assertEqual(order['total_profit'], float(Decimal('3000.00') - self.service.cost_price))
+        self.assertEqual(order['installers_names'][0]['id'], self.installer.id)
+    
+    def test_order_view_endpoint_query_count_is_fixed(self):
+        """Карточка заказа одним запросом к API за фиксированное число запросов к БД"""
+        from calendar_app.models import InstallationSchedule
+
+        self.client.force_login(self.owner)
+        schedule = InstallationSchedule.objects.create(
+            order=self.order,
+            scheduled_date=timezone.localdate(),
+            scheduled_time_start='09:00',
+            scheduled_time_end='12:00',
+            estimated_duration=timedelta(hours=3)
+        )
+        schedule.installers.add(self.installer)
+        self.order.installers.add(self.installer)
+        url = f'/api/modal/order/{self.order.id}/view/'
+
+        def view_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response, len(queries)
+
+        OrderItem.objects.create(order=self.order, service=self.service, price=Decimal('2000.00'), seller=self.manager)
+        _, few = view_queries()
+        for _ in range(4):
+            OrderItem.objects.create(order=self.order, service=self.service, price=Decimal('2000.00'), seller=self.installer)
+        response, many = view_queries()
+        self.assertEqual(few, many)
+
+        self.assertEqual(len(response.data['order']['items']), 5)
+        self.assertEqual(response.data['schedule']['installers'], [self.installer.id])
+        self.assertEqual(response.data['installers'][0]['id'], self.installer.id)
+
+        # Монтажник видит только свои заказы
+        other = Order.objects.create(client=self.customer, manager=self.manager)
+        self.client.force_login(self.installer)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(f'/api/modal/order/{other.id}/view/').status_code, status.HTTP_404_NOT_FOUND)
+
     def test_order_list_api_permissions(self):
         """Тест прав доступа к API списка заказов"""
         # Неавторизованный доступ
@@ -1,32 +1,46 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
 from .models import Order, OrderItem
 from .forms import OrderForm, OrderItemForm
+from .listing import ROW_CACHE_TIMEOUT, kanban_columns, order_page
 from customer_clients.models import Client
 from services.models import Service
 from user_accounts.models import User
+from reference import lookups
 
 @login_required
 def order_list(request):
-    """Список заказов с учетом прав доступа"""
-    # Для владельца - все заказы
-    if request.user.role == 'owner':
-        orders = Order.objects.all().order_by('-created_at')
-    # Для менеджера - только его заказы
-    elif request.user.role == 'manager':
-        orders = Order.objects.filter(manager=request.user).order_by('-created_at')
-    # Для монтажника - только заказы, где он назначен (ТОЛЬКО ПРОСМОТР)
-    else:  # installer
-        orders = Order.objects.filter(installers=request.user).order_by('-created_at')
+    """Список заказов с учетом прав доступа: фильтры, сортировка и постраничный вывод"""
+    page, filters, totals = order_page(request.user, request.GET)
     
     context = {
-        'orders': orders,
+        'page_obj': page,
+        'orders': page.object_list,
+        'columns': kanban_columns(page.object_list),
+        'filters': filters,
+        'query': urlencode({name: value for name, value in filters.items() if value}),
+        'totals': totals,
+        'page_range': page.paginator.get_elided_page_range(page.number, on_each_side=2, on_ends=1),
+        'row_cache_timeout': ROW_CACHE_TIMEOUT,
         'can_edit': request.user.role in ['owner', 'manager'],
         'can_create': request.user.role in ['owner', 'manager'],
     }
     
+    # Обновление списка со страницы: только таблица и счетчики
+    if request.GET.get('partial'):
+        return JsonResponse({
+            'html': render_to_string('orders/partials/order_list_page.html', context, request=request),
+            'count': page.paginator.count,
+            'totals': totals,
+        })
+    
+    if request.user.role == 'owner':
+        context['managers'] = lookups.users_by_role('manager')
+    
     return render(request, 'orders/order_list.html', context)
 
 @login_required
@@ -159,12 +173,10 @@ def order_change_status(request, pk):
     
     if request.method == 'POST':
         status = request.POST.get('status')
-        if status in dict(Order.STATUS_CHOICES).keys():
-            order.status = status
-            if status == 'completed':
-                order.completed_at = timezone.now()
-            order.save()
-            messages.success(request, f'Статус заказа изменен на "{dict(Order.STATUS_CHOICES)[status]}"!')
+        statuses = lookups.choice_map(Order, 'status')
+        if status in statuses:
+            order.transition_to(status)
+            messages.success(request, f'Статус заказа изменен на "{statuses[status]}"!')
         else:
             messages.error(request, 'Некорректный статус заказа.')
     
@@ -0,0 +1,10 @@
+# reference/apps.py
+from django.apps import AppConfig
+
+class ReferenceConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reference'
+    verbose_name = 'Справочники'
+    
+    def ready(self):
+        import reference.signals  # Смена версий справочников
@@ -0,0 +1,212 @@
+# reference/lookups.py
+"""
+Справочные данные в памяти процесса: услуги, сотрудники и отображаемые
+значения choices.
+
+Набор данных (services, users) читается одним запросом и хранится в памяти
+процесса вместе с меткой версии. Метки лежат в общем кеше: сигналы сохранения
+и удаления заменяют метку, и каждый процесс при следующем обращении видит,
+что его копия устарела, и перечитывает набор. Обращение к актуальной копии
+запросов к БД не делает. Пропавшая из кеша метка создается заново, поэтому
+вытеснение делает копии устаревшими, а не актуальными. Копия старше
+REFERENCE_MAX_AGE секунд перечитывается в любом случае - на случай кеша,
+не общего для процессов (locmem).
+
+Справочники форм (FORMS) отдаются страницам через GET /api/reference/<name>/
+(reference/views.py). Их ETag - метка версии набора, поэтому сверка
+If-None-Match не читает ни БД, ни сами данные.
+
+Возвращаемые кортежи и словари общие для всех запросов процесса - их нельзя
+изменять.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from services.models import Service
+from user_accounts.models import User
+
+ServiceRef = namedtuple('ServiceRef', [
+    'id', 'name', 'category', 'category_display', 'cost_price', 'selling_price'
+])
+UserRef = namedtuple('UserRef', [
+    'id', 'username', 'first_name', 'last_name', 'full_name', 'role', 'role_display', 'phone', 'is_active'
+])
+
+SELLER_ROLES = ('manager', 'installer')
+
+_lock = threading.Lock()
+# Набор -> (метка, время загрузки, данные)
+_loaded = {}
+
+
+@lru_cache(maxsize=None)
+def choice_map(model, field_name):
+    """{значение: отображение} поля с choices; строится один раз на процесс"""
+    return dict(model._meta.get_field(field_name).flatchoices)
+
+
+def display(model, field_name, value):
+    """Отображение значения поля с choices (неизвестное значение - как есть)"""
+    return choice_map(model, field_name).get(value, value)
+
+
+def _load_services():
+    categories = choice_map(Service, 'category')
+    rows = tuple(
+        ServiceRef(pk, name, category, categories.get(category, category), cost_price, selling_price)
+        for pk, name, category, cost_price, selling_price in Service.objects.order_by('category', 'name').values_list(
+            'id', 'name', 'category', 'cost_price', 'selling_price'
+        )
+    )
+    return {'rows': rows, 'by_id': {row.id: row for row in rows}}
+
+
+def _load_users():
+    roles = choice_map(User, 'role')
+    rows = tuple(
+        UserRef(
+            pk, username, first_name, last_name, f'{first_name} {last_name}'.strip(),
+            role, roles.get(role, role), phone, is_active
+        )
+        for pk, username, first_name, last_name, role, phone, is_active in User.objects.order_by(
+            'role', 'first_name', 'last_name', 'username'
+        ).values_list('id', 'username', 'first_name', 'last_name', 'role', 'phone', 'is_active')
+    )
+    by_role = {}
+    for row in rows:
+        by_role.setdefault(row.role, []).append(row)
+    return {
+        'rows': rows,
+        'by_id': {row.id: row for row in rows},
+        'by_role': {role: tuple(items) for role, items in by_role.items()},
+    }
+
+
+DATASETS = {
+    'services': _load_services,
+    'users': _load_users,
+}
+
+
+def _cache():
+    alias = getattr(settings, 'REFERENCE_CACHE_ALIAS', 'default')
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _max_age():
+    return getattr(settings, 'REFERENCE_MAX_AGE', 300)
+
+
+def _stamp_key(name):
+    return f'reference:stamp:{name}'
+
+
+def version(name):
+    """Текущая метка версии набора (общая для всех процессов)"""
+    cache = _cache()
+    key = _stamp_key(name)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = uuid.uuid4().hex
+        if not cache.add(key, stamp, None):
+            stamp = cache.get(key) or stamp
+    return stamp
+
+
+def bump(*names):
+    """Новые метки наборов: копии во всех процессах устаревают"""
+    _cache().set_many({_stamp_key(name): uuid.uuid4().hex for name in names}, None)
+
+
+def reset():
+    """Сбрасывает копии наборов этого процесса (тесты, массовая загрузка данных без сигналов)"""
+    with _lock:
+        _loaded.clear()
+
+
+def _dataset(name):
+    stamp = version(name)
+    entry = _loaded.get(name)
+    if entry is None or entry[0] != stamp or time.monotonic() - entry[1] > _max_age():
+        with _lock:
+            entry = _loaded.get(name)
+            if entry is None or entry[0] != stamp or time.monotonic() - entry[1] > _max_age():
+                entry = (stamp, time.monotonic(), DATASETS[name]())
+                _loaded[name] = entry
+    return entry[2]
+
+
+def services():
+    return _dataset('services')['rows']
+
+
+def services_by_id():
+    return _dataset('services')['by_id']
+
+
+def users_by_id():
+    return _dataset('users')['by_id']
+
+
+def users_by_role(role):
+    return _dataset('users')['by_role'].get(role, ())
+
+
+def sellers():
+    """Сотрудники, которые могут быть продавцами позиций: менеджеры и монтажники"""
+    return tuple(row for role in SELLER_ROLES for row in users_by_role(role))
+
+
+def users_count(active_only=False):
+    rows = _dataset('users')['rows']
+    return sum(1 for row in rows if row.is_active) if active_only else len(rows)
+
+
+def managers_count():
+    return len(users_by_role('manager'))
+
+
+def installers_count():
+    return len(users_by_role('installer'))
+
+
+# Справочники форм: имя -> (набор, из которого он строится, строки, поля ответа).
+# Отдаются любому вошедшему пользователю - только поля, которые нужны формам
+FORMS = {
+    'services': ('services', services, ('id', 'name', 'category', 'selling_price')),
+    'sellers': ('users', sellers, ('id', 'first_name', 'last_name', 'full_name', 'role', 'role_display')),
+}
+# Себестоимость (маржа) - только ролям, которые редактируют позиции заказа
+PRICING_ROLES = ('owner', 'manager')
+PRICING_FIELDS = {
+    'services': ('cost_price',),
+}
+
+
+def _form_fields(name, role):
+    fields = FORMS[name][2]
+    if role in PRICING_ROLES:
+        fields += PRICING_FIELDS.get(name, ())
+    return fields
+
+
+def form_data(name, role=None):
+    """Справочник формы для роли списком словарей; KeyError - неизвестный справочник"""
+    fields = _form_fields(name, role)
+    return [{field: getattr(row, field) for field in fields} for row in FORMS[name][1]()]
+
+
+def form_etag(name, role=None):
+    """ETag справочника формы - метка версии его набора (и вариант полей для роли)"""
+    variant = 'pricing' if role in PRICING_ROLES and name in PRICING_FIELDS else 'public'
+    return '"{}-{}-{}"'.format(name, variant, version(FORMS[name][0]))
@@ -0,0 +1,28 @@
+# reference/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from services.models import Service
+from user_accounts.models import User
+from . import lookups
+
+
+def _changed(name):
+    # Сразу - для своего процесса, после фиксации - чтобы другой процесс
+    # не успел перечитать набор до коммита и запомнить старые данные под новой меткой
+    lookups.bump(name)
+    transaction.on_commit(lambda: lookups.bump(name))
+
+
+@receiver([post_save, post_delete], sender=Service)
+def services_changed(sender, instance, **kwargs):
+    _changed('services')
+
+
+@receiver([post_save, post_delete], sender=User)
+def users_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход в систему сохраняет только last_login - справочник не меняется
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    _changed('users')
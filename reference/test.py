@@ -0,0 +1,120 @@
+# reference/test.py
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from customer_clients.models import Client
+from services.models import Service
+from . import lookups
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reference-test'}})
+class ReferenceLookupsTests(TestCase):
+    """Тесты справочников в памяти процесса"""
+
+    def setUp(self):
+        lookups.reset()
+        self.manager = User.objects.create_user(username='manager', password='testpass123', role='manager', first_name='Иван')
+        self.installer = User.objects.create_user(username='installer', password='testpass123', role='installer')
+        self.service = Service.objects.create(
+            name='Монтаж',
+            cost_price=Decimal('1000.00'),
+            selling_price=Decimal('2000.00'),
+            category='installation'
+        )
+
+    def test_lookups_without_queries(self):
+        """Повторные обращения к справочникам не делают запросов"""
+        lookups.services_by_id()
+        lookups.sellers()
+        with CaptureQueriesContext(connection) as queries:
+            service = lookups.services_by_id()[self.service.pk]
+            sellers = lookups.sellers()
+            managers = lookups.managers_count()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(service.category_display, 'Монтаж')
+        self.assertEqual([seller.id for seller in sellers], [self.manager.pk, self.installer.pk])
+        self.assertEqual(managers, 1)
+
+    def test_save_and_delete_invalidate(self):
+        """Сохранение и удаление меняют версию набора"""
+        self.assertEqual(lookups.services_by_id()[self.service.pk].selling_price, Decimal('2000.00'))
+        self.service.selling_price = Decimal('2500.00')
+        self.service.save()
+        self.assertEqual(lookups.services_by_id()[self.service.pk].selling_price, Decimal('2500.00'))
+
+        self.assertEqual(lookups.installers_count(), 1)
+        self.installer.delete()
+        self.assertEqual(lookups.installers_count(), 0)
+
+    def test_login_keeps_users_version(self):
+        """Вход в систему не сбрасывает справочник сотрудников"""
+        stamp = lookups.version('users')
+        self.client.login(username='manager', password='testpass123')
+        self.assertEqual(lookups.version('users'), stamp)
+
+        self.manager.first_name = 'Петр'
+        self.manager.save()
+        self.assertNotEqual(lookups.version('users'), stamp)
+        self.assertEqual(lookups.users_by_id()[self.manager.pk].full_name, 'Петр')
+
+    def test_lost_stamp_reloads(self):
+        """Пропавшая из кеша метка делает копию устаревшей"""
+        lookups.services()
+        Service.objects.filter(pk=self.service.pk).update(name='Демонтаж')
+        lookups._cache().delete(lookups._stamp_key('services'))
+        self.assertEqual(lookups.services()[0].name, 'Демонтаж')
+
+    def test_choice_display(self):
+        self.assertEqual(lookups.display(Client, 'source', 'avito'), dict(Client.SOURCE_CHOICES)['avito'])
+        self.assertEqual(lookups.display(Client, 'source', 'unknown'), 'unknown')
+
+    def test_reference_endpoint_etag(self):
+        """Справочники форм отдаются с ETag и не пересылаются, пока не изменились"""
+        self.client.force_login(self.manager)
+        response = self.client.get('/api/reference/services/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([service['id'] for service in response.data], [self.service.id])
+        etag = response['ETag']
+
+        # Повторная загрузка - из кеша, без запросов к справочным таблицам
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/reference/services/')
+        self.assertFalse([query for query in queries if 'services_service' in query['sql']])
+
+        response = self.client.get('/api/reference/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.service.selling_price = Decimal('2500.00')
+        self.service.save()
+        response = self.client.get('/api/reference/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.get('/api/reference/sellers/')
+        self.assertEqual({seller['id'] for seller in response.data}, {self.manager.id, self.installer.id})
+        self.assertEqual(self.client.get('/api/reference/unknown/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reference_endpoint_fields(self):
+        """Справочник отдает только поля форм, себестоимость - только ролям, редактирующим позиции"""
+        self.client.force_login(self.installer)
+        response = self.client.get('/api/reference/services/')
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'category', 'selling_price'})
+        installer_etag = response['ETag']
+
+        self.client.force_login(self.manager)
+        response = self.client.get('/api/reference/services/', HTTP_IF_NONE_MATCH=installer_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['cost_price'], Decimal('1000.00'))
+
+        # Логины, телефоны и статус сотрудников формам не нужны
+        response = self.client.get('/api/reference/sellers/')
+        self.assertEqual(
+            set(response.data[0]), {'id', 'first_name', 'last_name', 'full_name', 'role', 'role_display'}
+        )
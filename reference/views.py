@@ -0,0 +1,30 @@
+# reference/views.py
+from django.contrib.auth.decorators import login_required
+from django.utils.decorators import method_decorator
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import lookups
+
+
+@method_decorator(login_required, name='dispatch')
+class ReferenceDataView(APIView):
+    """
+    API-эндпоинт справочников форм (services, sellers) с ETag:
+    если справочник не изменился, ответ 304 без тела
+    """
+    def get(self, request, name):
+        if name not in lookups.FORMS:
+            return Response({'error': 'Справочник не найден'}, status=status.HTTP_404_NOT_FOUND)
+        
+        role = request.user.role
+        etag = lookups.form_etag(name, role)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(lookups.form_data(name, role))
+        response['ETag'] = etag
+        # Кешировать можно, но перед использованием - перепроверять
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -3,7 +3,8 @@ from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
     SalaryConfig, ManagerSalaryConfig, InstallerSalaryConfig, 
-    OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment
+    OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment,
+    PayrollRun, PayrollRunLine
 )
 
 class ManagerSalaryConfigInline(admin.StackedInline):
@@ -143,6 +144,23 @@ class SalaryAdjustmentAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+class PayrollRunLineInline(admin.TabularInline):
+    model = PayrollRunLine
+    extra = 0
+    fields = ('user', 'role', 'total_salary')
+    readonly_fields = ('user', 'role', 'total_salary')
+    can_delete = False
+
+@admin.register(PayrollRun)
+class PayrollRunAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'period_end', 'status', 'total', 'created_at', 'approved_at')
+    list_filter = ('status',)
+    readonly_fields = (
+        'period_start', 'period_end', 'inputs_hash', 'config_versions', 'total',
+        'created_by', 'created_at', 'approved_by', 'approved_at'
+    )
+    inlines = [PayrollRunLineInline]
+
 # Дополнительная настройка админки
 admin.site.site_header = "CRM Администрирование"
 admin.site.site_title = "CRM Admin"
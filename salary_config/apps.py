@@ -7,5 +7,4 @@ class SalaryConfigConfig(AppConfig):
     verbose_name = 'Настройки зарплат'
     
     def ready(self):
-        # Импортируем сигналы, если понадобятся
-        pass
\ No newline at end of file
+        import salary_config.signals  # Версия снимка конфигураций
\ No newline at end of file
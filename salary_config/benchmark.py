@@ -0,0 +1,218 @@
+# salary_config/benchmark.py
+"""
+Замеры производительности расчета зарплат на синтетических данных.
+
+generate_dataset() создает сотрудников, клиентов и услуги обычным сохранением,
+а заказы и позиции - пакетно (bulk_create), чтобы 100k заказов создавались
+за разумное время. Значения берутся из random.Random(seed), поэтому данные
+воспроизводимы и не требуют тестовых зависимостей.
+run() для каждого размера генерирует данные в откатываемой транзакции,
+замеряет время и число запросов каждого расчета и собирает отчет,
+который можно сохранить в JSON и сравнить с отчетом другого коммита.
+"""
+import platform
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from customer_clients.models import Client
+from orders.models import Order, OrderItem
+from services.models import Service
+from user_accounts.models import User
+from . import payroll
+from .models import SalaryAdjustment
+from .services import SalaryCalculationService, SalaryConfigService
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+BATCH_SIZE = 2000
+
+CATEGORIES = ('conditioner', 'installation', 'dismantling', 'maintenance', 'additional')
+SOURCES = ('website', 'avito', 'vk', 'recommendations', 'other')
+
+
+def _employees(role, count, seed):
+    return [
+        User.objects.create_user(username=f'bench_{role}_{seed}_{i}', role=role, first_name=f'Сотрудник {i}')
+        for i in range(count)
+    ]
+
+
+def _services(rng, count=25):
+    services = []
+    for i in range(count):
+        cost_price = Decimal(rng.randint(10000, 9999999)) / 100
+        services.append(Service.objects.create(
+            name=f'Услуга {i}',
+            cost_price=cost_price,
+            selling_price=(cost_price * Decimal('1.5')).quantize(Decimal('0.01')),
+            category=CATEGORIES[i % len(CATEGORIES)]
+        ))
+    return services
+
+
+def _clients(rng, count):
+    return [
+        Client.objects.create(
+            name=f'Клиент {i}',
+            address=f'ул. Синтетическая, {i}',
+            phone=f'+7900{rng.randint(0, 9999999):07d}',
+            source=SOURCES[i % len(SOURCES)]
+        )
+        for i in range(count)
+    ]
+
+
+def generate_dataset(orders, employees=50, seed=0, days=30):
+    """
+    Синтетические данные: employees сотрудников (каждый пятый - менеджер),
+    orders завершенных заказов за последние days дней с позициями
+    всех категорий, конфигурация по умолчанию и корректировки
+    """
+    rng = random.Random(seed)
+
+    if not User.objects.filter(role='owner').exists():
+        _employees('owner', 1, seed)
+    managers = _employees('manager', max(employees // 5, 1), seed)
+    installers = _employees('installer', max(employees - len(managers), 1), seed)
+    SalaryConfigService.bulk_assign_default_config()
+
+    services = _services(rng)
+    clients = _clients(rng, min(max(orders // 10, 1), 1000))
+
+    end = timezone.now()
+    start = end - timedelta(days=days)
+    for offset in range(0, orders, BATCH_SIZE):
+        batch = Order.objects.bulk_create([
+            Order(
+                client=rng.choice(clients),
+                manager=rng.choice(managers),
+                status='completed',
+                completed_at=start + timedelta(seconds=rng.uniform(0, days * 86400)),
+            )
+            for _ in range(min(BATCH_SIZE, orders - offset))
+        ])
+
+        assignments = []
+        items = []
+        for order in batch:
+            crew = rng.sample(installers, min(len(installers), rng.randint(1, 2)))
+            assignments.extend(
+                Order.installers.through(order_id=order.pk, user_id=installer.pk) for installer in crew
+            )
+            for _ in range(rng.randint(1, 4)):
+                service = rng.choice(services)
+                seller = rng.choice(crew) if service.category == 'additional' and rng.random() < 0.5 else order.manager
+                items.append(OrderItem(
+                    order=order, service=service, seller=seller,
+                    price=service.selling_price, cost_price_at_sale=service.cost_price
+                ))
+        Order.installers.through.objects.bulk_create(assignments)
+        OrderItem.objects.bulk_create(items)
+
+    owner = User.objects.filter(role='owner').first()
+    adjustments = []
+    for user in managers + installers:
+        if rng.random() < 0.3:
+            bonus = rng.random() < 0.5
+            adjustments.append(SalaryAdjustment(
+                user=user,
+                adjustment_type='bonus' if bonus else 'penalty',
+                amount=rng.randint(500, 5000) * (1 if bonus else -1),
+                reason='Синтетическая корректировка',
+                period_start=timezone.localtime(start).date(),
+                period_end=timezone.localtime(end).date(),
+                created_by=owner,
+            ))
+    SalaryAdjustment.objects.bulk_create(adjustments)
+    return {
+        'manager': managers[0],
+        'installer': installers[0],
+        'start': start,
+        'end': end,
+    }
+
+
+BENCHMARKS = {
+    'installer_salary': lambda data: SalaryCalculationService.calculate_installer_salary(
+        data['installer'], data['start'], data['end']
+    ),
+    'manager_salary': lambda data: SalaryCalculationService.calculate_manager_salary(
+        data['manager'], data['start'], data['end']
+    ),
+    'owner_salary': lambda data: SalaryCalculationService.calculate_owner_salary(
+        data['start'], data['end']
+    ),
+    'payroll_run': lambda data: payroll.calculate_period(
+        timezone.localtime(data['start']).date(), timezone.localtime(data['end']).date()
+    ),
+}
+
+
+def measure(func, repeat=1):
+    """Лучшее время из repeat прогонов и число запросов одного прогона"""
+    best = None
+    for _ in range(repeat):
+        # Журнал запросов ограничен - генерация данных не должна его заполнить
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return {'seconds': round(best, 4), 'queries': len(queries)}
+
+
+def run(sizes=DEFAULT_SIZES, employees=50, seed=0, repeat=3, names=None, progress=None):
+    """Отчет замеров; данные каждого размера откатываются после замера"""
+    results = []
+    for size in sizes:
+        with transaction.atomic():
+            started = time.perf_counter()
+            data = generate_dataset(size, employees, seed)
+            generated = time.perf_counter() - started
+            benchmarks = {}
+            for name, func in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                benchmarks[name] = measure(lambda: func(data), repeat)
+                if progress:
+                    progress(size, name, benchmarks[name])
+            transaction.set_rollback(True)
+        results.append({
+            'orders': size,
+            'generation_seconds': round(generated, 2),
+            'benchmarks': benchmarks,
+        })
+    return {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'employees': employees,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    """Строки сравнения двух отчетов: (заказов, замер, было, стало) для общих замеров"""
+    before = {
+        (result['orders'], name): values
+        for result in previous['results'] for name, values in result['benchmarks'].items()
+    }
+    rows = []
+    for result in current['results']:
+        for name, values in result['benchmarks'].items():
+            old = before.get((result['orders'], name))
+            if old is not None:
+                rows.append((result['orders'], name, old, values))
+    return rows
@@ -0,0 +1,177 @@
+# salary_config/dataset.py
+"""
+Данные для пакетного расчета начислений сотрудникам.
+
+StaffDataset читает за фиксированное число запросов все, от чего зависят
+начисления менеджерам и монтажникам за интервал: сотрудников, историю
+конфигураций, завершенные заказы, их монтажников, сгруппированные позиции
+и корректировки. Дальше факты любого периода внутри интервала собираются
+в памяти, поэтому один набор данных обслуживает и точный расчет затрат
+на персонал, и многократные прогоны симуляции.
+
+AdjustmentIndex отвечает на вопрос "какие корректировки сотрудника
+пересекаются с периодом" без запросов: все корректировки интервала читаются
+одним запросом, поиск - бинарный по началам с отсечением по максимальному
+концу среди предыдущих.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from orders.models import Order, OrderItem, item_profit, money
+from user_accounts.models import User
+from . import history
+from .engine import SegmentFacts
+from .models import SalaryAdjustment
+
+
+def _as_date(moment):
+    """Граница периода как дата в часовом поясе проекта"""
+    if isinstance(moment, datetime):
+        return timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+    return moment
+
+
+class AdjustmentIndex:
+    """Корректировки сотрудников с поиском пересекающихся с периодом"""
+
+    def __init__(self, adjustments):
+        grouped = {}
+        for adjustment in adjustments:
+            grouped.setdefault(adjustment.user_id, []).append(adjustment)
+        self._users = {}
+        for user_id, items in grouped.items():
+            items.sort(key=lambda adjustment: (adjustment.period_start, adjustment.pk))
+            # reach[i] - самый поздний конец среди первых i + 1 корректировок
+            reach = []
+            for adjustment in items:
+                reach.append(max(reach[-1], adjustment.period_end) if reach else adjustment.period_end)
+            self._users[user_id] = ([adjustment.period_start for adjustment in items], reach, items)
+
+    @classmethod
+    def load(cls, start, end, user_ids=None):
+        """Все корректировки, пересекающиеся с [start, end], одним запросом"""
+        adjustments = SalaryAdjustment.objects.filter(
+            period_start__lte=_as_date(end),
+            period_end__gte=_as_date(start)
+        )
+        if user_ids is not None:
+            adjustments = adjustments.filter(user_id__in=list(user_ids))
+        return cls(adjustments)
+
+    def overlapping(self, user_id, start, end):
+        """Корректировки сотрудника, пересекающиеся с периодом, в порядке начала"""
+        starts, reach, items = self._users.get(user_id, ((), (), ()))
+        start, end = _as_date(start), _as_date(end)
+        found = []
+        index = bisect_right(starts, end) - 1
+        while index >= 0 and reach[index] >= start:
+            if items[index].period_end >= start:
+                found.append(items[index])
+            index -= 1
+        found.reverse()
+        return found
+
+    def total(self, user_id, start, end):
+        return sum(
+            (adjustment.amount for adjustment in self.overlapping(user_id, start, end)),
+            Decimal('0.00')
+        )
+
+
+class StaffDataset:
+    """Заказы, позиции, корректировки и история конфигураций сотрудников за интервал"""
+
+    def __init__(self, start, end, completed_orders=None):
+        self.start = start
+        self.end = end
+        if completed_orders is None:
+            completed_orders = Order.objects.filter(
+                status='completed',
+                completed_at__gte=start,
+                completed_at__lte=end
+            )
+
+        self.staff = list(
+            User.objects.filter(role__in=['manager', 'installer'], is_active=True).order_by('id')
+        )
+        self.roles = {user.id: user.role for user in self.staff}
+        self.timeline = history.Timeline(list(self.roles), start, end)
+
+        # Заказы в порядке завершения: (завершен, id, менеджер)
+        self._orders = sorted(
+            (completed_at, order_id, manager_id)
+            for order_id, manager_id, completed_at in completed_orders.values_list(
+                'id', 'manager_id', 'completed_at'
+            )
+        )
+        self._moments = [completed_at for completed_at, _, _ in self._orders]
+        order_ids = [order_id for _, order_id, _ in self._orders]
+
+        self._installers = {}
+        for order_id, installer_id in Order.installers.through.objects.filter(
+            order_id__in=order_ids
+        ).values_list('order_id', 'user_id'):
+            self._installers.setdefault(order_id, set()).add(installer_id)
+
+        # Прибыль позиций по заказу, продавцу и категории
+        self._items = {}
+        for row in OrderItem.objects.filter(order_id__in=order_ids).values(
+            'order_id', 'seller_id', 'service__category'
+        ).annotate(profit=Sum(item_profit()), count=Count('id')):
+            self._items.setdefault(row['order_id'], []).append(
+                (row['seller_id'], row['service__category'], row['count'], money(row['profit']))
+            )
+
+        self.adjustment_index = AdjustmentIndex.load(start, end, list(self.roles))
+
+    def adjustments(self, user_id, start, end):
+        """Сумма корректировок сотрудника, пересекающихся с периодом"""
+        return self.adjustment_index.total(user_id, start, end)
+
+    def segments(self, start, end):
+        """Фактические отрезки конфигураций сотрудников за период: {user_id: [Segment]}"""
+        return {user_id: self.timeline.segments(user_id, start, end) for user_id in self.roles}
+
+    def facts(self, start, end, segments):
+        """
+        Факты сотрудников по отрезкам: {user_id: [Segment]} -> {user_id: [SegmentFacts]}.
+        Менеджеру засчитываются его заказы и проданные им позиции, монтажнику -
+        его монтажи и проданные им доп. услуги.
+        """
+        starts = {user_id: [segment.start for segment in items] for user_id, items in segments.items()}
+        facts = {user_id: [SegmentFacts() for _ in items] for user_id, items in segments.items()}
+
+        def bucket(user_id, role, moment):
+            if self.roles.get(user_id) != role or user_id not in facts:
+                return None
+            return facts[user_id][history.locate(starts[user_id], moment)]
+
+        low = bisect_left(self._moments, start)
+        high = bisect_right(self._moments, end)
+        for completed_at, order_id, manager_id in self._orders[low:high]:
+            installers = self._installers.get(order_id, ())
+            manager_facts = bucket(manager_id, 'manager', completed_at)
+            if manager_facts is not None:
+                manager_facts.orders_count += 1
+            for installer_id in installers:
+                installer_facts = bucket(installer_id, 'installer', completed_at)
+                if installer_facts is not None:
+                    installer_facts.orders_count += 1
+            for seller_id, category, count, profit in self._items.get(order_id, ()):
+                if seller_id == manager_id and manager_facts is not None:
+                    manager_facts.add_sales(category, count, profit)
+                if category == 'additional' and seller_id in installers:
+                    installer_facts = bucket(seller_id, 'installer', completed_at)
+                    if installer_facts is not None:
+                        installer_facts.add_sales(category, count, profit)
+        return facts
+
+    def parts(self, start, end):
+        """Фактические [(отрезок, SegmentFacts)] каждого сотрудника за период"""
+        segments = self.segments(start, end)
+        facts = self.facts(start, end, segments)
+        return {user_id: list(zip(segments[user_id], facts[user_id])) for user_id in segments}
@@ -0,0 +1,276 @@
+# salary_config/engine.py
+"""
+Движок расчета зарплат.
+
+Начисление роли складывается из правил: фиксированная часть, бонус за заказ,
+процент с прибыли по категориям, оплата за монтаж, доля прибыли, корректировки.
+Правило получает настройки роли из действующей конфигурации (или ставки
+старой логики, если настроек нет) и факты отрезка периода, и возвращает сумму.
+Наборы правил ролей лежат в RULES и расширяются через register_rule().
+
+Движок не обращается к БД: факты (заказы, прибыль по категориям, корректировки)
+собираются пакетно в SalaryCalculationService, поэтому оптимизации выборки
+делаются в одном месте для всех точек входа.
+"""
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.utils import timezone
+
+_ZERO = Decimal('0.00')
+_CENT = Decimal('0.01')
+
+LEGACY_CONFIG_NAME = 'Стандартная (legacy)'
+
+# Поле процента менеджера с прибыли для каждой категории услуг
+MANAGER_CATEGORY_PERCENTAGES = {
+    'conditioner': 'conditioner_profit_percentage',
+    'additional': 'additional_services_profit_percentage',
+    'installation': 'installation_profit_percentage',
+    'maintenance': 'maintenance_profit_percentage',
+    'dismantling': 'dismantling_profit_percentage',
+}
+
+# Монтажник получает процент только с проданных им доп. услуг
+INSTALLER_CATEGORY_PERCENTAGES = {
+    'additional': 'additional_services_profit_percentage',
+}
+
+# Ставки старой логики расчета (для периодов без настроек)
+LEGACY_MANAGER_CONFIG = SimpleNamespace(
+    fixed_salary=Decimal('30000.00'),
+    bonus_per_completed_order=Decimal('250.00'),
+    conditioner_profit_percentage=Decimal('20.00'),
+    additional_services_profit_percentage=Decimal('30.00'),
+    installation_profit_percentage=Decimal('0.00'),
+    maintenance_profit_percentage=Decimal('0.00'),
+    dismantling_profit_percentage=Decimal('0.00'),
+)
+LEGACY_INSTALLER_CONFIG = SimpleNamespace(
+    payment_per_installation=Decimal('1500.00'),
+    additional_services_profit_percentage=Decimal('30.00'),
+)
+LEGACY_OWNER_CONFIG = SimpleNamespace(
+    payment_per_installation=Decimal('1500.00'),
+    remaining_profit_percentage=Decimal('100.00'),
+)
+
+# Роль -> (настройки роли в SalaryConfig, ставки старой логики)
+ROLE_SETTINGS = {
+    'manager': ('manager_config', LEGACY_MANAGER_CONFIG),
+    'installer': ('installer_config', LEGACY_INSTALLER_CONFIG),
+    'owner': ('owner_config', LEGACY_OWNER_CONFIG),
+}
+
+
+def has_role(config, relation):
+    return config is not None and hasattr(config, relation)
+
+
+class SegmentFacts:
+    """
+    Факты отрезка периода: заказы, прибыль по категориям {категория: (позиций, прибыль)},
+    доля отрезка в периоде; для владельца - валовая прибыль и начисления сотрудникам
+    """
+    __slots__ = ('orders_count', 'sales', 'share', 'gross_profit', 'staff_costs')
+
+    def __init__(self, orders_count=0, sales=None, gross_profit=_ZERO, staff_costs=_ZERO):
+        self.orders_count = orders_count
+        self.sales = sales or {}
+        self.share = Decimal('1')
+        self.gross_profit = gross_profit
+        self.staff_costs = staff_costs
+
+    def add_sales(self, category, count, profit):
+        sold, earned = self.sales.get(category, (0, _ZERO))
+        self.sales[category] = (sold + count, earned + profit)
+
+
+class Rule(ABC):
+    """Правило начисления"""
+    code = None
+    # Сумма задана на весь период и делится между отрезками по длительности
+    prorated = False
+    # Считается один раз за период, а не по отрезкам
+    per_period = False
+
+    @abstractmethod
+    def amount(self, settings, facts, lines):
+        """Сумма правила; lines - уже посчитанные суммы предыдущих правил"""
+
+    def details(self, settings, facts, amount):
+        return None
+
+
+class FixedSalaryRule(Rule):
+    code = 'fixed_salary'
+    prorated = True
+
+    def amount(self, settings, facts, lines):
+        return settings.fixed_salary * facts.share
+
+
+class PerOrderBonusRule(Rule):
+    code = 'orders_bonus'
+    field = 'bonus_per_completed_order'
+
+    def amount(self, settings, facts, lines):
+        return getattr(settings, self.field) * facts.orders_count
+
+
+class PerInstallationRule(PerOrderBonusRule):
+    code = 'installation_pay'
+    field = 'payment_per_installation'
+
+
+class CategoryPercentageRule(Rule):
+    """Процент с прибыли проданных позиций; проценты - поля настроек по категориям"""
+    code = 'sales_bonus'
+
+    def __init__(self, percentages):
+        self.percentages = percentages
+
+    def percentage(self, settings, category):
+        field = self.percentages.get(category)
+        return getattr(settings, field) if field else _ZERO
+
+    def amount(self, settings, facts, lines):
+        return sum(
+            (profit * (self.percentage(settings, category) / 100)
+             for category, (count, profit) in facts.sales.items()),
+            _ZERO
+        )
+
+    def details(self, settings, facts, amount):
+        details = {}
+        for category, (count, profit) in facts.sales.items():
+            percentage = self.percentage(settings, category)
+            details[category] = {
+                'count': count,
+                'profit': profit,
+                'bonus': profit * (percentage / 100),
+                'percentage': percentage,
+            }
+        return details
+
+
+class ProfitShareRule(Rule):
+    """Доля владельца от прибыли, оставшейся после начислений сотрудникам и за монтажи"""
+    code = 'owner_profit_share'
+
+    def amount(self, settings, facts, lines):
+        remaining = facts.gross_profit - facts.staff_costs - lines.get('installation_pay', _ZERO)
+        return remaining * (settings.remaining_profit_percentage / 100)
+
+
+class AdjustmentRule(Rule):
+    """Премии и штрафы за период; старая логика (без настроек) их не учитывает"""
+    code = 'adjustments'
+    per_period = True
+
+    def amount(self, settings, facts, lines):
+        return facts.adjustments if facts.configured else _ZERO
+
+
+RULES = {
+    'manager': [
+        FixedSalaryRule(),
+        PerOrderBonusRule(),
+        CategoryPercentageRule(MANAGER_CATEGORY_PERCENTAGES),
+        AdjustmentRule(),
+    ],
+    'installer': [
+        PerInstallationRule(),
+        CategoryPercentageRule(INSTALLER_CATEGORY_PERCENTAGES),
+        AdjustmentRule(),
+    ],
+    'owner': [
+        PerInstallationRule(),
+        ProfitShareRule(),
+        AdjustmentRule(),
+    ],
+}
+
+
+def register_rule(role, rule, before=None):
+    """Добавляет правило роли (в конец или перед правилом с кодом before)"""
+    rules = RULES[role]
+    codes = [existing.code for existing in rules]
+    if rule.code in codes:
+        raise ValueError(f'Правило {rule.code} уже зарегистрировано для роли {role}')
+    rules.insert(codes.index(before) if before in codes else len(rules), rule)
+
+
+def role_settings(role, config):
+    """Настройки роли и название конфигурации (ставки старой логики без настроек)"""
+    relation, legacy = ROLE_SETTINGS[role]
+    if has_role(config, relation):
+        return getattr(config, relation), config.name
+    return legacy, LEGACY_CONFIG_NAME
+
+
+def evaluate(role, parts, adjustments=_ZERO):
+    """
+    Начисление роли за период.
+    parts - [(отрезок history.Segment, SegmentFacts)] в порядке времени.
+    Возвращает суммы правил (lines), детали, разбивку по отрезкам и итог.
+    """
+    relation, _ = ROLE_SETTINGS[role]
+    rules = RULES[role]
+    segment_rules = [rule for rule in rules if not rule.per_period]
+    configured = any(has_role(segment.config, relation) for segment, _ in parts)
+
+    total_seconds = sum((segment.seconds for segment, _ in parts), Decimal('0'))
+    if len(parts) > 1 and total_seconds:
+        for segment, facts in parts:
+            facts.share = segment.seconds / total_seconds
+
+    lines = {rule.code: _ZERO for rule in rules}
+    details = {}
+    config_periods = []
+    config_name = LEGACY_CONFIG_NAME
+    for segment, facts in parts:
+        settings, config_name = role_settings(role, segment.config)
+        segment_lines = {}
+        for rule in segment_rules:
+            amount = rule.amount(settings, facts, segment_lines)
+            segment_lines[rule.code] = amount
+            lines[rule.code] += amount
+            rule_details = rule.details(settings, facts, amount)
+            if rule_details:
+                merged = details.setdefault(rule.code, {})
+                for key, values in rule_details.items():
+                    if key not in merged:
+                        merged[key] = dict(values)
+                        continue
+                    for name, value in values.items():
+                        # Счетчики и суммы складываются, ставка - последнего отрезка
+                        merged[key][name] = value if name == 'percentage' else merged[key][name] + value
+        config_periods.append({
+            'config_name': config_name,
+            'start': timezone.localtime(segment.start).date().isoformat(),
+            'end': timezone.localtime(segment.end).date().isoformat(),
+            'orders_count': facts.orders_count,
+            'lines': segment_lines,
+            'total': sum(segment_lines.values(), _ZERO),
+        })
+
+    if len(parts) > 1:
+        for rule in segment_rules:
+            if rule.prorated:
+                lines[rule.code] = lines[rule.code].quantize(_CENT)
+
+    period_facts = SimpleNamespace(adjustments=adjustments, configured=configured)
+    for rule in rules:
+        if rule.per_period:
+            lines[rule.code] = rule.amount(None, period_facts, lines)
+
+    return {
+        'config_name': config_name,
+        'configured': configured,
+        'lines': lines,
+        'details': details,
+        'config_periods': config_periods,
+        'total': sum(lines.values(), _ZERO),
+    }
@@ -0,0 +1,282 @@
+# salary_config/history.py
+"""
+История конфигураций зарплат.
+
+Каждое изменение конфигурации (вместе с настройками ролей) сохраняется
+версией SalaryConfigVersion, каждое назначение - периодом
+SalaryAssignmentPeriod; у обоих есть valid_from/valid_to (None - без границы).
+Первая версия конфигурации и первое назначение пользователя действуют
+с начала времен: новая конфигурация применяется и к уже прошедшим заказам,
+а последующие правки - только с момента изменения.
+
+Расчет за период делится на отрезки с неизменной конфигурацией. История всех
+нужных сотрудников читается двумя запросами, конфигурация на момент времени
+находится бинарным поиском по отсортированным началам периодов.
+"""
+from bisect import bisect_right
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db.models import Q
+from django.utils import timezone
+
+ROLE_RELATIONS = ('manager_config', 'installer_config', 'owner_config')
+
+# Точка отсчета для границ None ("с начала времен")
+_BEGINNING = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+
+def _role_data(role_config):
+    return {
+        field.name: str(getattr(role_config, field.attname))
+        for field in role_config._meta.concrete_fields
+        if not field.primary_key and not field.is_relation
+    }
+
+
+def config_data(config):
+    """Настройки ролей конфигурации в виде, пригодном для JSON"""
+    data = {}
+    for relation in ROLE_RELATIONS:
+        if hasattr(config, relation):
+            data[relation] = _role_data(getattr(config, relation))
+    return data
+
+
+def record_config_version(config_id, now=None):
+    """
+    Фиксирует текущее состояние конфигурации новой версией, закрывая прежнюю.
+    Добавление недостающих настроек ролей (создание конфигурации по шагам)
+    дополняет текущую версию, а не открывает новую.
+    """
+    from .models import SalaryConfig, SalaryConfigVersion
+
+    config = SalaryConfig.objects.select_related(*ROLE_RELATIONS).filter(pk=config_id).first()
+    if config is None:
+        return None
+    data = config_data(config)
+    current = SalaryConfigVersion.objects.filter(
+        config_id=config_id, valid_to__isnull=True
+    ).order_by('-id').first()
+
+    if current is not None and current.name == config.name and current.is_active == config.is_active:
+        if current.data == data:
+            return current
+        if all(data.get(relation) == values for relation, values in current.data.items()):
+            current.data = data
+            current.save(update_fields=['data'])
+            return current
+
+    now = now or timezone.now()
+    if current is not None:
+        current.valid_to = now
+        current.save(update_fields=['valid_to'])
+    return SalaryConfigVersion.objects.create(
+        config_id=config_id,
+        name=config.name,
+        is_active=config.is_active,
+        data=data,
+        valid_from=now if current is not None else None,
+    )
+
+
+def record_assignment(user_id, config_id, now=None):
+    """Открывает период назначения, закрывая прежний (если конфигурация сменилась)"""
+    from .models import SalaryAssignmentPeriod
+
+    current = SalaryAssignmentPeriod.objects.filter(
+        user_id=user_id, valid_to__isnull=True
+    ).order_by('-id').first()
+    if current is not None and current.config_id == config_id:
+        return current
+
+    now = now or timezone.now()
+    has_history = current is not None or SalaryAssignmentPeriod.objects.filter(user_id=user_id).exists()
+    if current is not None:
+        current.valid_to = now
+        current.save(update_fields=['valid_to'])
+    return SalaryAssignmentPeriod.objects.create(
+        user_id=user_id,
+        config_id=config_id,
+        valid_from=now if has_history else None,
+    )
+
+
+def close_assignment(user_id, now=None):
+    """Завершает действующее назначение пользователя"""
+    from .models import SalaryAssignmentPeriod
+
+    SalaryAssignmentPeriod.objects.filter(
+        user_id=user_id, valid_to__isnull=True
+    ).update(valid_to=now or timezone.now())
+
+
+class ConfigState:
+    """
+    Конфигурация в том виде, в каком она действовала в версии.
+    Повторяет интерфейс SalaryConfig, используемый расчетом: name и настройки
+    ролей (hasattr(config, 'manager_config') ложно, если их не было).
+    """
+
+    def __init__(self, version):
+        self.pk = self.id = version['config_id']
+        self.version_id = version['id']
+        self.name = version['name']
+        self._roles = {
+            relation: SimpleNamespace(**{name: Decimal(value) for name, value in values.items()})
+            for relation, values in version['data'].items()
+        }
+
+    def __getattr__(self, name):
+        roles = self.__dict__.get('_roles', {})
+        if name in roles:
+            return roles[name]
+        raise AttributeError(name)
+
+
+class Segment:
+    """Отрезок расчетного периода с одной конфигурацией (None - без настроек)"""
+    __slots__ = ('start', 'end', 'config')
+
+    def __init__(self, start, end, config):
+        self.start = start
+        self.end = end
+        self.config = config
+
+    @property
+    def seconds(self):
+        return Decimal(str((self.end - self.start).total_seconds()))
+
+
+class _Intervals:
+    """Непересекающиеся интервалы [valid_from, valid_to) с поиском по моменту"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: row['valid_from'] or _BEGINNING)
+        self.starts = [row['valid_from'] or _BEGINNING for row in rows]
+        self.rows = rows
+
+    def at(self, moment):
+        index = bisect_right(self.starts, moment) - 1
+        if index < 0:
+            return None
+        row = self.rows[index]
+        if row['valid_to'] is not None and moment >= row['valid_to']:
+            return None
+        return row
+
+
+def _overlapping(queryset, start, end):
+    return queryset.filter(
+        Q(valid_from__isnull=True) | Q(valid_from__lte=end),
+        Q(valid_to__isnull=True) | Q(valid_to__gt=start),
+    )
+
+
+class Timeline:
+    """История назначений и версий конфигураций за расчетный период"""
+
+    def __init__(self, user_ids, start, end):
+        from .models import SalaryAssignmentPeriod, SalaryConfigVersion
+
+        self.start = start
+        self.end = end
+
+        periods = {}
+        for row in _overlapping(
+            SalaryAssignmentPeriod.objects.filter(user_id__in=list(user_ids)), start, end
+        ).values('user_id', 'config_id', 'valid_from', 'valid_to'):
+            periods.setdefault(row['user_id'], []).append(row)
+        self._periods = {user_id: _Intervals(rows) for user_id, rows in periods.items()}
+
+        versions = {}
+        self._states = {}
+        boundaries = set()
+        for row in _overlapping(SalaryConfigVersion.objects.all(), start, end).values(
+            'id', 'config_id', 'name', 'is_active', 'data', 'valid_from', 'valid_to', 'config__created_at'
+        ):
+            versions.setdefault(row['config_id'], []).append(row)
+            self._states[row['id']] = ConfigState(row)
+            boundaries.update(moment for moment in (row['valid_from'], row['valid_to']) if moment)
+        self._versions = {config_id: _Intervals(rows) for config_id, rows in versions.items()}
+        # Кандидаты в конфигурацию по умолчанию - как в resolver: сначала новые
+        self._default_candidates = sorted(
+            versions, key=lambda config_id: versions[config_id][0]['config__created_at'], reverse=True
+        )
+        self._version_boundaries = boundaries
+
+    def _active_version(self, config_id, moment):
+        intervals = self._versions.get(config_id)
+        row = intervals.at(moment) if intervals else None
+        return row if row is not None and row['is_active'] else None
+
+    def config_at(self, user_id, moment):
+        """Конфигурация пользователя на момент: назначенная активная, иначе по умолчанию"""
+        periods = self._periods.get(user_id)
+        period = periods.at(moment) if periods else None
+        if period is not None:
+            version = self._active_version(period['config_id'], moment)
+            if version is not None:
+                return self._states[version['id']]
+        for config_id in self._default_candidates:
+            version = self._active_version(config_id, moment)
+            if version is not None and 'по умолчанию' in version['name'].lower():
+                return self._states[version['id']]
+        return None
+
+    def assigned(self, user_id, config_id, start=None, end=None):
+        """Был ли пользователь назначен на конфигурацию в течение периода [start, end]"""
+        start, end = start or self.start, end or self.end
+        periods = self._periods.get(user_id)
+        return periods is not None and any(
+            row['config_id'] == config_id
+            and (row['valid_from'] is None or row['valid_from'] <= end)
+            and (row['valid_to'] is None or row['valid_to'] > start)
+            for row in periods.rows
+        )
+
+    def owner_config_at(self, moment):
+        """Конфигурация владельца на момент - как в resolver: самая новая активная с его настройками"""
+        for config_id in self._default_candidates:
+            version = self._active_version(config_id, moment)
+            if version is not None and 'owner_config' in version['data']:
+                return self._states[version['id']]
+        return None
+
+    def _split(self, start, end, boundaries, config_at):
+        points = [start] + sorted(
+            moment for moment in boundaries if start < moment <= end
+        )
+        segments = []
+        for index, point in enumerate(points):
+            config = config_at(point)
+            segment_end = points[index + 1] if index + 1 < len(points) else end
+            if segments and segments[-1].config is config:
+                segments[-1].end = segment_end
+            else:
+                segments.append(Segment(point, segment_end, config))
+        return segments
+
+    def segments(self, user_id, start=None, end=None):
+        """
+        Отрезки периода [start, end] с неизменной конфигурацией пользователя
+        (по умолчанию - весь период истории)
+        """
+        boundaries = set(self._version_boundaries)
+        periods = self._periods.get(user_id)
+        if periods:
+            for row in periods.rows:
+                boundaries.update(moment for moment in (row['valid_from'], row['valid_to']) if moment)
+        return self._split(
+            start or self.start, end or self.end, boundaries, lambda moment: self.config_at(user_id, moment)
+        )
+
+    def owner_segments(self, start=None, end=None):
+        """Отрезки периода с неизменной конфигурацией владельца"""
+        return self._split(start or self.start, end or self.end, self._version_boundaries, self.owner_config_at)
+
+
+def locate(starts, moment):
+    """Индекс отрезка по отсортированным началам отрезков"""
+    return max(bisect_right(starts, moment) - 1, 0)
@@ -0,0 +1,70 @@
+# salary_config/management/commands/benchmark_salary.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from salary_config import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и число запросов расчета зарплат на синтетических данных '
+        '(во временной тестовой БД) и сохраняет отчет JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default=','.join(str(size) for size in benchmark.DEFAULT_SIZES),
+            help='Количества заказов через запятую'
+        )
+        parser.add_argument('--employees', type=int, default=50, help='Количество сотрудников')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора данных')
+        parser.add_argument('--repeat', type=int, default=3, help='Прогонов каждого замера (берется лучший)')
+        parser.add_argument(
+            '--only',
+            help='Замеры через запятую: ' + ', '.join(benchmark.BENCHMARKS)
+        )
+        parser.add_argument('--output', help='Файл для отчета JSON')
+        parser.add_argument('--compare', help='Отчет JSON предыдущего прогона для сравнения')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('Размеры задаются целыми числами через запятую')
+        names = set(options['only'].split(',')) if options['only'] else None
+        if names and not names <= set(benchmark.BENCHMARKS):
+            raise CommandError(f'Неизвестные замеры: {", ".join(sorted(names - set(benchmark.BENCHMARKS)))}')
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+
+        def progress(size, name, values):
+            self.stdout.write(f'{size:>7} заказов  {name:<18} {values["seconds"]:>9.4f} с  {values["queries"]:>5} запросов')
+
+        # Рабочая БД не затрагивается: данные создаются во временной тестовой БД
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            report = benchmark.run(
+                sizes, options['employees'], options['seed'], options['repeat'], names, progress
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Отчет сохранен в {options["output"]}'))
+
+        if previous:
+            self.stdout.write('Сравнение с предыдущим отчетом:')
+            for size, name, old, new in benchmark.compare(previous, report):
+                self.stdout.write(
+                    f'{size:>7} заказов  {name:<18} '
+                    f'{old["seconds"]:.4f} -> {new["seconds"]:.4f} с, '
+                    f'{old["queries"]} -> {new["queries"]} запросов'
+                )
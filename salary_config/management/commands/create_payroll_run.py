@@ -0,0 +1,43 @@
+# salary_config/management/commands/create_payroll_run.py
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from salary_config import payroll
+
+
+class Command(BaseCommand):
+    help = 'Создает ведомость зарплат за период (и при необходимости утверждает ее)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', required=True, help='Начало периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--end-date', required=True, help='Конец периода (ГГГГ-ММ-ДД)')
+        parser.add_argument(
+            '--approve',
+            action='store_true',
+            help='Сразу утвердить ведомость и закрыть период',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Неверный формат даты. Используйте ГГГГ-ММ-ДД.')
+        if start_date > end_date:
+            raise CommandError('Начало периода позже окончания')
+
+        run = payroll.create_run(start_date, end_date)
+        self.stdout.write(f'Ведомость #{run.pk}: {run.lines.count()} сотрудников, итого {run.total}')
+
+        if options['approve']:
+            try:
+                with transaction.atomic():
+                    payroll.approve(run)
+            except IntegrityError:
+                self.stdout.write(self.style.ERROR('Период уже закрыт другой ведомостью'))
+                return
+            self.stdout.write(self.style.SUCCESS(f'Период {start_date} - {end_date} закрыт'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Черновик ведомости создан'))
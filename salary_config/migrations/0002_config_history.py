@@ -0,0 +1,93 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+ROLE_MODELS = (
+    ('manager_config', 'ManagerSalaryConfig'),
+    ('installer_config', 'InstallerSalaryConfig'),
+    ('owner_config', 'OwnerSalaryConfig'),
+)
+
+
+def create_initial_history(apps, schema_editor):
+    """Текущие конфигурации и назначения становятся первыми версиями без нижней границы"""
+    SalaryConfig = apps.get_model('salary_config', 'SalaryConfig')
+    SalaryConfigVersion = apps.get_model('salary_config', 'SalaryConfigVersion')
+    UserSalaryAssignment = apps.get_model('salary_config', 'UserSalaryAssignment')
+    SalaryAssignmentPeriod = apps.get_model('salary_config', 'SalaryAssignmentPeriod')
+
+    role_data = {}
+    for relation, model_name in ROLE_MODELS:
+        model = apps.get_model('salary_config', model_name)
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key and not field.is_relation
+        ]
+        for role_config in model.objects.all():
+            role_data.setdefault(role_config.config_id, {})[relation] = {
+                field.name: str(getattr(role_config, field.attname)) for field in fields
+            }
+
+    SalaryConfigVersion.objects.bulk_create([
+        SalaryConfigVersion(
+            config_id=config.pk,
+            name=config.name,
+            is_active=config.is_active,
+            data=role_data.get(config.pk, {}),
+        )
+        for config in SalaryConfig.objects.all()
+    ])
+    SalaryAssignmentPeriod.objects.bulk_create([
+        SalaryAssignmentPeriod(user_id=user_id, config_id=config_id)
+        for user_id, config_id in UserSalaryAssignment.objects.values_list('user_id', 'config_id')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary_config', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalaryConfigVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название конфигурации')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('data', models.JSONField(default=dict, verbose_name='Настройки ролей')),
+                ('valid_from', models.DateTimeField(blank=True, null=True, verbose_name='Действует с')),
+                ('valid_to', models.DateTimeField(blank=True, null=True, verbose_name='Действует по')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='salary_config.salaryconfig', verbose_name='Конфигурация')),
+            ],
+            options={
+                'verbose_name': 'Версия конфигурации зарплат',
+                'verbose_name_plural': 'Версии конфигураций зарплат',
+                'ordering': ['config', 'id'],
+                'indexes': [models.Index(fields=['config', 'valid_from'], name='salary_version_config_from')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalaryAssignmentPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valid_from', models.DateTimeField(blank=True, null=True, verbose_name='Действует с')),
+                ('valid_to', models.DateTimeField(blank=True, null=True, verbose_name='Действует по')),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment_periods', to='salary_config.salaryconfig', verbose_name='Конфигурация зарплаты')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='salary_assignment_periods', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Период назначения зарплаты',
+                'verbose_name_plural': 'Периоды назначений зарплат',
+                'ordering': ['user', 'id'],
+                'indexes': [models.Index(fields=['user', 'valid_from'], name='salary_period_user_from')],
+            },
+        ),
+        migrations.RunPython(create_initial_history, migrations.RunPython.noop),
+    ]
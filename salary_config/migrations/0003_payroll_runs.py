@@ -0,0 +1,61 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:39
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary_config', '0002_config_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('period_end', models.DateField(verbose_name='Конец периода')),
+                ('status', models.CharField(choices=[('draft', 'Черновик'), ('approved', 'Утверждена')], default='draft', max_length=20, verbose_name='Статус')),
+                ('inputs_hash', models.CharField(max_length=64, verbose_name='Хеш входных данных')),
+                ('config_versions', models.JSONField(default=list, verbose_name='Версии конфигураций')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Итого')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('approved_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата утверждения')),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_payroll_runs', to=settings.AUTH_USER_MODEL, verbose_name='Утверждено пользователем')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_payroll_runs', to=settings.AUTH_USER_MODEL, verbose_name='Создано пользователем')),
+            ],
+            options={
+                'verbose_name': 'Ведомость зарплат',
+                'verbose_name_plural': 'Ведомости зарплат',
+                'ordering': ['-period_start', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PayrollRunLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=20, verbose_name='Роль')),
+                ('total_salary', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Итого')),
+                ('result', models.JSONField(default=dict, verbose_name='Результат расчета')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='salary_config.payrollrun', verbose_name='Ведомость')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_lines', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Строка ведомости',
+                'verbose_name_plural': 'Строки ведомостей',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrunline',
+            constraint=models.UniqueConstraint(fields=('run', 'user'), name='unique_payroll_run_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'approved')), fields=('period_start', 'period_end'), name='unique_approved_payroll_period'),
+        ),
+    ]
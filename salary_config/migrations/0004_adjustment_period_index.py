@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-19 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary_config', '0003_payroll_runs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salaryadjustment',
+            index=models.Index(fields=['user', 'period_start', 'period_end'], name='salary_adj_user_period'),
+        ),
+    ]
@@ -211,6 +211,60 @@ class UserSalaryAssignment(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.config.name}"
 
+class SalaryConfigVersion(models.Model):
+    """Версия конфигурации зарплаты с периодом действия"""
+    config = models.ForeignKey(
+        SalaryConfig,
+        on_delete=models.CASCADE,
+        related_name='versions',
+        verbose_name="Конфигурация"
+    )
+    name = models.CharField(max_length=100, verbose_name="Название конфигурации")
+    is_active = models.BooleanField(default=True, verbose_name="Активна")
+    data = models.JSONField(default=dict, verbose_name="Настройки ролей")
+    valid_from = models.DateTimeField(null=True, blank=True, verbose_name="Действует с")
+    valid_to = models.DateTimeField(null=True, blank=True, verbose_name="Действует по")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    
+    class Meta:
+        verbose_name = "Версия конфигурации зарплат"
+        verbose_name_plural = "Версии конфигураций зарплат"
+        ordering = ['config', 'id']
+        indexes = [
+            models.Index(fields=['config', 'valid_from'], name='salary_version_config_from'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.valid_from or '...'} - {self.valid_to or '...'})"
+
+class SalaryAssignmentPeriod(models.Model):
+    """Период действия назначения конфигурации пользователю"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='salary_assignment_periods',
+        verbose_name="Пользователь"
+    )
+    config = models.ForeignKey(
+        SalaryConfig,
+        on_delete=models.CASCADE,
+        related_name='assignment_periods',
+        verbose_name="Конфигурация зарплаты"
+    )
+    valid_from = models.DateTimeField(null=True, blank=True, verbose_name="Действует с")
+    valid_to = models.DateTimeField(null=True, blank=True, verbose_name="Действует по")
+    
+    class Meta:
+        verbose_name = "Период назначения зарплаты"
+        verbose_name_plural = "Периоды назначений зарплат"
+        ordering = ['user', 'id']
+        indexes = [
+            models.Index(fields=['user', 'valid_from'], name='salary_period_user_from'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} - {self.config.name} ({self.valid_from or '...'} - {self.valid_to or '...'})"
+
 class SalaryAdjustment(models.Model):
     """Корректировки зарплаты (премии, штрафы)"""
     ADJUSTMENT_TYPES = (
@@ -251,6 +305,83 @@ class SalaryAdjustment(models.Model):
         verbose_name = "Корректировка зарплаты"
         verbose_name_plural = "Корректировки зарплат"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'period_start', 'period_end'], name='salary_adj_user_period'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_adjustment_type_display()} {self.amount} для {self.user.get_full_name()}"
+class PayrollRun(models.Model):
+    """Ведомость зарплат: замороженный расчет всех сотрудников за период"""
+    STATUS_CHOICES = (
+        ('draft', 'Черновик'),
+        ('approved', 'Утверждена'),
+    )
+    
+    period_start = models.DateField(verbose_name="Начало периода")
+    period_end = models.DateField(verbose_name="Конец периода")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name="Статус")
+    inputs_hash = models.CharField(max_length=64, verbose_name="Хеш входных данных")
+    config_versions = models.JSONField(default=list, verbose_name="Версии конфигураций")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name="Итого")
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='created_payroll_runs',
+        verbose_name="Создано пользователем"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    approved_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='approved_payroll_runs',
+        verbose_name="Утверждено пользователем"
+    )
+    approved_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата утверждения")
+    
+    class Meta:
+        verbose_name = "Ведомость зарплат"
+        verbose_name_plural = "Ведомости зарплат"
+        ordering = ['-period_start', '-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period_start', 'period_end'],
+                condition=models.Q(status='approved'),
+                name='unique_approved_payroll_period'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Ведомость {self.period_start} - {self.period_end} ({self.get_status_display()})"
+
+class PayrollRunLine(models.Model):
+    """Строка ведомости: результат расчета одного сотрудника"""
+    run = models.ForeignKey(
+        PayrollRun,
+        on_delete=models.CASCADE,
+        related_name='lines',
+        verbose_name="Ведомость"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='payroll_lines',
+        verbose_name="Сотрудник"
+    )
+    role = models.CharField(max_length=20, verbose_name="Роль")
+    total_salary = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Итого")
+    result = models.JSONField(default=dict, verbose_name="Результат расчета")
+    
+    class Meta:
+        verbose_name = "Строка ведомости"
+        verbose_name_plural = "Строки ведомостей"
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'user'], name='unique_payroll_run_user'),
+        ]
     
     def __str__(self):
-        return f"{self.get_adjustment_type_display()} {self.amount} для {self.user.get_full_name()}"
\ No newline at end of file
+        return f"{self.user} - {self.total_salary}"
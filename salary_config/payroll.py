@@ -0,0 +1,285 @@
+# salary_config/payroll.py
+"""
+Ведомости зарплат (PayrollRun).
+
+Ведомость замораживает результаты расчета всех сотрудников за период вместе
+с хешем входных данных и версиями конфигураций. Утвержденная ведомость
+закрывает период: расчеты за него отдаются из снимка без пересчета.
+Сверка сначала сравнивает хеш входных данных (несколько легких запросов)
+и пересчитывает период, только если данные после утверждения менялись.
+"""
+import hashlib
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from events import outbox
+from finance.models import SalaryPayment, Transaction
+from orders.models import Order, OrderItem
+from user_accounts.models import User
+from .models import (
+    PayrollRun, PayrollRunLine, SalaryAdjustment,
+    SalaryAssignmentPeriod, SalaryConfigVersion
+)
+from .dataset import StaffDataset
+from .services import SalaryCalculationService
+
+_CENT = Decimal('0.01')
+
+# Выплаты по ведомости: payments и transactions вставлены пакетом (без сигналов post_save)
+salary_paid = Signal()
+
+
+def period_bounds(period_start, period_end):
+    """Границы периода ведомости (даты включительно) в часовом поясе проекта"""
+    return (
+        timezone.make_aware(datetime.combine(period_start, time.min)),
+        timezone.make_aware(datetime.combine(period_end, time.max)),
+    )
+
+
+def freeze(value):
+    """Результат расчета в JSON без потери точности Decimal"""
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    if isinstance(value, dict):
+        return {key: freeze(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [freeze(item) for item in value]
+    return value
+
+
+def thaw(value):
+    """Обратное преобразование freeze"""
+    if isinstance(value, dict):
+        if set(value) == {'$decimal'}:
+            return Decimal(value['$decimal'])
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _overlapping(queryset, start, end):
+    return queryset.filter(
+        Q(valid_from__isnull=True) | Q(valid_from__lte=end),
+        Q(valid_to__isnull=True) | Q(valid_to__gt=start),
+    )
+
+
+def config_versions(start, end):
+    """Версии конфигураций, действовавшие в периоде"""
+    return sorted(
+        _overlapping(SalaryConfigVersion.objects.all(), start, end).values_list('id', flat=True)
+    )
+
+
+def inputs_hash(period_start, period_end):
+    """
+    Отпечаток всех данных, от которых зависит расчет периода: завершенные
+    заказы, их монтажники и позиции, корректировки, сотрудники и история
+    конфигураций. Любая поздняя правка меняет хеш.
+    """
+    start, end = period_bounds(period_start, period_end)
+    orders = Order.objects.filter(status='completed', completed_at__gte=start, completed_at__lte=end)
+    parts = [
+        list(orders.order_by('id').values_list('id', 'manager_id', 'completed_at', 'total_cost')),
+        list(Order.installers.through.objects.filter(order__in=orders)
+             .order_by('order_id', 'user_id').values_list('order_id', 'user_id')),
+        list(OrderItem.objects.filter(order__in=orders).order_by('id').values_list(
+            'id', 'order_id', 'seller_id', 'service__category', 'price',
+            'cost_price_at_sale', 'service__cost_price'
+        )),
+        list(SalaryAdjustment.objects.filter(
+            period_start__lte=end, period_end__gte=start
+        ).order_by('id').values_list('id', 'user_id', 'amount')),
+        list(User.objects.filter(role__in=['manager', 'installer', 'owner'])
+             .order_by('id').values_list('id', 'role', 'is_active')),
+        list(_overlapping(SalaryAssignmentPeriod.objects.all(), start, end)
+             .order_by('id').values_list('id', 'user_id', 'config_id', 'valid_to')),
+        config_versions(start, end),
+    ]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def calculate_period(period_start, period_end):
+    """
+    Свежий расчет периода: [(сотрудник, результат)] в порядке id.
+    Доля прибыли одна на компанию, поэтому строка владельца одна -
+    у SalaryCalculationService.get_owner_user(); неактивные сотрудники пропускаются.
+    Данные сотрудников читаются один раз в StaffDataset и считаются движком
+    в памяти, поэтому число запросов не зависит от числа сотрудников.
+    """
+    start, end = period_bounds(period_start, period_end)
+    dataset = StaffDataset(start, end)
+    staff = SalaryCalculationService.calculate_staff_salaries(start, end, dataset)
+    results = [(user, staff[user.id]) for user in dataset.staff]
+    owner = SalaryCalculationService.get_owner_user()
+    if owner is not None:
+        results.append((owner, SalaryCalculationService.calculate_owner_salary(start, end, dataset=dataset)))
+    results.sort(key=lambda item: item[0].id)
+    return results
+
+
+def create_run(period_start, period_end, created_by=None):
+    """Черновик ведомости с замороженными результатами расчета"""
+    start, end = period_bounds(period_start, period_end)
+    with transaction.atomic():
+        # Хеш и расчет в одной транзакции - снимок соответствует хешу
+        digest = inputs_hash(period_start, period_end)
+        results = calculate_period(period_start, period_end)
+        run = PayrollRun.objects.create(
+            period_start=period_start,
+            period_end=period_end,
+            inputs_hash=digest,
+            config_versions=config_versions(start, end),
+            total=sum((result['total_salary'] for _, result in results), Decimal('0.00')),
+            created_by=created_by,
+        )
+        PayrollRunLine.objects.bulk_create([
+            PayrollRunLine(
+                run=run,
+                user=user,
+                role=user.role,
+                total_salary=result['total_salary'],
+                result=freeze(result),
+            )
+            for user, result in results
+        ])
+    return run
+
+
+def approve(run, approved_by=None):
+    """Утверждает ведомость и тем самым закрывает период"""
+    if run.status == 'approved':
+        return run
+    run.status = 'approved'
+    run.approved_by = approved_by
+    run.approved_at = timezone.now()
+    run.save(update_fields=['status', 'approved_by', 'approved_at'])
+    return run
+
+
+def pay(run):
+    """
+    Выплаты по утвержденной ведомости: SalaryPayment и расходная Transaction
+    каждому сотруднику одним атомарным пакетом. Тем, кому за этот период
+    уже выплачено, повторно не платится - повтор запроса безопасен.
+    Проводки попадают в outbox, производные данные (сводки дня, метрики)
+    обновляют обработчики сигнала salary_paid.
+    """
+    if run.status != 'approved':
+        raise ValueError('Выплаты возможны только по утвержденной ведомости')
+    
+    with transaction.atomic():
+        lines = list(run.lines.select_related('user').filter(total_salary__gt=0).order_by('user_id'))
+        paid = set(SalaryPayment.objects.filter(
+            user_id__in=[line.user_id for line in lines],
+            period_start=run.period_start,
+            period_end=run.period_end
+        ).values_list('user_id', flat=True))
+        lines = [line for line in lines if line.user_id not in paid]
+        
+        payments = SalaryPayment.objects.bulk_create([
+            SalaryPayment(
+                user=line.user,
+                amount=line.total_salary,
+                period_start=run.period_start,
+                period_end=run.period_end,
+                payroll_run=run,
+            )
+            for line in lines
+        ])
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                type='expense',
+                kind='salary',
+                amount=line.total_salary,
+                description=f'Выплата зарплаты {line.user.get_full_name()} за период {run.period_start} - {run.period_end}',
+                order=None,
+            )
+            for line in lines
+        ])
+        if payments:
+            outbox.record_created(transactions)
+            salary_paid.send(sender=PayrollRun, run=run, payments=payments, transactions=transactions)
+    return {
+        'created': len(lines),
+        'skipped': sorted(paid),
+        'total': sum((line.total_salary for line in lines), Decimal('0.00')),
+    }
+
+
+def get_approved_run(period_start, period_end):
+    return PayrollRun.objects.filter(
+        status='approved', period_start=period_start, period_end=period_end
+    ).first()
+
+
+def get_snapshot_result(period_start, period_end, user=None):
+    """
+    Результат сотрудника из утвержденной ведомости за период (или None).
+    Без user - результат владельца.
+    """
+    lines = PayrollRunLine.objects.filter(
+        run__status='approved',
+        run__period_start=period_start,
+        run__period_end=period_end,
+    )
+    lines = lines.filter(user=user) if user is not None else lines.filter(role='owner')
+    line = lines.first()
+    if line is None:
+        return None
+    result = thaw(line.result)
+    result['payroll_run_id'] = line.run_id
+    return result
+
+
+def get_snapshot_results(period_start, period_end):
+    """{user_id: результат} из утвержденной ведомости за период (или None)"""
+    run = get_approved_run(period_start, period_end)
+    if run is None:
+        return None
+    results = {}
+    for line in run.lines.all():
+        results[line.user_id] = thaw(line.result)
+        results[line.user_id]['payroll_run_id'] = run.pk
+    return results
+
+
+def diff(run):
+    """
+    Сверка ведомости с актуальными данными. Если хеш входных данных
+    не изменился, пересчет не выполняется.
+    """
+    current_hash = inputs_hash(run.period_start, run.period_end)
+    if current_hash == run.inputs_hash:
+        return {'inputs_changed': False, 'lines': [], 'total_delta': Decimal('0.00')}
+
+    snapshot = {line.user_id: line for line in run.lines.select_related('user')}
+    fresh = {user.id: (user, result) for user, result in calculate_period(run.period_start, run.period_end)}
+
+    lines = []
+    for user_id in sorted(set(snapshot) | set(fresh)):
+        line = snapshot.get(user_id)
+        user, result = fresh.get(user_id, (line.user if line else None, None))
+        before = line.total_salary if line else Decimal('0.00')
+        after = result['total_salary'].quantize(_CENT) if result else Decimal('0.00')
+        if before == after:
+            continue
+        lines.append({
+            'user_id': user_id,
+            'user_name': user.get_full_name() or user.username,
+            'snapshot_total': before,
+            'current_total': after,
+            'delta': after - before,
+        })
+    return {
+        'inputs_changed': True,
+        'lines': lines,
+        'total_delta': sum((line['delta'] for line in lines), Decimal('0.00')),
+    }
@@ -0,0 +1,190 @@
+# salary_config/resolver.py
+"""
+Разрешение текущих конфигураций зарплат без запросов к БД.
+
+Все активные конфигурации (вместе с настройками ролей) и все назначения
+загружаются одним снимком. Снимок неизменяемый и привязан к номеру версии:
+сигналы увеличивают версию при любом изменении конфигураций, их настроек
+или назначений, и следующий расчет перечитывает снимок. Версия хранится
+в процессе (видна сразу) и в кеше SALARY_CONFIG_CACHE_ALIAS (видна остальным
+процессам, если бэкенд общий). Снимок старше SALARY_CONFIG_MAX_AGE секунд
+перечитывается в любом случае - на случай кеша, не общего для процессов.
+
+Снимок отвечает только на вопрос "какая конфигурация действует сейчас".
+Расчет зарплаты за период берет конфигурации на момент заказов из истории
+(history.Timeline) и делает для этого свои запросы.
+
+Объекты SalaryConfig из снимка общие для всех потоков - их нельзя изменять.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import connection, transaction
+
+VERSION_CACHE_KEY = 'salary_config:version'
+
+_lock = threading.Lock()
+_state = threading.local()
+_local_version = 0
+_snapshot = None
+
+
+class ConfigSnapshot:
+    """Неизменяемый снимок конфигураций и назначений"""
+    __slots__ = (
+        'version', 'context', 'configs', 'assignments', 'default_config_id', 'owner_config_id', 'loaded_at'
+    )
+
+    def __init__(self, version, context, configs, assignments, default_config_id, owner_config_id):
+        object.__setattr__(self, 'loaded_at', time.monotonic())
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'context', context)
+        object.__setattr__(self, 'configs', MappingProxyType(configs))
+        object.__setattr__(self, 'assignments', MappingProxyType(assignments))
+        object.__setattr__(self, 'default_config_id', default_config_id)
+        object.__setattr__(self, 'owner_config_id', owner_config_id)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Снимок конфигураций неизменяем')
+
+    def config_for_user(self, user_id):
+        """Персональная активная конфигурация, иначе конфигурация по умолчанию"""
+        config_id = self.assignments.get(user_id)
+        if config_id in self.configs:
+            return self.configs[config_id]
+        return self.configs.get(self.default_config_id)
+
+    @property
+    def owner_config(self):
+        return self.configs.get(self.owner_config_id)
+
+
+def _cache():
+    alias = getattr(settings, 'SALARY_CONFIG_CACHE_ALIAS', 'default')
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _max_age():
+    return getattr(settings, 'SALARY_CONFIG_MAX_AGE', 300)
+
+
+def _shared_version():
+    try:
+        return _cache().get(VERSION_CACHE_KEY, 0)
+    except Exception:
+        return 0
+
+
+def _bump_shared_version():
+    cache = _cache()
+    try:
+        if not cache.add(VERSION_CACHE_KEY, 1, None):
+            cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+def current_version():
+    return (_local_version, _shared_version())
+
+
+def _dirty_context():
+    """
+    Открытые блоки транзакции, в которой менялись конфигурации (или None).
+    Снимок, прочитанный внутри такой транзакции, действителен только в ней:
+    после отката он не должен попасть в другие расчеты.
+    """
+    blocks = getattr(_state, 'dirty_blocks', None)
+    if not blocks:
+        return None
+    current = connection.atomic_blocks
+    if len(current) >= len(blocks) and all(a is b for a, b in zip(blocks, current)):
+        return blocks
+    _state.dirty_blocks = None
+    return None
+
+
+def _after_commit():
+    global _local_version
+    _state.dirty_blocks = None
+    with _lock:
+        _local_version += 1
+    _bump_shared_version()
+
+
+def bump_version():
+    """
+    Помечает снимок устаревшим: в процессе - сразу, для остальных процессов -
+    после фиксации транзакции, чтобы они не перечитали незафиксированные данные.
+    """
+    global _local_version
+    with _lock:
+        _local_version += 1
+    if connection.in_atomic_block:
+        if _dirty_context() is None:
+            _state.dirty_blocks = tuple(connection.atomic_blocks)
+        transaction.on_commit(_after_commit)
+    else:
+        _bump_shared_version()
+
+
+def _load(version, context):
+    from .models import SalaryConfig, UserSalaryAssignment
+
+    configs = {}
+    default_config_id = None
+    owner_config_id = None
+    # Порядок как у SalaryConfig.objects.filter(...).first(): сначала новые
+    for config in SalaryConfig.objects.filter(is_active=True).select_related(
+        'manager_config', 'installer_config', 'owner_config'
+    ):
+        # Подгружаем отсутствующие настройки ролей в кеш связей, чтобы hasattr не ходил в БД
+        for relation in ('manager_config', 'installer_config', 'owner_config'):
+            hasattr(config, relation)
+        configs[config.pk] = config
+        if default_config_id is None and 'по умолчанию' in config.name.lower():
+            default_config_id = config.pk
+        if owner_config_id is None and hasattr(config, 'owner_config'):
+            owner_config_id = config.pk
+
+    assignments = dict(UserSalaryAssignment.objects.values_list('user_id', 'config_id'))
+    return ConfigSnapshot(version, context, configs, assignments, default_config_id, owner_config_id)
+
+
+def _is_current(snapshot, version, context):
+    return (
+        snapshot is not None and
+        snapshot.version == version and
+        snapshot.context is context and
+        time.monotonic() - snapshot.loaded_at <= _max_age()
+    )
+
+
+def get_snapshot():
+    """Актуальный снимок; перечитывается после изменения версии или по возрасту"""
+    global _snapshot
+    version = current_version()
+    context = _dirty_context()
+    snapshot = _snapshot
+    if _is_current(snapshot, version, context):
+        return snapshot
+    with _lock:
+        if _is_current(_snapshot, version, context):
+            return _snapshot
+        _snapshot = _load(version, context)
+        return _snapshot
+
+
+def get_user_config(user_id):
+    return get_snapshot().config_for_user(user_id)
+
+
+def get_owner_config():
+    return get_snapshot().owner_config
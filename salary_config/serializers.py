@@ -89,9 +89,11 @@ class SalaryCalculationSerializer(serializers.Serializer):
     total_cost_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     gross_profit = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     estimated_staff_payments = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    staff_payments_breakdown = serializers.ListField(required=False)
     remaining_profit = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     owner_profit_share = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     
     # Общие поля
     adjustments = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
-    adjustments_details = serializers.ListField(required=False)
\ No newline at end of file
+    adjustments_details = serializers.ListField(required=False)
+    config_periods = serializers.ListField(required=False)
\ No newline at end of file
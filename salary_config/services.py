@@ -6,11 +6,14 @@ from django.utils import timezone
 from typing import Dict, Optional
 
 from user_accounts.models import User
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, item_cost, item_profit, money
 from .models import (
     SalaryConfig, ManagerSalaryConfig, InstallerSalaryConfig, 
     OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment
 )
+from . import engine, history, resolver
+from .dataset import AdjustmentIndex, StaffDataset
+from .engine import LEGACY_CONFIG_NAME, MANAGER_CATEGORY_PERCENTAGES, SegmentFacts
 
 def _parse_date_param(date_param):
     """Вспомогательная функция для парсинга параметров даты"""
@@ -33,31 +36,20 @@ class SalaryCalculationService:
     
     @staticmethod
     def get_user_salary_config(user: User) -> Optional[SalaryConfig]:
-        """Получает конфигурацию зарплаты для пользователя"""
-        try:
-            assignment = UserSalaryAssignment.objects.get(user=user)
-            if assignment.config.is_active:
-                return assignment.config
-        except UserSalaryAssignment.DoesNotExist:
-            pass
-        
-        # Если нет персональной конфигурации, ищем активную по умолчанию
-        try:
-            return SalaryConfig.objects.filter(
-                is_active=True,
-                name__icontains='по умолчанию'
-            ).first()
-        except SalaryConfig.DoesNotExist:
-            return None
+        """
+        Получает конфигурацию зарплаты для пользователя: персональную активную,
+        иначе активную по умолчанию. Берется из снимка resolver без запросов к БД.
+        """
+        return resolver.get_user_config(user.pk)
     
     @staticmethod
-    def calculate_installer_salary(
-        installer: User, 
-        start_date: datetime = None, 
-        end_date: datetime = None
-    ) -> Dict:
-        """Расчет зарплаты монтажника с учетом настроек"""
-        # Парсим и нормализуем даты
+    def get_owner_user() -> Optional[User]:
+        """Владелец, которому начисляется доля прибыли: первый активный по id"""
+        return User.objects.filter(role='owner', is_active=True).order_by('id').first()
+    
+    @staticmethod
+    def _period_bounds(start_date, end_date):
+        """Нормализует границы расчетного периода (по умолчанию - текущий месяц)"""
         start_date = _parse_date_param(start_date)
         end_date = _parse_date_param(end_date)
         
@@ -66,68 +58,88 @@ class SalaryCalculationService:
             start_date = timezone.make_aware(datetime(today.year, today.month, 1))
         if not end_date:
             end_date = timezone.now()
-        
-        # Получаем конфигурацию зарплаты
-        config = SalaryCalculationService.get_user_salary_config(installer)
-        if not config or not hasattr(config, 'installer_config'):
-            # Возвращаем расчет по старой логике, если нет настроек
-            return SalaryCalculationService._legacy_installer_calculation(
-                installer, start_date, end_date
-            )
-        
-        installer_config = config.installer_config
-        
-        # Завершенные заказы за период
-        completed_orders = Order.objects.filter(
-            installers=installer,
-            status='completed',
-            completed_at__gte=start_date,
-            completed_at__lte=end_date
-        )
-        
-        # Базовая оплата за монтажи
-        installation_pay = installer_config.payment_per_installation * completed_orders.count()
+        return start_date, end_date
+    
+    @staticmethod
+    def _adjustments(user, start_date, end_date, index=None):
+        """
+        Сумма и детали корректировок за период. index - заранее загруженный
+        AdjustmentIndex (пакетные расчеты), иначе один запрос по сотруднику.
+        """
+        if index is None:
+            index = AdjustmentIndex.load(start_date, end_date, [user.pk])
+        adjustments = index.overlapping(user.pk, start_date, end_date)
+        details = [
+            {
+                'type': adj.get_adjustment_type_display(),
+                'amount': adj.amount,
+                'reason': adj.reason
+            } for adj in adjustments
+        ]
+        return sum((adj.amount for adj in adjustments), Decimal('0.00')), details
+    
+    @staticmethod
+    def calculate_installer_salary(
+        installer: User, 
+        start_date: datetime = None, 
+        end_date: datetime = None,
+        adjustment_index: AdjustmentIndex = None
+    ) -> Dict:
+        """
+        Расчет зарплаты монтажника с учетом настроек, действовавших
+        на момент завершения каждого заказа
+        """
+        start_date, end_date = SalaryCalculationService._period_bounds(start_date, end_date)
+        
+        segments = history.Timeline([installer.pk], start_date, end_date).segments(installer.pk)
+        starts = [segment.start for segment in segments]
+        facts = [SegmentFacts() for _ in segments]
+        
+        # Завершенные заказы за период, разложенные по отрезкам
+        order_segments = {
+            order_id: history.locate(starts, completed_at)
+            for order_id, completed_at in Order.objects.filter(
+                installers=installer,
+                status='completed',
+                completed_at__gte=start_date,
+                completed_at__lte=end_date
+            ).values_list('id', 'completed_at')
+        }
+        for index in order_segments.values():
+            facts[index].orders_count += 1
         
         # Дополнительные услуги, проданные монтажником
-        additional_services = OrderItem.objects.filter(
-            order__in=completed_orders,
+        for row in OrderItem.objects.filter(
+            order_id__in=list(order_segments),
             service__category='additional',
             seller=installer
-        )
-        
-        # Процент с прибыли от дополнительных услуг
-        additional_pay = Decimal('0.00')
-        for item in additional_services:
-            profit = item.price - item.service.cost_price
-            additional_pay += profit * (installer_config.additional_services_profit_percentage / 100)
+        ).values('order_id').annotate(profit=Sum(item_profit()), count=Count('id')):
+            facts[order_segments[row['order_id']]].add_sales(
+                'additional', row['count'], money(row['profit'])
+            )
         
-        # Получаем корректировки за период
-        adjustments = SalaryAdjustment.objects.filter(
-            user=installer,
-            period_start__lte=end_date,
-            period_end__gte=start_date
+        return SalaryCalculationService._installer_result(
+            installer, list(zip(segments, facts)), start_date, end_date, adjustment_index
         )
-        
-        total_adjustments = sum(adj.amount for adj in adjustments)
-        
-        # Общая зарплата
-        total_salary = installation_pay + additional_pay + total_adjustments
+    
+    @staticmethod
+    def _installer_result(installer, parts, start_date, end_date, adjustment_index=None) -> Dict:
+        """Результат монтажника по фактам отрезков: parts - [(отрезок, SegmentFacts)]"""
+        total_adjustments, adjustments_details = SalaryCalculationService._adjustments(
+            installer, start_date, end_date, adjustment_index
+        )
+        cost = SalaryCalculationService._installer_cost(parts, total_adjustments)
         
         return {
-            'config_name': config.name,
-            'installation_pay': installation_pay,
-            'installation_count': completed_orders.count(),
-            'additional_pay': additional_pay,
-            'additional_services_count': additional_services.count(),
-            'adjustments': total_adjustments,
-            'adjustments_details': [
-                {
-                    'type': adj.get_adjustment_type_display(),
-                    'amount': adj.amount,
-                    'reason': adj.reason
-                } for adj in adjustments
-            ],
-            'total_salary': total_salary,
+            'config_name': cost['config_name'],
+            'installation_pay': cost['orders_pay'],
+            'installation_count': cost['orders_count'],
+            'additional_pay': cost['sales_pay'],
+            'additional_services_count': cost['sales_count'],
+            'adjustments': cost['adjustments'],
+            'adjustments_details': adjustments_details if cost['configured'] else [],
+            'config_periods': cost['config_periods'],
+            'total_salary': cost['total_salary'],
             'period': f"{start_date.date()} - {end_date.date()}"
         }
     
@@ -135,147 +147,105 @@ class SalaryCalculationService:
     def calculate_manager_salary(
         manager: User, 
         start_date: datetime = None, 
-        end_date: datetime = None
+        end_date: datetime = None,
+        adjustment_index: AdjustmentIndex = None
     ) -> Dict:
-        """Расчет зарплаты менеджера с учетом настроек"""
-        # Парсим и нормализуем даты
-        start_date = _parse_date_param(start_date)
-        end_date = _parse_date_param(end_date)
-        
-        if not start_date:
-            today = timezone.now()
-            start_date = timezone.make_aware(datetime(today.year, today.month, 1))
-        if not end_date:
-            end_date = timezone.now()
+        """
+        Расчет зарплаты менеджера с учетом настроек, действовавших
+        на момент завершения каждого заказа
+        """
+        start_date, end_date = SalaryCalculationService._period_bounds(start_date, end_date)
+        
+        segments = history.Timeline([manager.pk], start_date, end_date).segments(manager.pk)
+        starts = [segment.start for segment in segments]
+        facts = [SegmentFacts() for _ in segments]
+        
+        # Завершенные заказы за период, разложенные по отрезкам
+        order_segments = {
+            order_id: history.locate(starts, completed_at)
+            for order_id, completed_at in Order.objects.filter(
+                manager=manager,
+                status='completed',
+                completed_at__gte=start_date,
+                completed_at__lte=end_date
+            ).values_list('id', 'completed_at')
+        }
+        for index in order_segments.values():
+            facts[index].orders_count += 1
         
-        # Получаем конфигурацию зарплаты
-        config = SalaryCalculationService.get_user_salary_config(manager)
-        if not config or not hasattr(config, 'manager_config'):
-            # Возвращаем расчет по старой логике, если нет настроек
-            return SalaryCalculationService._legacy_manager_calculation(
-                manager, start_date, end_date
+        # Прибыль проданных менеджером позиций по отрезкам и категориям
+        for row in OrderItem.objects.filter(
+            order_id__in=list(order_segments),
+            seller=manager
+        ).values('order_id', 'service__category').annotate(profit=Sum(item_profit()), count=Count('id')):
+            facts[order_segments[row['order_id']]].add_sales(
+                row['service__category'], row['count'], money(row['profit'])
             )
         
-        manager_config = config.manager_config
-        
-        # Фиксированная зарплата
-        fixed_salary = manager_config.fixed_salary
-        
-        # Завершенные заказы за период
-        completed_orders = Order.objects.filter(
-            manager=manager,
-            status='completed',
-            completed_at__gte=start_date,
-            completed_at__lte=end_date
+        return SalaryCalculationService._manager_result(
+            manager, list(zip(segments, facts)), start_date, end_date, adjustment_index
         )
-        
-        # Бонус за завершенные заказы
-        orders_bonus = manager_config.bonus_per_completed_order * completed_orders.count()
-        
-        # Продажи по категориям
-        sales_bonus = Decimal('0.00')
-        sales_details = {}
-        
-        # Проходим по всем позициям заказов
-        order_items = OrderItem.objects.filter(
-            order__in=completed_orders,
-            seller=manager
-        ).select_related('service')
-        
-        for item in order_items:
-            profit = item.price - item.service.cost_price
-            category = item.service.category
-            
-            # Определяем процент в зависимости от категории
-            percentage = Decimal('0.00')
-            if category == 'conditioner':
-                percentage = manager_config.conditioner_profit_percentage
-            elif category == 'additional':
-                percentage = manager_config.additional_services_profit_percentage
-            elif category == 'installation':
-                percentage = manager_config.installation_profit_percentage
-            elif category == 'maintenance':
-                percentage = manager_config.maintenance_profit_percentage
-            elif category == 'dismantling':
-                percentage = manager_config.dismantling_profit_percentage
-            
-            bonus = profit * (percentage / 100)
-            sales_bonus += bonus
-            
-            # Сохраняем детали для отчета
-            if category not in sales_details:
-                sales_details[category] = {
-                    'count': 0,
-                    'profit': Decimal('0.00'),
-                    'bonus': Decimal('0.00'),
-                    'percentage': percentage
-                }
-            
-            sales_details[category]['count'] += 1
-            sales_details[category]['profit'] += profit
-            sales_details[category]['bonus'] += bonus
-        
-        # Получаем корректировки за период
-        adjustments = SalaryAdjustment.objects.filter(
-            user=manager,
-            period_start__lte=end_date,
-            period_end__gte=start_date
+    
+    @staticmethod
+    def _manager_result(manager, parts, start_date, end_date, adjustment_index=None) -> Dict:
+        """Результат менеджера по фактам отрезков: parts - [(отрезок, SegmentFacts)]"""
+        total_adjustments, adjustments_details = SalaryCalculationService._adjustments(
+            manager, start_date, end_date, adjustment_index
         )
-        
-        total_adjustments = sum(adj.amount for adj in adjustments)
-        
-        # Общая зарплата
-        total_salary = fixed_salary + orders_bonus + sales_bonus + total_adjustments
+        cost = SalaryCalculationService._manager_cost(parts, total_adjustments)
         
         return {
-            'config_name': config.name,
-            'fixed_salary': fixed_salary,
-            'orders_bonus': orders_bonus,
-            'completed_orders_count': completed_orders.count(),
-            'sales_bonus': sales_bonus,
-            'sales_details': sales_details,
-            'adjustments': total_adjustments,
-            'adjustments_details': [
-                {
-                    'type': adj.get_adjustment_type_display(),
-                    'amount': adj.amount,
-                    'reason': adj.reason
-                } for adj in adjustments
-            ],
-            'total_salary': total_salary,
+            'config_name': cost['config_name'],
+            'fixed_salary': cost['fixed_salary'],
+            'orders_bonus': cost['orders_pay'],
+            'completed_orders_count': cost['orders_count'],
+            'sales_bonus': cost['sales_pay'],
+            'sales_details': cost['sales_details'],
+            'adjustments': cost['adjustments'],
+            'adjustments_details': adjustments_details if cost['configured'] else [],
+            'config_periods': cost['config_periods'],
+            'total_salary': cost['total_salary'],
             'period': f"{start_date.date()} - {end_date.date()}"
         }
     
+    @staticmethod
+    def calculate_staff_salaries(start_date, end_date, dataset: StaffDataset = None) -> Dict:
+        """
+        {user_id: результат} всех активных менеджеров и монтажников - те же словари,
+        что calculate_manager_salary / calculate_installer_salary, но фиксированным
+        числом запросов: данные читаются один раз в StaffDataset.
+        """
+        start_date, end_date = SalaryCalculationService._period_bounds(start_date, end_date)
+        if dataset is None:
+            dataset = StaffDataset(start_date, end_date)
+        parts = dataset.parts(start_date, end_date)
+        
+        results = {}
+        for user in dataset.staff:
+            build = (
+                SalaryCalculationService._manager_result if user.role == 'manager'
+                else SalaryCalculationService._installer_result
+            )
+            results[user.id] = build(user, parts[user.id], start_date, end_date, dataset.adjustment_index)
+        return results
+    
     @staticmethod
     def calculate_owner_salary(
         start_date: datetime = None, 
-        end_date: datetime = None
+        end_date: datetime = None,
+        adjustment_index: AdjustmentIndex = None,
+        dataset: StaffDataset = None
     ) -> Dict:
-        """Расчет зарплаты владельца с учетом настроек"""
-        # Парсим и нормализуем даты
-        start_date = _parse_date_param(start_date)
-        end_date = _parse_date_param(end_date)
+        """
+        Расчет зарплаты владельца с учетом настроек.
+        dataset - уже загруженные данные сотрудников за тот же период (ведомость).
+        """
+        start_date, end_date = SalaryCalculationService._period_bounds(start_date, end_date)
         
-        if not start_date:
-            today = timezone.now()
-            start_date = timezone.make_aware(datetime(today.year, today.month, 1))
-        if not end_date:
-            end_date = timezone.now()
-        
-        # Получаем активную конфигурацию владельца
-        try:
-            config = SalaryConfig.objects.filter(
-                is_active=True,
-                owner_config__isnull=False
-            ).first()
-        except SalaryConfig.DoesNotExist:
-            config = None
-        
-        if not config or not hasattr(config, 'owner_config'):
-            # Возвращаем расчет по старой логике, если нет настроек
-            return SalaryCalculationService._legacy_owner_calculation(start_date, end_date)
-        
-        owner_config = config.owner_config
+        # Конфигурации владельца, действовавшие в периоде (без них - ставки старой логики)
+        segments = history.Timeline([], start_date, end_date).owner_segments()
+        starts = [segment.start for segment in segments]
+        facts = [SegmentFacts() for _ in segments]
         
         # Все завершенные заказы за период
         completed_orders = Order.objects.filter(
@@ -283,233 +253,134 @@ class SalaryCalculationService:
             completed_at__gte=start_date,
             completed_at__lte=end_date
         )
-        
-        # Доля с каждого монтажа
-        installation_pay = owner_config.payment_per_installation * completed_orders.count()
-        
-        # Общая выручка
-        total_revenue = OrderItem.objects.filter(
-            order__in=completed_orders
-        ).aggregate(Sum('price'))['price__sum'] or Decimal('0.00')
-        
-        # Общая себестоимость
-        total_cost_price = sum(
-            item.service.cost_price
-            for item in OrderItem.objects.filter(order__in=completed_orders)
-        )
-        
-        # Валовая прибыль
+        for completed_at in completed_orders.values_list('completed_at', flat=True):
+            facts[history.locate(starts, completed_at)].orders_count += 1
+        
+        # Выручка и себестоимость по заказам одним запросом, прибыль - по отрезкам
+        total_revenue = total_cost_price = Decimal('0.00')
+        for row in OrderItem.objects.filter(order__in=completed_orders).values(
+            'order_id', 'order__completed_at'
+        ).annotate(revenue=Sum('price'), cost=Sum(item_cost())):
+            revenue, cost = money(row['revenue']), money(row['cost'])
+            total_revenue += revenue
+            total_cost_price += cost
+            facts[history.locate(starts, row['order__completed_at'])].gross_profit += revenue - cost
         gross_profit = total_revenue - total_cost_price
         
-        # Расчет выплат сотрудникам (упрощенный)
-        # В реальности нужно рассчитывать по их конфигурациям
-        estimated_staff_payments = SalaryCalculationService._estimate_staff_payments(
-            completed_orders, start_date, end_date
+        # Точные начисления сотрудникам за период (один пакетный расчет);
+        # между отрезками конфигураций владельца делятся по длительности
+        staff_costs = SalaryCalculationService.calculate_staff_costs(
+            start_date, end_date, completed_orders, dataset
         )
-        
-        # Оставшаяся прибыль
-        remaining_profit = gross_profit - estimated_staff_payments - installation_pay
-        
-        # Доля владельца от оставшейся прибыли
-        owner_profit_share = remaining_profit * (owner_config.remaining_profit_percentage / 100)
-        
-        # Получаем корректировки для владельца
-        owner_user = User.objects.filter(role='owner').first()
-        adjustments = Decimal('0.00')
-        adjustments_details = []
-        
+        total_seconds = sum((segment.seconds for segment in segments), Decimal('0'))
+        for segment, segment_facts in zip(segments, facts):
+            share = segment.seconds / total_seconds if len(segments) > 1 and total_seconds else Decimal('1')
+            segment_facts.staff_costs = staff_costs['total'] * share
+        
+        # Корректировки владельца
+        owner_user = SalaryCalculationService.get_owner_user()
+        adjustments, adjustments_details = Decimal('0.00'), []
         if owner_user:
-            owner_adjustments = SalaryAdjustment.objects.filter(
-                user=owner_user,
-                period_start__lte=end_date,
-                period_end__gte=start_date
+            adjustments, adjustments_details = SalaryCalculationService._adjustments(
+                owner_user, start_date, end_date, adjustment_index
             )
-            adjustments = sum(adj.amount for adj in owner_adjustments)
-            adjustments_details = [
-                {
-                    'type': adj.get_adjustment_type_display(),
-                    'amount': adj.amount,
-                    'reason': adj.reason
-                } for adj in owner_adjustments
-            ]
         
-        # Общая зарплата владельца
-        total_salary = installation_pay + owner_profit_share + adjustments
+        result = engine.evaluate('owner', list(zip(segments, facts)), adjustments)
+        lines = result['lines']
         
         return {
-            'config_name': config.name,
-            'installation_pay': installation_pay,
-            'completed_orders_count': completed_orders.count(),
+            'config_name': result['config_name'],
+            'installation_pay': lines['installation_pay'],
+            'completed_orders_count': sum(segment_facts.orders_count for segment_facts in facts),
             'total_revenue': total_revenue,
             'total_cost_price': total_cost_price,
             'gross_profit': gross_profit,
-            'estimated_staff_payments': estimated_staff_payments,
-            'remaining_profit': remaining_profit,
-            'owner_profit_share': owner_profit_share,
-            'adjustments': adjustments,
-            'adjustments_details': adjustments_details,
-            'total_salary': total_salary,
+            'estimated_staff_payments': staff_costs['total'],
+            'staff_payments_breakdown': staff_costs['breakdown'],
+            'remaining_profit': gross_profit - staff_costs['total'] - lines['installation_pay'],
+            'owner_profit_share': lines['owner_profit_share'],
+            'adjustments': lines['adjustments'],
+            'adjustments_details': adjustments_details if result['configured'] else [],
+            'total_salary': result['total'],
             'period': f"{start_date.date()} - {end_date.date()}"
         }
     
     @staticmethod
-    def _estimate_staff_payments(completed_orders, start_date, end_date) -> Decimal:
-        """Приблизительный расчет выплат сотрудникам"""
-        # Это упрощенный расчет для владельца
-        # В реальности нужно суммировать фактические расчеты по всем сотрудникам
-        
-        orders_count = completed_orders.count()
-        
-        # Примерная оценка выплат монтажникам (1500 за монтаж * среднее количество монтажников)
-        estimated_installer_payments = orders_count * Decimal('1500.00') * 2
-        
-        # Примерная оценка выплат менеджерам (фикс + бонусы)
-        managers_count = User.objects.filter(role='manager').count()
-        estimated_manager_payments = managers_count * Decimal('30000.00')  # Фиксированная часть
-        estimated_manager_payments += orders_count * Decimal('250.00')  # Бонусы за заказы
-        
-        return estimated_installer_payments + estimated_manager_payments
+    def calculate_staff_costs(start_date, end_date, completed_orders=None, dataset=None) -> Dict:
+        """
+        Точные начисления всем менеджерам и монтажникам за период.
+        Дает те же суммы, что calculate_manager_salary / calculate_installer_salary
+        для каждого сотрудника, но фиксированным числом запросов: данные
+        читаются один раз в StaffDataset.
+        """
+        if dataset is None:
+            dataset = StaffDataset(start_date, end_date, completed_orders)
+        parts = dataset.parts(start_date, end_date)
+        
+        breakdown = []
+        total = Decimal('0.00')
+        for user in dataset.staff:
+            adjustments = dataset.adjustments(user.id, start_date, end_date)
+            if user.role == 'manager':
+                entry = SalaryCalculationService._manager_cost(parts[user.id], adjustments)
+                entry.pop('sales_details')
+            else:
+                entry = SalaryCalculationService._installer_cost(parts[user.id], adjustments)
+                entry.pop('sales_count')
+            entry.pop('configured')
+            entry.update({
+                'user_id': user.id,
+                'user_name': user.get_full_name() or user.username,
+                'role': user.role,
+            })
+            total += entry['total_salary']
+            breakdown.append(entry)
+        
+        return {'total': total, 'breakdown': breakdown}
     
     @staticmethod
-    def _legacy_installer_calculation(installer, start_date, end_date) -> Dict:
-        """Старая логика расчета для совместимости"""
-        completed_orders = Order.objects.filter(
-            installers=installer,
-            status='completed',
-            completed_at__gte=start_date,
-            completed_at__lte=end_date
-        )
-        
-        installation_pay = Decimal('1500.00') * completed_orders.count()
-        
-        additional_services = OrderItem.objects.filter(
-            order__in=completed_orders,
-            service__category='additional',
-            seller=installer
-        )
-        
-        additional_pay = sum(
-            (item.price - item.service.cost_price) * Decimal('0.3')
-            for item in additional_services
-        )
-        
+    def _manager_cost(parts, adjustments) -> Dict:
+        """Начисление менеджеру движком по фактам отрезков: parts - [(отрезок, SegmentFacts)]"""
+        result = engine.evaluate('manager', parts, adjustments)
+        lines = result['lines']
         return {
-            'config_name': 'Стандартная (legacy)',
-            'installation_pay': installation_pay,
-            'installation_count': completed_orders.count(),
-            'additional_pay': additional_pay,
-            'additional_services_count': additional_services.count(),
-            'adjustments': Decimal('0.00'),
-            'adjustments_details': [],
-            'total_salary': installation_pay + additional_pay,
-            'period': f"{start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}"
+            'config_name': result['config_name'],
+            'configured': result['configured'],
+            'fixed_salary': lines['fixed_salary'],
+            'orders_count': sum(facts.orders_count for _, facts in parts),
+            'orders_pay': lines['orders_bonus'],
+            'sales_pay': lines['sales_bonus'],
+            'sales_details': result['details'].get('sales_bonus', {}),
+            'config_periods': SalaryCalculationService._config_periods(result, 'orders_bonus'),
+            'adjustments': lines['adjustments'],
+            'total_salary': result['total'],
         }
     
     @staticmethod
-    def _legacy_manager_calculation(manager, start_date, end_date) -> Dict:
-        """Старая логика расчета для совместимости"""
-        fixed_salary = Decimal('30000.00')
-        
-        completed_orders = Order.objects.filter(
-            manager=manager,
-            status='completed',
-            completed_at__gte=start_date,
-            completed_at__lte=end_date
-        )
-        
-        orders_bonus = Decimal('250.00') * completed_orders.count()
-        
-        # Старая логика бонусов
-        conditioner_sales = OrderItem.objects.filter(
-            order__in=completed_orders,
-            service__category='conditioner',
-            seller=manager
-        )
-        
-        conditioner_bonus = sum(
-            (item.price - item.service.cost_price) * Decimal('0.2')
-            for item in conditioner_sales
-        )
-        
-        additional_sales = OrderItem.objects.filter(
-            order__in=completed_orders,
-            service__category='additional',
-            seller=manager
-        )
-        
-        additional_bonus = sum(
-            (item.price - item.service.cost_price) * Decimal('0.3')
-            for item in additional_sales
-        )
-        
-        total_salary = fixed_salary + orders_bonus + conditioner_bonus + additional_bonus
-        
+    def _installer_cost(parts, adjustments) -> Dict:
+        """Начисление монтажнику движком по фактам отрезков: parts - [(отрезок, SegmentFacts)]"""
+        result = engine.evaluate('installer', parts, adjustments)
+        lines = result['lines']
         return {
-            'config_name': 'Стандартная (legacy)',
-            'fixed_salary': fixed_salary,
-            'orders_bonus': orders_bonus,
-            'completed_orders_count': completed_orders.count(),
-            'sales_bonus': conditioner_bonus + additional_bonus,
-            'sales_details': {
-                'conditioner': {
-                    'count': conditioner_sales.count(),
-                    'bonus': conditioner_bonus,
-                    'percentage': Decimal('20.00')
-                },
-                'additional': {
-                    'count': additional_sales.count(), 
-                    'bonus': additional_bonus,
-                    'percentage': Decimal('30.00')
-                }
-            },
-            'adjustments': Decimal('0.00'),
-            'adjustments_details': [],
-            'total_salary': total_salary,
-            'period': f"{start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}"
+            'config_name': result['config_name'],
+            'configured': result['configured'],
+            'fixed_salary': Decimal('0.00'),
+            'orders_count': sum(facts.orders_count for _, facts in parts),
+            'orders_pay': lines['installation_pay'],
+            'sales_count': sum(facts.sales.get('additional', (0, 0))[0] for _, facts in parts),
+            'sales_pay': lines['sales_bonus'],
+            'config_periods': SalaryCalculationService._config_periods(result, 'installation_pay'),
+            'adjustments': lines['adjustments'],
+            'total_salary': result['total'],
         }
     
     @staticmethod
-    def _legacy_owner_calculation(start_date, end_date) -> Dict:
-        """Старая логика расчета для совместимости"""
-        completed_orders = Order.objects.filter(
-            status='completed',
-            completed_at__gte=start_date,
-            completed_at__lte=end_date
-        )
-        
-        installation_pay = Decimal('1500.00') * completed_orders.count()
-        
-        total_revenue = OrderItem.objects.filter(
-            order__in=completed_orders
-        ).aggregate(Sum('price'))['price__sum'] or Decimal('0.00')
-        
-        total_cost_price = sum(
-            item.service.cost_price
-            for item in OrderItem.objects.filter(order__in=completed_orders)
-        )
-        
-        # Упрощенный расчет выплат сотрудникам
-        installers_pay = Decimal('1500.00') * completed_orders.count() * Decimal('2')
-        managers_pay = Decimal('30000.00') + (Decimal('250.00') * completed_orders.count())
-        
-        remaining_profit = total_revenue - total_cost_price - installers_pay - managers_pay
-        total_salary = installation_pay + remaining_profit
-        
-        return {
-            'config_name': 'Стандартная (legacy)',
-            'installation_pay': installation_pay,
-            'completed_orders_count': completed_orders.count(),
-            'total_revenue': total_revenue,
-            'total_cost_price': total_cost_price,
-            'gross_profit': total_revenue - total_cost_price,
-            'estimated_staff_payments': installers_pay + managers_pay,
-            'remaining_profit': remaining_profit,
-            'owner_profit_share': remaining_profit,
-            'adjustments': Decimal('0.00'),
-            'adjustments_details': [],
-            'total_salary': total_salary,
-            'period': f"{start_date.strftime('%Y-%m-%d')} - {end_date.strftime('%Y-%m-%d')}"
-        }
+    def _config_periods(result, orders_code):
+        """Разбивка по отрезкам с прежними ключами orders_pay / sales_pay"""
+        for period in result['config_periods']:
+            period['orders_pay'] = period['lines'][orders_code]
+            period['sales_pay'] = period['lines']['sales_bonus']
+        return result['config_periods']
 
 
 class SalaryConfigService:
@@ -589,4 +460,8 @@ class SalaryConfigService:
             )
         
         UserSalaryAssignment.objects.bulk_create(assignments)
+        # bulk_create не отправляет сигналы - сбрасываем снимок и ведем историю явно
+        resolver.bump_version()
+        for assignment in assignments:
+            history.record_assignment(assignment.user_id, assignment.config_id)
         return len(assignments)
\ No newline at end of file
@@ -0,0 +1,46 @@
+# salary_config/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    SalaryConfig, ManagerSalaryConfig, InstallerSalaryConfig,
+    OwnerSalaryConfig, UserSalaryAssignment
+)
+from . import history, resolver
+
+
+@receiver([post_save, post_delete], sender=SalaryConfig)
+@receiver([post_save, post_delete], sender=ManagerSalaryConfig)
+@receiver([post_save, post_delete], sender=InstallerSalaryConfig)
+@receiver([post_save, post_delete], sender=OwnerSalaryConfig)
+@receiver([post_save, post_delete], sender=UserSalaryAssignment)
+def bump_salary_config_version(sender, instance, **kwargs):
+    """Любое изменение конфигураций или назначений делает снимок устаревшим"""
+    resolver.bump_version()
+
+
+@receiver(post_save, sender=SalaryConfig)
+def record_config_version(sender, instance, **kwargs):
+    history.record_config_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ManagerSalaryConfig)
+@receiver([post_save, post_delete], sender=InstallerSalaryConfig)
+@receiver([post_save, post_delete], sender=OwnerSalaryConfig)
+def record_role_config_version(sender, instance, origin=None, **kwargs):
+    """Правка настроек роли - новая версия конфигурации (кроме удаления вместе с ней)"""
+    if isinstance(origin, SalaryConfig):
+        return
+    history.record_config_version(instance.config_id)
+
+
+@receiver(post_save, sender=UserSalaryAssignment)
+def record_assignment(sender, instance, **kwargs):
+    history.record_assignment(instance.user_id, instance.config_id)
+
+
+@receiver(post_delete, sender=UserSalaryAssignment)
+def close_assignment(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, SalaryConfig):
+        return
+    history.close_assignment(instance.user_id)
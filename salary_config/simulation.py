@@ -0,0 +1,155 @@
+# salary_config/simulation.py
+"""
+Симуляция конфигураций зарплат на исторических данных.
+
+Черновик конфигурации (не сохраненный в БД) прогоняется по прошедшим
+периодам и сравнивается с фактическими начислениями. Данные всех периодов
+читаются один раз в StaffDataset, а факты периодов и фактические суммы
+от черновика не зависят и считаются один раз на Simulation. Поэтому каждый
+следующий черновик - только прогон правил движка в памяти.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.forms.models import model_to_dict
+
+from . import engine, history
+from .dataset import StaffDataset
+from .forms import InstallerSalaryConfigForm, ManagerSalaryConfigForm
+from .models import InstallerSalaryConfig, ManagerSalaryConfig, SalaryConfig
+from .payroll import period_bounds
+
+# Настройки ролей, которые можно симулировать: роль -> (связь, модель, форма)
+DRAFT_ROLES = {
+    'manager': ('manager_config', ManagerSalaryConfig, ManagerSalaryConfigForm),
+    'installer': ('installer_config', InstallerSalaryConfig, InstallerSalaryConfigForm),
+}
+
+
+def draft_config(data):
+    """
+    Несохраненная конфигурация из словаря:
+    {'name', 'base_config_id', 'manager_config': {...}, 'installer_config': {...}}.
+    Незаданные поля берутся из base_config_id, иначе - значения по умолчанию.
+    Ошибки проверки - ValueError.
+    """
+    base = None
+    if data.get('base_config_id'):
+        base = SalaryConfig.objects.select_related(
+            'manager_config', 'installer_config'
+        ).filter(pk=data['base_config_id']).first()
+        if base is None:
+            raise ValueError('Базовая конфигурация не найдена')
+
+    draft = SimpleNamespace(name=data.get('name') or 'Черновик', base_config_id=base.pk if base else None)
+    for relation, model, form_class in DRAFT_ROLES.values():
+        values = data.get(relation)
+        if values is None:
+            continue
+        initial = getattr(base, relation) if engine.has_role(base, relation) else model()
+        form = form_class(data={**model_to_dict(initial, exclude=['id', 'config']), **values})
+        if not form.is_valid():
+            raise ValueError(f'{relation}: {form.errors.as_text()}')
+        setattr(draft, relation, SimpleNamespace(**form.cleaned_data))
+    if not any(hasattr(draft, relation) for relation, _, _ in DRAFT_ROLES.values()):
+        raise ValueError('Не заданы настройки ни одной роли')
+    return draft
+
+
+def month_periods(months, today=None):
+    """Последние months полных календарных месяцев: [(первый день, последний день)]"""
+    today = today or date.today()
+    end = today.replace(day=1) - timedelta(days=1)
+    periods = []
+    for _ in range(months):
+        start = end.replace(day=1)
+        periods.append((start, end))
+        end = start - timedelta(days=1)
+    return periods[::-1]
+
+
+class Simulation:
+    """Исторические данные для прогона черновиков по периодам [(дата начала, дата окончания)]"""
+
+    def __init__(self, periods):
+        self.periods = [period_bounds(start, end) for start, end in periods]
+        self.dataset = StaffDataset(
+            min(start for start, _ in self.periods), max(end for _, end in self.periods)
+        )
+        self.users = {user.id: user for user in self.dataset.staff}
+        self._facts = []
+        self._actual = []
+        self._adjustments = []
+        for start, end in self.periods:
+            # Факты всего периода одним отрезком - для черновика
+            whole = {user_id: [history.Segment(start, end, None)] for user_id in self.users}
+            self._facts.append({
+                user_id: facts[0] for user_id, facts in self.dataset.facts(start, end, whole).items()
+            })
+            adjustments = {
+                user_id: self.dataset.adjustments(user_id, start, end) for user_id in self.users
+            }
+            self._adjustments.append(adjustments)
+            self._actual.append({
+                user_id: engine.evaluate(
+                    self.users[user_id].role, parts, adjustments[user_id]
+                )['total'].quantize(Decimal('0.01'))
+                for user_id, parts in self.dataset.parts(start, end).items()
+            })
+
+    def _in_scope(self, draft, user_id, start, end, user_ids):
+        """
+        Попадает ли сотрудник в прогон: из user_ids, если они заданы, иначе -
+        назначенные на базовую конфигурацию черновика в течение периода
+        """
+        if user_ids is not None:
+            return user_id in user_ids
+        if draft.base_config_id is None:
+            return True
+        return self.dataset.timeline.assigned(user_id, draft.base_config_id, start, end)
+
+    def run(self, draft, user_ids=None):
+        """Начисления по черновику в сравнении с фактическими по каждому периоду"""
+        periods = []
+        simulated_total = Decimal('0.00')
+        actual_total = Decimal('0.00')
+        for index, (start, end) in enumerate(self.periods):
+            lines = []
+            for user_id, user in self.users.items():
+                relation = DRAFT_ROLES[user.role][0]
+                if not hasattr(draft, relation) or not self._in_scope(draft, user_id, start, end, user_ids):
+                    continue
+                simulated = engine.evaluate(
+                    user.role,
+                    [(history.Segment(start, end, draft), self._facts[index][user_id])],
+                    self._adjustments[index][user_id]
+                )['total'].quantize(Decimal('0.01'))
+                actual = self._actual[index][user_id]
+                lines.append({
+                    'user_id': user_id,
+                    'user_name': user.get_full_name() or user.username,
+                    'role': user.role,
+                    'actual': actual,
+                    'simulated': simulated,
+                    'delta': simulated - actual,
+                })
+            period_actual = sum((line['actual'] for line in lines), Decimal('0.00'))
+            period_simulated = sum((line['simulated'] for line in lines), Decimal('0.00'))
+            periods.append({
+                'start': start.date().isoformat(),
+                'end': end.date().isoformat(),
+                'lines': lines,
+                'actual': period_actual,
+                'simulated': period_simulated,
+                'delta': period_simulated - period_actual,
+            })
+            actual_total += period_actual
+            simulated_total += period_simulated
+        return {
+            'config_name': draft.name,
+            'periods': periods,
+            'actual': actual_total,
+            'simulated': simulated_total,
+            'delta': simulated_total - actual_total,
+        }
@@ -1,23 +1,35 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from decimal import Decimal
 from datetime import datetime, timedelta, date
+import json
+import random
 from .models import (
     SalaryConfig, ManagerSalaryConfig, InstallerSalaryConfig, 
-    OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment
+    OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment,
+    SalaryConfigVersion, SalaryAssignmentPeriod
 )
 from .forms import (
     SalaryConfigForm, ManagerSalaryConfigForm, InstallerSalaryConfigForm,
     OwnerSalaryConfigForm, UserSalaryAssignmentForm, SalaryAdjustmentForm
 )
-from .services import SalaryCalculationService, SalaryConfigService
+from .services import SalaryCalculationService, SalaryConfigService, MANAGER_CATEGORY_PERCENTAGES
+from . import payroll, simulation
+from .dataset import AdjustmentIndex
 from customer_clients.models import Client as CustomerClient
 from services.models import Service
 from orders.models import Order, OrderItem
+from finance.models import SalaryPayment, Transaction
+from finance.utils import calculate_installer_salary
+from . import engine
+from analytics.timeseries import get_series
+from events.models import OutboxEvent
 
 User = get_user_model()
 
@@ -473,6 +485,102 @@ class SalaryCalculationServiceTests(TestCase):
         gross_profit = Decimal('20000.00') - Decimal('10000.00')  # 10000
         self.assertEqual(result['gross_profit'], gross_profit)
     
+    def test_staff_costs_match_individual_calculations(self):
+        """Пакетный расчет совпадает с суммой индивидуальных расчетов"""
+        legacy_manager = User.objects.create_user(
+            username='legacy_manager',
+            password='testpass123',
+            role='manager'
+        )
+        additional = Service.objects.create(
+            name='Доп. услуга',
+            cost_price=Decimal('700.00'),
+            selling_price=Decimal('1900.00'),
+            category='additional'
+        )
+        order = Order.objects.create(
+            client=self.customer,
+            manager=legacy_manager,
+            status='completed',
+            completed_at=timezone.now()
+        )
+        order.installers.add(self.installer)
+        OrderItem.objects.create(order=order, service=additional, price=Decimal('1900.00'), seller=self.installer)
+        OrderItem.objects.create(order=order, service=additional, price=Decimal('2100.00'), seller=legacy_manager)
+        SalaryAdjustment.objects.create(
+            user=self.installer,
+            adjustment_type='bonus',
+            amount=Decimal('1234.56'),
+            reason='Премия',
+            period_start=timezone.now().date() - timedelta(days=5),
+            period_end=timezone.now().date(),
+            created_by=self.manager
+        )
+        
+        start_date = timezone.now() - timedelta(days=30)
+        end_date = timezone.now()
+        
+        result = SalaryCalculationService.calculate_staff_costs(start_date, end_date)
+        
+        expected = {
+            self.manager.id: SalaryCalculationService.calculate_manager_salary(self.manager, start_date, end_date),
+            legacy_manager.id: SalaryCalculationService.calculate_manager_salary(legacy_manager, start_date, end_date),
+            self.installer.id: SalaryCalculationService.calculate_installer_salary(self.installer, start_date, end_date),
+        }
+        by_user = {entry['user_id']: entry for entry in result['breakdown']}
+        for user_id, calculation in expected.items():
+            self.assertEqual(by_user[user_id]['total_salary'], calculation['total_salary'])
+            self.assertEqual(by_user[user_id]['config_name'], calculation['config_name'])
+        self.assertEqual(result['total'], sum(c['total_salary'] for c in expected.values()))
+        
+        owner_result = SalaryCalculationService.calculate_owner_salary(start_date, end_date)
+        self.assertEqual(owner_result['estimated_staff_payments'], result['total'])
+        self.assertEqual(len(owner_result['staff_payments_breakdown']), 3)
+    
+    def test_staff_costs_query_count_independent_of_staff(self):
+        """Число запросов не растет с количеством сотрудников"""
+        start_date = timezone.now() - timedelta(days=30)
+        end_date = timezone.now()
+        
+        SalaryCalculationService.calculate_staff_costs(start_date, end_date)
+        with CaptureQueriesContext(connection) as before:
+            SalaryCalculationService.calculate_staff_costs(start_date, end_date)
+        for i in range(5):
+            User.objects.create_user(username=f'extra{i}', password='testpass123', role='installer')
+        with CaptureQueriesContext(connection) as after:
+            SalaryCalculationService.calculate_staff_costs(start_date, end_date)
+        self.assertEqual(len(before), len(after))
+    
+    def test_config_resolution_without_queries(self):
+        """Повторное разрешение конфигурации не обращается к БД"""
+        SalaryCalculationService.get_user_salary_config(self.manager)
+        with self.assertNumQueries(0):
+            config = SalaryCalculationService.get_user_salary_config(self.manager)
+            self.assertTrue(hasattr(config, 'manager_config'))
+            self.assertEqual(config.manager_config.fixed_salary, Decimal('30000.00'))
+    
+    def test_config_resolution_follows_changes(self):
+        """Изменение назначения или активности конфигурации сразу видно в расчетах"""
+        self.assertEqual(SalaryCalculationService.get_user_salary_config(self.manager), self.config)
+        
+        other = SalaryConfigService.create_default_config()
+        SalaryConfigService.assign_config_to_user(self.manager, other)
+        self.assertEqual(SalaryCalculationService.get_user_salary_config(self.manager), other)
+        
+        other.is_active = False
+        other.save()
+        self.assertIsNone(SalaryCalculationService.get_user_salary_config(self.manager))
+    
+    def test_config_snapshot_expires_by_age(self):
+        """Снимок перечитывается по возрасту, даже если версию не увидели (кеш не общий)"""
+        other = SalaryConfigService.create_default_config()
+        self.assertEqual(SalaryCalculationService.get_user_salary_config(self.manager), self.config)
+        # Изменение без сигналов - как в другом процессе с отдельным кешем
+        UserSalaryAssignment.objects.filter(user=self.manager).update(config=other)
+        self.assertEqual(SalaryCalculationService.get_user_salary_config(self.manager), self.config)
+        with override_settings(SALARY_CONFIG_MAX_AGE=-1):
+            self.assertEqual(SalaryCalculationService.get_user_salary_config(self.manager), other)
+    
     def test_legacy_calculation_fallback(self):
         """Тест fallback на старую логику при отсутствии конфигурации"""
         # Удаляем назначение конфигурации
@@ -491,6 +599,590 @@ class SalaryCalculationServiceTests(TestCase):
         self.assertIn('total_salary', result)
 
 
+class SalaryConfigHistoryTests(TestCase):
+    """Тесты расчета по конфигурациям, действовавшим в прошлом"""
+    
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='history_manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.installer = User.objects.create_user(
+            username='history_installer',
+            password='testpass123',
+            role='installer'
+        )
+        self.config = SalaryConfigService.create_default_config()
+        SalaryConfigService.assign_config_to_user(self.manager, self.config)
+        SalaryConfigService.assign_config_to_user(self.installer, self.config)
+        
+        self.customer = CustomerClient.objects.create(
+            name='История Клиент',
+            address='ул. Архивная, 1',
+            phone='+7900123457',
+            source='website'
+        )
+        self.service = Service.objects.create(
+            name='История Услуга',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+        self.old_order = self._order(timezone.now() - timedelta(days=10))
+        self.start_date = timezone.now() - timedelta(days=30)
+    
+    def _order(self, completed_at):
+        order = Order.objects.create(
+            client=self.customer,
+            manager=self.manager,
+            status='completed',
+            completed_at=completed_at
+        )
+        order.installers.add(self.installer)
+        OrderItem.objects.create(
+            order=order,
+            service=self.service,
+            price=Decimal('20000.00'),
+            seller=self.manager
+        )
+        return order
+    
+    def test_initial_config_applies_to_past_orders(self):
+        """Первая конфигурация действует и для заказов до ее создания"""
+        result = SalaryCalculationService.calculate_manager_salary(
+            self.manager, self.start_date, timezone.now()
+        )
+        self.assertEqual(result['config_name'], self.config.name)
+        self.assertEqual(result['orders_bonus'], Decimal('250.00'))
+        self.assertEqual(len(result['config_periods']), 1)
+    
+    def test_config_change_is_not_retroactive(self):
+        """Правка ставок влияет только на заказы после изменения"""
+        manager_config = self.config.manager_config
+        manager_config.bonus_per_completed_order = Decimal('500.00')
+        manager_config.conditioner_profit_percentage = Decimal('10.00')
+        manager_config.save()
+        self._order(timezone.now())
+        
+        result = SalaryCalculationService.calculate_manager_salary(
+            self.manager, self.start_date, timezone.now()
+        )
+        self.assertEqual(result['completed_orders_count'], 2)
+        self.assertEqual(result['orders_bonus'], Decimal('750.00'))
+        self.assertEqual(result['sales_bonus'], Decimal('3000.00'))  # 20% и 10% от 10000
+        self.assertEqual(result['fixed_salary'], Decimal('30000.00'))
+        self.assertEqual(len(result['config_periods']), 2)
+        
+        # Закрытый прошлый период пересчитывается по старым ставкам
+        past = SalaryCalculationService.calculate_manager_salary(
+            self.manager, self.start_date, timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(past['orders_bonus'], Decimal('250.00'))
+        self.assertEqual(past['sales_bonus'], Decimal('2000.00'))
+    
+    def test_reassignment_splits_period(self):
+        """Смена назначения делит период, пакетный расчет дает те же суммы"""
+        other = SalaryConfigService.create_default_config()
+        other.installer_config.payment_per_installation = Decimal('2000.00')
+        other.installer_config.save()
+        SalaryConfigService.assign_config_to_user(self.installer, other)
+        self._order(timezone.now())
+        
+        end_date = timezone.now()
+        result = SalaryCalculationService.calculate_installer_salary(
+            self.installer, self.start_date, end_date
+        )
+        self.assertEqual(result['installation_pay'], Decimal('3500.00'))
+        self.assertEqual(len(result['config_periods']), 2)
+        
+        staff_costs = SalaryCalculationService.calculate_staff_costs(self.start_date, end_date)
+        by_user = {entry['user_id']: entry for entry in staff_costs['breakdown']}
+        self.assertEqual(by_user[self.installer.id]['total_salary'], result['total_salary'])
+        self.assertEqual(
+            by_user[self.manager.id]['total_salary'],
+            SalaryCalculationService.calculate_manager_salary(
+                self.manager, self.start_date, end_date
+            )['total_salary']
+        )
+    
+    def test_owner_config_is_effective_dated(self):
+        """Расчет владельца за прошлый период идет по его тогдашним ставкам"""
+        before_change = timezone.now()
+        owner_config = self.config.owner_config
+        old_rate = owner_config.payment_per_installation
+        owner_config.payment_per_installation = old_rate * 2
+        owner_config.save()
+        self._order(timezone.now())
+        
+        result = SalaryCalculationService.calculate_owner_salary(self.start_date, timezone.now())
+        self.assertEqual(result['completed_orders_count'], 2)
+        self.assertEqual(result['installation_pay'], old_rate * 3)
+        
+        past = SalaryCalculationService.calculate_owner_salary(self.start_date, before_change)
+        self.assertEqual(past['installation_pay'], old_rate)
+        self.assertEqual(past['config_name'], self.config.name)
+    
+    def test_history_is_kept_in_periods_and_versions(self):
+        """Назначения и версии конфигураций получают границы действия"""
+        other = SalaryConfigService.create_default_config()
+        SalaryConfigService.assign_config_to_user(self.manager, other)
+        
+        periods = list(SalaryAssignmentPeriod.objects.filter(user=self.manager).order_by('id'))
+        self.assertEqual(len(periods), 2)
+        self.assertIsNone(periods[0].valid_from)
+        self.assertEqual(periods[0].valid_to, periods[1].valid_from)
+        self.assertIsNone(periods[1].valid_to)
+        
+        # Создание конфигурации по шагам дает одну версию
+        self.assertEqual(SalaryConfigVersion.objects.filter(config=other).count(), 1)
+        self.assertEqual(
+            set(SalaryConfigVersion.objects.get(config=other).data),
+            {'manager_config', 'installer_config', 'owner_config'}
+        )
+
+
+class PayrollRunTests(TestCase):
+    """Тесты ведомостей зарплат"""
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='payroll_owner',
+            password='testpass123',
+            role='owner'
+        )
+        self.manager = User.objects.create_user(
+            username='payroll_manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.config = SalaryConfigService.create_default_config()
+        SalaryConfigService.assign_config_to_user(self.manager, self.config)
+        
+        customer = CustomerClient.objects.create(
+            name='Ведомость Клиент',
+            address='ул. Учетная, 5',
+            phone='+7900123458',
+            source='website'
+        )
+        service = Service.objects.create(
+            name='Ведомость Услуга',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+        order = Order.objects.create(
+            client=customer,
+            manager=self.manager,
+            status='completed',
+            completed_at=timezone.now()
+        )
+        self.item = OrderItem.objects.create(
+            order=order,
+            service=service,
+            price=Decimal('20000.00'),
+            seller=self.manager
+        )
+        self.period_end = timezone.localdate()
+        self.period_start = self.period_end - timedelta(days=30)
+    
+    def test_approved_run_serves_closed_period(self):
+        """Утвержденная ведомость отдает замороженный результат"""
+        run = payroll.create_run(self.period_start, self.period_end)
+        payroll.approve(run)
+        
+        self.assertEqual(run.lines.count(), 2)
+        line = run.lines.get(user=self.manager)
+        self.assertEqual(line.total_salary, Decimal('32250.00'))
+        
+        result = payroll.get_snapshot_result(self.period_start, self.period_end, self.manager)
+        self.assertEqual(result['total_salary'], Decimal('32250.00'))
+        self.assertEqual(result['payroll_run_id'], run.pk)
+        self.assertEqual(result['sales_details']['conditioner']['percentage'], Decimal('20.00'))
+        self.assertIsNotNone(payroll.get_snapshot_result(self.period_start, self.period_end))
+        
+        # Черновик период не закрывает
+        draft = payroll.create_run(self.period_start, self.period_end - timedelta(days=1))
+        self.assertIsNone(payroll.get_snapshot_results(draft.period_start, draft.period_end))
+    
+    def test_diff_detects_late_edits(self):
+        """Сверка пропускает пересчет без изменений и находит поздние правки"""
+        run = payroll.create_run(self.period_start, self.period_end)
+        payroll.approve(run)
+        
+        unchanged = payroll.diff(run)
+        self.assertFalse(unchanged['inputs_changed'])
+        self.assertEqual(unchanged['lines'], [])
+        
+        self.item.price = Decimal('25000.00')
+        self.item.save()
+        
+        changed = payroll.diff(run)
+        self.assertTrue(changed['inputs_changed'])
+        by_user = {line['user_id']: line for line in changed['lines']}
+        self.assertEqual(by_user[self.manager.id]['delta'], Decimal('1000.00'))  # 20% от 5000
+    
+    def test_single_approved_run_per_period(self):
+        """Период закрывается только одной ведомостью"""
+        payroll.approve(payroll.create_run(self.period_start, self.period_end))
+        second = payroll.create_run(self.period_start, self.period_end)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                payroll.approve(second)
+
+    
+    def test_payout_is_idempotent(self):
+        """Выплаты по ведомости создаются пакетом и не дублируются при повторе"""
+        run = payroll.create_run(self.period_start, self.period_end)
+        with self.assertRaises(ValueError):
+            payroll.pay(run)
+        payroll.approve(run)
+        
+        payable = run.lines.filter(total_salary__gt=0)
+        result = payroll.pay(run)
+        self.assertEqual(result['created'], payable.count())
+        self.assertEqual(SalaryPayment.objects.get(user=self.manager).amount, Decimal('32250.00'))
+        self.assertEqual(Transaction.objects.filter(type='expense').count(), payable.count())
+        
+        retry = payroll.pay(run)
+        self.assertEqual(retry['created'], 0)
+        self.assertIn(self.manager.id, retry['skipped'])
+        self.assertEqual(SalaryPayment.objects.filter(payroll_run=run).count(), payable.count())
+    
+    def test_period_query_count_independent_of_staff(self):
+        """Ведомость считается фиксированным числом запросов и совпадает с расчетом по сотруднику"""
+        start, end = payroll.period_bounds(self.period_start, self.period_end)
+        payroll.calculate_period(self.period_start, self.period_end)
+        with CaptureQueriesContext(connection) as before:
+            payroll.calculate_period(self.period_start, self.period_end)
+        for i in range(3):
+            manager = User.objects.create_user(username=f'payroll_extra{i}', password='testpass123', role='manager')
+            installer = User.objects.create_user(username=f'payroll_inst{i}', password='testpass123', role='installer')
+            order = Order.objects.create(
+                client=self.item.order.client, manager=manager, status='completed', completed_at=timezone.now()
+            )
+            order.installers.add(installer)
+            OrderItem.objects.create(order=order, service=self.item.service, price=Decimal('20000.00'), seller=manager)
+        with CaptureQueriesContext(connection) as after:
+            results = payroll.calculate_period(self.period_start, self.period_end)
+        self.assertEqual(len(before), len(after))
+        
+        for user, result in results:
+            if user.role == 'manager':
+                expected = SalaryCalculationService.calculate_manager_salary(user, start, end)
+            elif user.role == 'installer':
+                expected = SalaryCalculationService.calculate_installer_salary(user, start, end)
+            else:
+                expected = SalaryCalculationService.calculate_owner_salary(start, end)
+            self.assertEqual(result, expected)
+    
+    def test_single_owner_line(self):
+        """Доля прибыли начисляется одному владельцу, неактивные пропускаются"""
+        second_owner = User.objects.create_user(username='payroll_owner2', password='testpass123', role='owner')
+        User.objects.create_user(username='payroll_owner_old', password='testpass123', role='owner', is_active=False)
+        # Прибыли хватает на долю владельца
+        self.item.price = Decimal('100000.00')
+        self.item.save()
+        run = payroll.approve(payroll.create_run(self.period_start, self.period_end))
+        
+        owner_line = run.lines.get(role='owner')
+        self.assertEqual(owner_line.user, self.owner)
+        self.assertGreater(owner_line.total_salary, 0)
+        payroll.pay(run)
+        self.assertEqual(
+            list(SalaryPayment.objects.filter(user__role='owner').values_list('user_id', 'amount')),
+            [(self.owner.id, owner_line.total_salary)]
+        )
+        self.assertFalse(SalaryPayment.objects.filter(user=second_owner).exists())
+    
+    def test_payout_updates_finance_series_and_outbox(self):
+        """Пакетная выплата сразу видна в дневных сводках и в outbox"""
+        run = payroll.approve(payroll.create_run(self.period_start, self.period_end))
+        today = timezone.localdate()
+        before = get_series(['expense'], 'day', today, today)[0]['expense']
+        
+        result = payroll.pay(run)
+        after = get_series(['expense'], 'day', today, today)[0]['expense']
+        self.assertEqual(after - before, result['total'])
+        events = OutboxEvent.objects.filter(topic='transaction.created', payload__kind='salary')
+        self.assertEqual(events.count(), result['created'])
+
+class CommissionEquivalenceTests(TestCase):
+    """
+    Свойство: агрегированный расчет комиссий совпадает с поштучным
+    Decimal-расчетом на случайных данных (фиксированные seed)
+    """
+    
+    CATEGORIES = ['conditioner', 'installation', 'dismantling', 'maintenance', 'additional']
+    
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='commission_manager',
+            password='testpass123',
+            role='manager'
+        )
+        self.installer = User.objects.create_user(
+            username='commission_installer',
+            password='testpass123',
+            role='installer'
+        )
+        self.customer = CustomerClient.objects.create(
+            name='Комиссия Клиент',
+            address='ул. Процентная, 7',
+            phone='+7900123459',
+            source='website'
+        )
+        self.start_date = timezone.now() - timedelta(days=1)
+    
+    def _money(self, rng, low, high):
+        return Decimal(rng.randint(low * 100, high * 100)) / 100
+    
+    def _generate(self, rng):
+        services = [
+            Service.objects.create(
+                name=f'Услуга {category}',
+                cost_price=self._money(rng, 0, 30000),
+                selling_price=Decimal('1.00'),
+                category=category
+            )
+            for category in self.CATEGORIES
+        ]
+        for _ in range(rng.randint(1, 4)):
+            order = Order.objects.create(
+                client=self.customer,
+                manager=self.manager,
+                status='completed',
+                completed_at=timezone.now()
+            )
+            order.installers.add(self.installer)
+            for _ in range(rng.randint(0, 6)):
+                item = OrderItem.objects.create(
+                    order=order,
+                    service=rng.choice(services),
+                    price=self._money(rng, 0, 60000),
+                    seller=rng.choice([self.manager, self.installer])
+                )
+                if rng.random() < 0.3:
+                    # Снимок себестоимости отличается от текущей цены услуги
+                    OrderItem.objects.filter(pk=item.pk).update(
+                        cost_price_at_sale=self._money(rng, 0, 30000)
+                    )
+    
+    def _reference_manager_bonus(self, percentages):
+        bonus = Decimal('0.00')
+        for item in OrderItem.objects.filter(
+            order__manager=self.manager, order__status='completed', seller=self.manager
+        ).select_related('service'):
+            bonus += item.profit * (percentages.get(item.service.category, Decimal('0.00')) / 100)
+        return bonus
+    
+    def _reference_additional_profit(self, seller):
+        return sum(
+            (item.profit for item in OrderItem.objects.filter(
+                order__status='completed', seller=seller, service__category='additional'
+            )),
+            Decimal('0.00')
+        )
+    
+    def test_manager_commission_matches_itemwise_calculation(self):
+        for seed in range(6):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                OrderItem.objects.all().delete()
+                Order.objects.all().delete()
+                Service.objects.all().delete()
+                
+                # Конфигурация меняется до заказов: они считаются по новым процентам
+                config = SalaryConfigService.create_default_config()
+                manager_config = config.manager_config
+                for field in MANAGER_CATEGORY_PERCENTAGES.values():
+                    setattr(manager_config, field, self._money(rng, 0, 100))
+                manager_config.save()
+                SalaryConfigService.assign_config_to_user(self.manager, config)
+                percentages = {
+                    category: getattr(manager_config, field)
+                    for category, field in MANAGER_CATEGORY_PERCENTAGES.items()
+                }
+                self._generate(rng)
+                
+                result = SalaryCalculationService.calculate_manager_salary(
+                    self.manager, self.start_date, timezone.now()
+                )
+                self.assertEqual(result['sales_bonus'], self._reference_manager_bonus(percentages))
+    
+    def test_legacy_commission_matches_itemwise_calculation(self):
+        for seed in range(6):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                OrderItem.objects.all().delete()
+                Order.objects.all().delete()
+                Service.objects.all().delete()
+                self._generate(rng)
+                end_date = timezone.now()
+                
+                manager_result = SalaryCalculationService.calculate_manager_salary(
+                    self.manager, self.start_date, end_date
+                )
+                self.assertEqual(manager_result['config_name'], 'Стандартная (legacy)')
+                self.assertEqual(
+                    manager_result['sales_bonus'],
+                    self._reference_manager_bonus({
+                        'conditioner': Decimal('20.00'), 'additional': Decimal('30.00')
+                    })
+                )
+                
+                installer_pay = self._reference_additional_profit(self.installer) * Decimal('0.3')
+                self.assertEqual(
+                    SalaryCalculationService.calculate_installer_salary(
+                        self.installer, self.start_date, end_date
+                    )['additional_pay'],
+                    installer_pay
+                )
+                self.assertEqual(
+                    calculate_installer_salary(self.installer, self.start_date, end_date)['additional_pay'],
+                    installer_pay
+                )
+
+
+class SalaryEngineTests(TestCase):
+    """Тесты движка правил начисления"""
+    
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpass123', role='manager')
+        self.start_date = timezone.now() - timedelta(days=30)
+    
+    def test_registered_rule_is_applied(self):
+        class BonusRule(engine.Rule):
+            code = 'test_bonus'
+            
+            def amount(self, settings, facts, lines):
+                return Decimal('1000.00')
+        
+        before = SalaryCalculationService.calculate_manager_salary(self.manager, self.start_date)
+        engine.register_rule('manager', BonusRule(), before='adjustments')
+        try:
+            with self.assertRaises(ValueError):
+                engine.register_rule('manager', BonusRule())
+            after = SalaryCalculationService.calculate_manager_salary(self.manager, self.start_date)
+        finally:
+            engine.RULES['manager'] = [
+                rule for rule in engine.RULES['manager'] if rule.code != 'test_bonus'
+            ]
+        self.assertEqual(after['total_salary'], before['total_salary'] + Decimal('1000.00'))
+    
+    def test_rule_requires_amount(self):
+        """Правило без amount() нельзя создать"""
+        class EmptyRule(engine.Rule):
+            code = 'test_empty'
+        
+        with self.assertRaises(TypeError):
+            EmptyRule()
+    
+    def test_legacy_owner_uses_staff_costs(self):
+        result = SalaryCalculationService.calculate_owner_salary(self.start_date)
+        self.assertEqual(result['config_name'], engine.LEGACY_CONFIG_NAME)
+        # Без заказов: владелец покрывает фиксированную часть менеджера
+        self.assertEqual(result['estimated_staff_payments'], Decimal('30000.00'))
+        self.assertEqual(result['total_salary'], Decimal('-30000.00'))
+
+
+class SalarySimulationTests(TestCase):
+    """Тесты симуляции черновиков конфигураций"""
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(username='sim_owner', password='testpass123', role='owner')
+        self.manager = User.objects.create_user(username='sim_manager', password='testpass123', role='manager')
+        self.config = SalaryConfigService.create_default_config()
+        SalaryConfigService.assign_config_to_user(self.manager, self.config)
+        
+        customer = CustomerClient.objects.create(
+            name='Симуляция Клиент', address='ул. Пробная, 1', phone='+7900123459', source='website'
+        )
+        service = Service.objects.create(
+            name='Симуляция Услуга',
+            cost_price=Decimal('10000.00'),
+            selling_price=Decimal('20000.00'),
+            category='conditioner'
+        )
+        order = Order.objects.create(client=customer, manager=self.manager, status='completed')
+        OrderItem.objects.create(order=order, service=service, price=Decimal('20000.00'), seller=self.manager)
+        Order.objects.filter(pk=order.pk).update(completed_at=timezone.now() - timedelta(days=30))
+        
+        today = timezone.localdate()
+        self.periods = [(today - timedelta(days=40), today - timedelta(days=20))]
+    
+    def test_unchanged_draft_matches_actual(self):
+        result = simulation.Simulation(self.periods).run(
+            simulation.draft_config({'base_config_id': self.config.pk, 'manager_config': {}})
+        )
+        period = result['periods'][0]
+        self.assertEqual(len(period['lines']), 1)
+        self.assertEqual(period['actual'], SalaryCalculationService.calculate_manager_salary(
+            self.manager, *payroll.period_bounds(*self.periods[0])
+        )['total_salary'].quantize(Decimal('0.01')))
+        self.assertEqual(result['delta'], Decimal('0.00'))
+    
+    def test_draft_percentage_changes_cost(self):
+        runner = simulation.Simulation(self.periods)
+        with self.assertNumQueries(0):
+            result = runner.run(simulation.draft_config({
+                'manager_config': {'conditioner_profit_percentage': '40.00'}
+            }))
+        # Прибыль 10000: 40% вместо 20% по умолчанию
+        self.assertEqual(result['delta'], Decimal('2000.00'))
+    
+    def test_draft_scope_is_base_config_assignees(self):
+        """Черновик на основе конфигурации считается только для назначенных на нее"""
+        other = User.objects.create_user(username='sim_other', password='testpass123', role='manager')
+        runner = simulation.Simulation(self.periods)
+        based = runner.run(simulation.draft_config({'base_config_id': self.config.pk, 'manager_config': {}}))
+        self.assertEqual([line['user_id'] for line in based['periods'][0]['lines']], [self.manager.pk])
+        
+        unbased = runner.run(simulation.draft_config({'manager_config': {}}))
+        self.assertEqual(
+            {line['user_id'] for line in unbased['periods'][0]['lines']}, {self.manager.pk, other.pk}
+        )
+    
+    def test_simulation_api_user_ids_as_strings(self):
+        client = Client()
+        client.login(username='sim_owner', password='testpass123')
+        response = client.post(
+            reverse('salary_config:simulation_api'),
+            data=json.dumps({
+                'manager_config': {'fixed_salary': '40000'},
+                'periods': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in self.periods],
+                'user_ids': [str(self.manager.pk)],
+            }),
+            content_type='application/json'
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data'][0]['periods'][0]['lines'][0]['user_id'], self.manager.pk)
+        self.assertEqual(data['data'][0]['delta'], 10000.0)
+    
+    def test_invalid_draft(self):
+        with self.assertRaises(ValueError):
+            simulation.draft_config({'manager_config': {'conditioner_profit_percentage': '150'}})
+        with self.assertRaises(ValueError):
+            simulation.draft_config({})
+    
+    def test_simulation_api(self):
+        client = Client()
+        client.login(username='sim_owner', password='testpass123')
+        response = client.post(
+            reverse('salary_config:simulation_api'),
+            data=json.dumps({
+                'configs': [{'name': 'Щедрая', 'manager_config': {'fixed_salary': '40000'}}],
+                'periods': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in self.periods],
+            }),
+            content_type='application/json'
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data'][0]['config_name'], 'Щедрая')
+        self.assertEqual(data['data'][0]['delta'], 10000.0)
+
+
 class SalaryAdjustmentTests(TestCase):
     """Тесты корректировок зарплат"""
     
@@ -555,6 +1247,34 @@ class SalaryAdjustmentTests(TestCase):
         )
         self.assertEqual(result['total_salary'], expected_total)
 
+    
+    def test_adjustment_index_matches_overlap_filter(self):
+        """Поиск по индексу совпадает с фильтром пересечения в БД (фиксированные seed)"""
+        rng = random.Random(7)
+        other = User.objects.create_user(username='other', password='testpass123', role='installer')
+        base = date(2025, 1, 1)
+        for _ in range(60):
+            start = base + timedelta(days=rng.randint(0, 300))
+            SalaryAdjustment.objects.create(
+                user=rng.choice([self.user, other]),
+                adjustment_type='bonus',
+                amount=Decimal(rng.randint(1, 500)),
+                reason='Случайная',
+                period_start=start,
+                period_end=start + timedelta(days=rng.randint(0, 90)),
+                created_by=self.creator
+            )
+        
+        with self.assertNumQueries(1):
+            index = AdjustmentIndex.load(base, base + timedelta(days=400))
+        for _ in range(50):
+            start = base + timedelta(days=rng.randint(0, 400))
+            end = start + timedelta(days=rng.randint(0, 60))
+            for user in (self.user, other):
+                expected = SalaryAdjustment.objects.filter(
+                    user=user, period_start__lte=end, period_end__gte=start
+                ).order_by('period_start', 'pk')
+                self.assertEqual(index.overlapping(user.pk, start, end), list(expected))
 
 class SalaryConfigViewsTests(TestCase):
     """Тесты представлений настройки зарплат"""
@@ -30,4 +30,9 @@ urlpatterns = [
     # API
     path('api/auto-assign/', views.auto_assign_default_config, name='auto_assign'),
     path('api/calculate/', views.salary_calculation_api, name='calculation_api'),
+    path('api/payroll-runs/', views.payroll_runs_api, name='payroll_runs_api'),
+    path('api/payroll-runs/<int:pk>/approve/', views.payroll_run_approve_api, name='payroll_run_approve_api'),
+    path('api/payroll-runs/<int:pk>/payout/', views.payroll_run_payout_api, name='payroll_run_payout_api'),
+    path('api/payroll-runs/<int:pk>/diff/', views.payroll_run_diff_api, name='payroll_run_diff_api'),
+    path('api/simulate/', views.salary_simulation_api, name='simulation_api'),
 ]
\ No newline at end of file
@@ -4,7 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
@@ -12,7 +12,7 @@ import json
 from user_accounts.models import User
 from .models import (
    SalaryConfig, ManagerSalaryConfig, InstallerSalaryConfig, 
-   OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment
+   OwnerSalaryConfig, UserSalaryAssignment, SalaryAdjustment, PayrollRun
 )
 from .forms import (
    SalaryConfigForm, ManagerSalaryConfigForm, InstallerSalaryConfigForm,
@@ -20,6 +20,7 @@ from .forms import (
    BulkSalaryAssignmentForm, SalaryCalculationForm, SalaryConfigCopyForm
 )
 from .services import SalaryCalculationService, SalaryConfigService
+from . import payroll, simulation
 
 @login_required
 def salary_config_list(request):
@@ -367,7 +368,12 @@ def salary_calculation_view(request):
            start_datetime = datetime.combine(start_date, datetime.min.time())
            end_datetime = datetime.combine(end_date, datetime.max.time())
            
-           if user:
+           # Закрытый период отдается из утвержденной ведомости
+           calculation_result = payroll.get_snapshot_result(start_date, end_date, user)
+           
+           if calculation_result is not None:
+               calculation_result['user'] = user
+           elif user:
                if user.role == 'installer':
                    calculation_result = SalaryCalculationService.calculate_installer_salary(
                        user, start_datetime, end_datetime
@@ -548,4 +554,165 @@ def salary_calculation_api(request):
        except Exception as e:
            return JsonResponse({'success': False, 'error': str(e)})
    
-   return JsonResponse({'success': False, 'error': 'Метод не поддерживается'})
\ No newline at end of file
+   return JsonResponse({'success': False, 'error': 'Метод не поддерживается'})
+def _payroll_run_data(run):
+   return {
+       'id': run.pk,
+       'period_start': run.period_start.isoformat(),
+       'period_end': run.period_end.isoformat(),
+       'status': run.status,
+       'inputs_hash': run.inputs_hash,
+       'config_versions': run.config_versions,
+       'total': float(run.total),
+       'created_at': run.created_at.isoformat(),
+       'approved_at': run.approved_at.isoformat() if run.approved_at else None,
+   }
+
+@login_required
+def payroll_runs_api(request):
+   """API ведомостей: список (GET) и создание черновика (POST)"""
+   if request.user.role != 'owner':
+       return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
+   
+   if request.method == 'GET':
+       runs = PayrollRun.objects.all()[:50]
+       return JsonResponse({'success': True, 'data': [_payroll_run_data(run) for run in runs]})
+   
+   if request.method == 'POST':
+       try:
+           data = json.loads(request.body)
+           start_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d').date()
+           end_date = datetime.strptime(data.get('end_date'), '%Y-%m-%d').date()
+       except (TypeError, ValueError):
+           return JsonResponse({'success': False, 'error': 'Неверный формат даты. Используйте ГГГГ-ММ-ДД.'})
+       if start_date > end_date:
+           return JsonResponse({'success': False, 'error': 'Начало периода позже окончания'})
+       
+       run = payroll.create_run(start_date, end_date, created_by=request.user)
+       return JsonResponse({'success': True, 'data': _payroll_run_data(run)})
+   
+   return JsonResponse({'success': False, 'error': 'Метод не поддерживается'})
+
+@login_required
+def payroll_run_approve_api(request, pk):
+   """Утверждение ведомости (закрытие периода)"""
+   if request.user.role != 'owner':
+       return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
+   if request.method != 'POST':
+       return JsonResponse({'success': False, 'error': 'Метод не поддерживается'})
+   
+   run = get_object_or_404(PayrollRun, pk=pk)
+   try:
+       with transaction.atomic():
+           payroll.approve(run, approved_by=request.user)
+   except IntegrityError:
+       return JsonResponse({'success': False, 'error': 'Период уже закрыт другой ведомостью'})
+   return JsonResponse({'success': True, 'data': _payroll_run_data(run)})
+
+@login_required
+def payroll_run_payout_api(request, pk):
+   """Выплаты всем сотрудникам по утвержденной ведомости"""
+   if request.user.role != 'owner':
+       return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
+   if request.method != 'POST':
+       return JsonResponse({'success': False, 'error': 'Метод не поддерживается'})
+   
+   run = get_object_or_404(PayrollRun, pk=pk)
+   try:
+       result = payroll.pay(run)
+   except ValueError as e:
+       return JsonResponse({'success': False, 'error': str(e)})
+   except IntegrityError:
+       return JsonResponse({'success': False, 'error': 'Выплаты по ведомости уже создаются, повторите запрос'})
+   return JsonResponse({
+       'success': True,
+       'data': {
+           'created': result['created'],
+           'skipped': result['skipped'],
+           'total': float(result['total']),
+       }
+   })
+
+@login_required
+def payroll_run_diff_api(request, pk):
+   """Сверка ведомости с актуальными данными"""
+   if request.user.role != 'owner':
+       return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
+   
+   run = get_object_or_404(PayrollRun, pk=pk)
+   result = payroll.diff(run)
+   return JsonResponse({
+       'success': True,
+       'data': {
+           'inputs_changed': result['inputs_changed'],
+           'total_delta': float(result['total_delta']),
+           'lines': [
+               {
+                   'user_id': line['user_id'],
+                   'user_name': line['user_name'],
+                   'snapshot_total': float(line['snapshot_total']),
+                   'current_total': float(line['current_total']),
+                   'delta': float(line['delta']),
+               } for line in result['lines']
+           ],
+       }
+   })
+
+
+def _simulation_periods(data):
+   """Периоды симуляции: явный список {'start', 'end'} или последние months месяцев"""
+   if data.get('periods'):
+       periods = [
+           (datetime.strptime(period['start'], '%Y-%m-%d').date(),
+            datetime.strptime(period['end'], '%Y-%m-%d').date())
+           for period in data['periods']
+       ]
+       if any(start > end for start, end in periods):
+           raise ValueError('Начало периода позже окончания')
+       return periods
+   months = int(data.get('months', 12))
+   if not 1 <= months <= 36:
+       raise ValueError('Количество месяцев должно быть от 1 до 36')
+   return simulation.month_periods(months)
+
+def _simulation_data(result):
+   def line_data(line):
+       return dict(line, **{key: float(line[key]) for key in ('actual', 'simulated', 'delta')})
+   return {
+       'config_name': result['config_name'],
+       'actual': float(result['actual']),
+       'simulated': float(result['simulated']),
+       'delta': float(result['delta']),
+       'periods': [
+           dict(line_data(period), lines=[line_data(line) for line in period['lines']])
+           for period in result['periods']
+       ],
+   }
+
+@login_required
+def salary_simulation_api(request):
+   """
+   Симуляция черновиков конфигураций на прошедших периодах.
+   Тело: {"configs": [{"name", "base_config_id", "manager_config": {...},
+   "installer_config": {...}}], "months": 12 | "periods": [...], "user_ids": [...]}
+   """
+   if request.user.role != 'owner':
+       return JsonResponse({'success': False, 'error': 'Недостаточно прав'})
+   if request.method != 'POST':
+       return JsonResponse({'success': False, 'error': 'Метод не поддерживается'})
+   
+   try:
+       data = json.loads(request.body)
+       periods = _simulation_periods(data)
+       drafts = [simulation.draft_config(config) for config in data.get('configs') or [data]]
+       user_ids = {int(user_id) for user_id in data['user_ids']} if data.get('user_ids') else None
+   except json.JSONDecodeError:
+       return JsonResponse({'success': False, 'error': 'Неверный формат данных'})
+   except (KeyError, TypeError, ValueError) as e:
+       return JsonResponse({'success': False, 'error': str(e)})
+   
+   runner = simulation.Simulation(periods)
+   return JsonResponse({
+       'success': True,
+       'data': [_simulation_data(runner.run(draft, user_ids)) for draft in drafts],
+   })
@@ -18,6 +18,13 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_category_display()})"
     
+    @property
+    def margin_percent(self):
+        """Наценка в процентах от цены продажи"""
+        if self.selling_price > 0:
+            return (self.selling_price - self.cost_price) / self.selling_price * 100
+        return 0
+    
     class Meta:
         verbose_name = "Услуга"
         verbose_name_plural = "Услуги"
\ No newline at end of file
@@ -133,6 +133,11 @@ const API = {
             return API.request(`/clients/${id}/`);
         },
         
+        async search(q, limit = 10) {
+            const query = new URLSearchParams({ q, limit }).toString();
+            return API.request(`/clients/search/?${query}`);
+        },
+        
         async create(data) {
             return API.request('/clients/', {
                 method: 'POST',
@@ -151,6 +156,17 @@ const API = {
             return API.request(`/clients/${id}/`, {
                 method: 'DELETE'
             });
+        },
+        
+        async duplicates(id) {
+            return API.request(`/clients/${id}/duplicates/`);
+        },
+        
+        async merge(id, duplicateIds) {
+            return API.request(`/clients/${id}/merge/`, {
+                method: 'POST',
+                body: JSON.stringify({ duplicate_ids: duplicateIds })
+            });
         }
     },
 
@@ -185,6 +201,17 @@ const API = {
             });
         },
         
+        async details(id) {
+            return API.request(`/modal/order/${id}/view/`);
+        },
+        
+        async bulkStatus(orderIds, status) {
+            return API.request('/orders/bulk-status/', {
+                method: 'POST',
+                body: JSON.stringify({ order_ids: orderIds, status })
+            });
+        },
+        
         async addItem(orderId, itemData) {
             return API.request(`/modal/order/${orderId}/items/`, {
                 method: 'POST',
@@ -199,6 +226,27 @@ const API = {
         }
     },
 
+    // Справочники форм (services, sellers): один раз за сессию, с перепроверкой по ETag
+    reference: {
+        async get(name) {
+            const storageKey = `reference:${name}`;
+            const stored = JSON.parse(sessionStorage.getItem(storageKey) || 'null');
+            const response = await fetch(`${API.baseURL}/reference/${name}/`, {
+                credentials: 'include',
+                headers: stored ? { 'If-None-Match': stored.etag } : {}
+            });
+            if (response.status === 304 && stored) {
+                return stored.data;
+            }
+            if (!response.ok) {
+                throw { status: response.status, message: 'Справочник недоступен', errors: {} };
+            }
+            const data = await response.json();
+            sessionStorage.setItem(storageKey, JSON.stringify({ etag: response.headers.get('ETag'), data }));
+            return data;
+        }
+    },
+
     // Методы для работы с услугами
     services: {
         async list(params = {}) {
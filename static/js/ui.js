@@ -319,15 +319,27 @@ const UI = {
         select.parentNode.insertBefore(container, select);
         select.style.display = 'none';
         
+        const queryParam = options.queryParam || 'search';
+        let pending = null;
+        
         const debouncedSearch = CRM.API.helpers.debounce(async (query) => {
             if (query.length < 2) {
                 dropdown.style.display = 'none';
                 return;
             }
             
+            // Отменяем предыдущий запрос, чтобы устаревший ответ не перезаписал подсказки
+            if (pending) {
+                pending.abort();
+            }
+            pending = new AbortController();
+            
             try {
-                const response = await CRM.API.request(`${apiEndpoint}?search=${encodeURIComponent(query)}`);
-                const items = response.data || response;
+                const response = await CRM.API.request(
+                    `${apiEndpoint}?${queryParam}=${encodeURIComponent(query)}`,
+                    { signal: pending.signal }
+                );
+                const items = response.results || response.data || response;
                 
                 dropdown.innerHTML = items.map(item => `
                     <div class="async-select-item" data-value="${item.id}">
@@ -354,10 +366,13 @@ const UI = {
                 });
                 
             } catch (error) {
+                if (error && error.name === 'AbortError') {
+                    return;
+                }
                 dropdown.innerHTML = '<div class="async-select-error">Ошибка загрузки</div>';
                 dropdown.style.display = 'block';
             }
-        }, 300);
+        }, options.delay || 300);
         
         input.addEventListener('input', (e) => {
             debouncedSearch(e.target.value);
@@ -0,0 +1,30 @@
+"""
+Замеры расчета зарплат на синтетических данных (небольшие размеры).
+Полный прогон на 1k/10k/100k заказов с отчетом JSON - manage.py benchmark_salary.
+"""
+import pytest
+
+from salary_config import benchmark
+
+pytestmark = [pytest.mark.django_db, pytest.mark.performance, pytest.mark.slow]
+
+
+@pytest.mark.parametrize('name', sorted(benchmark.BENCHMARKS))
+def test_benchmark_report(name):
+    report = benchmark.run([200], employees=10, repeat=1, names={name})
+    values = report['results'][0]['benchmarks'][name]
+    assert values['seconds'] >= 0
+    assert values['queries'] > 0
+
+
+def test_query_counts_do_not_grow_with_orders():
+    small = benchmark.run([100], employees=10, repeat=1)['results'][0]['benchmarks']
+    large = benchmark.run([400], employees=10, repeat=1)['results'][0]['benchmarks']
+    for name in benchmark.BENCHMARKS:
+        assert large[name]['queries'] == small[name]['queries'], name
+
+
+def test_compare_reports():
+    report = benchmark.run([50], employees=5, repeat=1, names={'manager_salary'})
+    rows = benchmark.compare(report, report)
+    assert [(size, name) for size, name, _, _ in rows] == [(50, 'manager_salary')]
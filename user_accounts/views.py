@@ -7,6 +7,7 @@ from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import User
+from reference import lookups
 from .forms import CustomUserCreationForm, CustomUserChangeForm, ProfileForm
 from django.views.decorators.csrf import ensure_csrf_cookie
 import json
@@ -172,10 +173,10 @@ def user_list(request):
     )
     
     # Статистика для карточек
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
-    managers_count = User.objects.filter(role='manager').count()
-    installers_count = User.objects.filter(role='installer').count()
+    total_users = lookups.users_count()
+    active_users = lookups.users_count(active_only=True)
+    managers_count = lookups.managers_count()
+    installers_count = lookups.installers_count()
     
     # Пагинация
     paginator = Paginator(users, 12)  # 12 пользователей на страницу